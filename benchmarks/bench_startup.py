@@ -0,0 +1,137 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+from prettytable import PrettyTable
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+bench_startup.py
+
+CLI startup benchmark - how long orgsplit takes to print help and answer shell completion, and what it imports to do it
+
+Each case runs in a fresh interpreter --runs times and reports the median and fastest wall time plus any of the heavy
+modules (meraki, aiohttp, prettytable, tqdm) that got imported.  Exits 1 when "orgsplit -h" or completion imports a
+heavy module, when "orgsplit -h" is slower than --budget, or when a short help in orgsplit.LAZY_SUBCOMMANDS no longer
+matches its command's docstring.
+
+usage:
+python benchmarks/bench_startup.py
+python benchmarks/bench_startup.py --runs 20 --budget 0.3 --json startup.json
+'''
+
+HEAVY_MODULES = ['meraki', 'aiohttp', 'prettytable', 'tqdm']
+
+# runs orgsplit with the given arguments and reports the heavy modules it imported on stderr
+RUNNER = '''
+import sys
+
+from orgsplit_tools.orgsplit import entry_point
+
+try:
+    entry_point.main(args=sys.argv[1:], prog_name='orgsplit')
+except SystemExit:
+    pass
+finally:
+    loaded = [module for module in %r if module in sys.modules]
+    sys.stderr.write(f'\\nORGSPLIT_BENCH_IMPORTS={",".join(loaded)}\\n')
+''' % (HEAVY_MODULES,)
+
+# name -> (arguments, extra environment, must stay free of heavy imports)
+CASES = {
+    'orgsplit -h': (['-h'], {}, True),
+    'complete "orgsplit re"': ([], {'_ORGSPLIT_COMPLETE': 'bash_complete', 'COMP_WORDS': 'orgsplit re', 'COMP_CWORD': '1'}, True),
+    'orgsplit device-count -h': (['device-count', '-h'], {}, False),
+}
+
+
+def run_case(args, env, runs):
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-c', RUNNER, *args],
+            capture_output=True,
+            text=True,
+            env={**os.environ, **env},
+        )
+        timings.append(time.perf_counter() - started)
+
+        for line in completed.stderr.splitlines():
+            if line.startswith('ORGSPLIT_BENCH_IMPORTS='):
+                loaded = [module for module in line.split('=', 1)[1].split(',') if module]
+
+    return {
+        'median_seconds': round(statistics.median(timings), 3),
+        'min_seconds': round(min(timings), 3),
+        'heavy_imports': loaded,
+    }
+
+
+def stale_short_help():
+    '''
+    Returns the subcommands whose lazy short help differs from the first line of their docstring
+    '''
+    from orgsplit_tools import orgsplit
+
+    stale = []
+    for name, (module_name, function_name, short_help) in orgsplit.LAZY_SUBCOMMANDS.items():
+        command = orgsplit.entry_point.get_command(None, name)
+        docstring_line = (command.help or '').strip().split('\n')[0].strip()
+        if docstring_line != short_help:
+            stale.append((name, short_help, docstring_line))
+    return stale
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--runs', default=10, show_default=True, type=click.IntRange(min=1), help='Runs per case')
+@click.option('--budget', default=0.5, show_default=True, type=float, help='Maximum median seconds for "orgsplit -h"')
+@click.option('--json', 'json_path', help='Also write the results to this JSON file')
+def main(runs, budget, json_path):
+    """
+    Benchmark orgsplit CLI startup (help and shell completion)
+    """
+    results = {}
+    failures = []
+    results_table = PrettyTable(['Case', 'Median (s)', 'Fastest (s)', 'Heavy imports'])
+
+    for name, (args, env, must_stay_light) in CASES.items():
+        click.secho(f'Running {name} {runs} times...', fg='green')
+        result = run_case(args, env, runs)
+        results[name] = result
+        results_table.add_row([name, result['median_seconds'], result['min_seconds'], ', '.join(result['heavy_imports']) or '-'])
+
+        if must_stay_light and result['heavy_imports']:
+            failures.append(f'{name} imported {", ".join(result["heavy_imports"])}')
+
+    if results['orgsplit -h']['median_seconds'] > budget:
+        failures.append(f'orgsplit -h took {results["orgsplit -h"]["median_seconds"]}s (budget {budget}s)')
+
+    for name, short_help, docstring_line in stale_short_help():
+        failures.append(f'LAZY_SUBCOMMANDS["{name}"] short help "{short_help}" does not match its docstring "{docstring_line}"')
+
+    print('\n')
+    print(results_table)
+
+    if json_path:
+        with open(json_path, 'w') as outfile:
+            outfile.write(json.dumps({'results': results, 'failures': failures}, indent=4))
+
+    if failures:
+        for failure in failures:
+            click.secho(f'FAILED: {failure}', fg='red', bold=True)
+        sys.exit(1)
+
+    click.secho('\nStartup checks passed.', fg='green', bold=True)
+
+
+if __name__ == "__main__":
+    main()
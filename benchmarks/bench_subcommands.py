@@ -0,0 +1,180 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import click
+from prettytable import PrettyTable
+
+from orgsplit_tools import mockserver
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+bench_subcommands.py
+
+end-to-end benchmark of the orgsplit subcommands against the local mock Dashboard API (orgsplit_tools/mockserver.py)
+
+For every scale (networks per organization) and subcommand a fresh mock org is served and the command is run in its own
+process, answering "y" to every confirm.  Reports wall time, Dashboard requests (as counted by the mock), requests/s
+and the peak RSS of the orgsplit process.
+
+usage:
+python benchmarks/bench_subcommands.py
+python benchmarks/bench_subcommands.py --scales 1000,10000,100000 --latency 0.05 --throttle-rate 0.01 --json out.json
+'''
+
+# runs one orgsplit command and reports the process' peak RSS on stderr
+RUNNER = '''
+import resource
+import sys
+
+from orgsplit_tools.orgsplit import entry_point
+
+try:
+    entry_point.main(args=sys.argv[1:], prog_name='orgsplit')
+except SystemExit:
+    pass
+finally:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else
+    peak = peak if sys.platform == 'darwin' else peak * 1024
+    sys.stderr.write(f'\\nORGSPLIT_BENCH_MAXRSS={peak}\\n')
+'''
+
+COMMANDS = {
+    'device-count': ['device-count', '-k', 'benchmark', '-o', 'all', '-f', 'Mock'],
+    # --full: the mock orgs are the same every run, so an incremental precheck would only re-query changed networks
+    'precheck': ['precheck', '-k', 'benchmark', '-o', 'Mock Org 000', '--full'],
+    'rename': ['rename', '-k', 'benchmark', '-o', 'all', '-f', 'Mock', 'Site', 'Branch'],
+    'recombine': ['recombine', '-k', 'benchmark', '-o', 'Mock Org 000'],
+}
+
+
+def _mock_stats(base_url):
+    stats_url = base_url.replace('/api/v1', '/_mock/stats')
+    with urllib.request.urlopen(stats_url) as response:
+        return json.loads(response.read())
+
+
+def run_command(command, scale, options, global_args=()):
+    '''
+    Serves a fresh mock org at the given scale and runs one subcommand against it
+    '''
+    dashboard = mockserver.MockDashboard(
+        orgs=options['orgs'],
+        networks=scale,
+        devices_per_network=options['devices_per_network'],
+        latency=options['latency'],
+        throttle_rate=options['throttle_rate'],
+        error_rate=options['error_rate'],
+        retry_after=options['retry_after'],
+        org_rate=options['org_rate'],
+    )
+    server, base_url = mockserver.serve_in_thread(dashboard)
+
+    args = ['--base-url', base_url, *global_args, *COMMANDS[command]]
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-c', RUNNER, *args],
+                input='y\n' * 10,
+                capture_output=True,
+                text=True,
+                cwd=workdir,
+                # the response cache and saved precheck state go to the throwaway directory, not the user's cache
+                env=dict(os.environ, XDG_CACHE_HOME=workdir),
+            )
+            elapsed = time.perf_counter() - started
+        stats = _mock_stats(base_url)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    peak_rss = None
+    for line in completed.stderr.splitlines():
+        if line.startswith('ORGSPLIT_BENCH_MAXRSS='):
+            peak_rss = int(line.split('=', 1)[1])
+
+    if options['verbose']:
+        click.echo(completed.stdout[-2000:])
+        click.echo(completed.stderr[-2000:])
+
+    return {
+        'command': command,
+        'networks_per_org': scale,
+        'orgs': options['orgs'],
+        'wall_seconds': round(elapsed, 3),
+        'requests': stats['requests'],
+        'requests_per_second': round(stats['requests'] / elapsed, 1) if elapsed else None,
+        'peak_rss_mb': round(peak_rss / (1024 * 1024), 1) if peak_rss else None,
+        'endpoints': stats['endpoints'],
+    }
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--scales', default='1000,10000', show_default=True, help='Comma separated networks-per-org values')
+@click.option('--commands', default=','.join(COMMANDS), show_default=True, help='Comma separated subcommands')
+@click.option('--orgs', default=1, show_default=True, type=int, help='Mock organizations per run')
+@click.option('--devices-per-network', default=2, show_default=True, type=int)
+@click.option('--latency', default=0.0, show_default=True, type=float, help='Seconds of latency per mock response')
+@click.option('--throttle-rate', default=0.0, show_default=True, type=float, help='Fraction of 429 responses')
+@click.option('--error-rate', default=0.0, show_default=True, type=float, help='Fraction of 5xx responses')
+@click.option('--retry-after', default=1, show_default=True, type=int)
+@click.option('--org-rate', default=0, show_default=True, type=int, help='Emulated per-org rate limit (0 = off)')
+@click.option('--global-args', default='--org-rate 100000 --key-rate 100000', show_default=True,
+              help='Global orgsplit options for every run; the default lifts the client-side rate limits so the runs '
+                   'measure orgsplit itself (pass "" together with --org-rate to benchmark against realistic limits)')
+@click.option('--json', 'json_path', help='Also write the results to this JSON file')
+@click.option('-v', '--verbose', is_flag=True, help='Print the tail of each command\'s output')
+def main(scales, commands, orgs, devices_per_network, latency, throttle_rate, error_rate, retry_after, org_rate,
+         global_args, json_path, verbose):
+    """
+    Benchmark orgsplit subcommands against the local mock Dashboard API
+    """
+    options = {
+        'orgs': orgs,
+        'devices_per_network': devices_per_network,
+        'latency': latency,
+        'throttle_rate': throttle_rate,
+        'error_rate': error_rate,
+        'retry_after': retry_after,
+        'org_rate': org_rate,
+        'verbose': verbose,
+    }
+
+    results = []
+    results_table = PrettyTable(['Command', 'Networks/org', 'Orgs', 'Wall (s)', 'Requests', 'Requests/s', 'Peak RSS (MB)'])
+
+    for scale in [int(scale) for scale in scales.split(',') if scale]:
+        for command in [command for command in commands.split(',') if command]:
+            click.secho(f'Running {command} at {scale} networks per org...', fg='green')
+            result = run_command(command, scale, options, global_args=global_args.split())
+            results.append(result)
+            results_table.add_row([
+                result['command'],
+                result['networks_per_org'],
+                result['orgs'],
+                result['wall_seconds'],
+                result['requests'],
+                result['requests_per_second'],
+                result['peak_rss_mb'],
+            ])
+
+    print('\n')
+    print(results_table)
+
+    if json_path:
+        with open(json_path, 'w') as outfile:
+            outfile.write(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from collections import Counter
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+device_counts.py
+
+single pass device aggregation for the device-count command
+
+Devices are counted into a Counter per organizationId keyed on productType, so each device is touched once and
+org names that contain one another (e.g. "ACME" and "ACME West") can't be miscounted.  Product types the tool doesn't
+know about yet are counted like any other.  Only the FIELDS below are read, so the device fetches are projected to them.
+
+example as_dict():
+{'organizations': [{'organizationId': '1234',
+                    'organizationName': 'ACME',
+                    'counts': {'appliance': 2, 'switch': 4, 'wireless': 10},
+                    'total': 16}],
+ 'totals': {'appliance': 2, 'switch': 4, 'wireless': 10},
+ 'total': 16}
+'''
+
+# the device fields counting reads
+FIELDS = ('organizationId', 'organizationName', 'productType')
+
+# print order (and labels for the all-org totals) of the product types the report has always shown
+KNOWN_PRODUCT_TYPES = ['cellularGateway', 'switch', 'appliance', 'wireless', 'sensor', 'camera']
+TOTAL_LABELS = {
+    'cellularGateway': 'cellularGateways',
+    'switch': 'switches',
+    'appliance': 'appliances',
+    'wireless': 'wireless',
+    'sensor': 'sensors',
+    'camera': 'camera',
+}
+
+
+class DeviceCounts(object):
+    def __init__(self, orgs=()):
+        """
+        per-organization productType counters, pre-seeded with the orgs being counted so empty orgs still report
+        """
+        self.org_names = {}
+        self.by_org = {}
+        for org in orgs:
+            self.add_org(org['id'], org['name'])
+
+    def add_org(self, org_id, org_name=None):
+        if org_id not in self.by_org:
+            self.by_org[org_id] = Counter()
+        if org_name is not None:
+            self.org_names[org_id] = org_name
+
+    def add(self, device):
+        org_id = device['organizationId']
+        counts = self.by_org.get(org_id)
+        if counts is None:
+            self.add_org(org_id, device.get('organizationName'))
+            counts = self.by_org[org_id]
+
+        counts[device.get('productType') or 'unknown'] += 1
+
+    def add_many(self, devices):
+        for device in devices:
+            self.add(device)
+
+    def add_counts(self, org_id, counts):
+        '''
+        Merges pre-aggregated {productType: count} totals for an org (e.g. from an overview endpoint)
+        '''
+        self.add_org(org_id)
+        self.by_org[org_id].update(counts)
+
+    def product_types(self):
+        seen = set()
+        for counts in self.by_org.values():
+            seen.update(counts)
+
+        return KNOWN_PRODUCT_TYPES + sorted(seen.difference(KNOWN_PRODUCT_TYPES))
+
+    def totals(self):
+        totals = Counter()
+        for counts in self.by_org.values():
+            totals.update(counts)
+        return totals
+
+    def as_dict(self):
+        product_types = self.product_types()
+        totals = self.totals()
+
+        return {
+            'organizations': [{
+                'organizationId': org_id,
+                'organizationName': self.org_names.get(org_id),
+                'counts': {product_type: counts[product_type] for product_type in product_types},
+                'total': sum(counts.values()),
+            } for org_id, counts in self.by_org.items()],
+            'totals': {product_type: totals[product_type] for product_type in product_types},
+            'total': sum(totals.values()),
+        }
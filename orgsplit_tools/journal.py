@@ -0,0 +1,186 @@
+import json
+import os
+import time
+
+from orgsplit_tools.merakilib import records
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+journal.py
+
+append-only write-ahead journal for the rename and recombine commands
+
+Before the first write a journal file gets a header and one "pending" record per planned write (the full item, so a
+resumed run never needs to fetch the org again).  Each write then appends a "done" (with its result) or "failed" (with
+the error) record as soon as it completes.  Records are JSON lines flushed one at a time, so an interrupted run leaves
+at worst one truncated last line, which is ignored when the journal is read back.
+
+--resume loads the journal and only runs the items whose latest record isn't "done", appending to the same file.
+
+Results of the current run are not kept in memory - callables in on_done get each (item, result) as it is recorded
+(results.py streams them to the command's result file) - only the results read back by load() are.
+
+example records:
+{"type": "header", "command": "rename", "orgname": "ACME", "created": "2023-07-26 10:00:00"}
+{"type": "pending", "key": "L_1234", "item": {"network_id": "L_1234", "new_name": "Branch 1", ...}}
+{"type": "done", "key": "L_1234", "result": {...}}
+{"type": "failed", "key": "L_5678", "error": "Meraki AIO API Error ..."}
+'''
+
+# how each command identifies one write
+KEYS = {
+    'rename': lambda item: item['network_id'],
+    'recombine': lambda item: f'{item["organization_id"]}/{item["network_name_combined"]}',
+}
+
+
+class Journal(object):
+    def __init__(self, path, command):
+        """
+        journal for one command run - use Journal.create() for a new run and Journal.load() to resume one
+        """
+        if command not in KEYS:
+            raise ValueError(f'no journal key for command "{command}"')
+
+        self.path = path
+        self.command = command
+        self.key = KEYS[command]
+        self.orgname = None
+        self.items = {}
+        self.status = {}
+        # results read back from an earlier run (see done_results)
+        self.results = {}
+        self.errors = {}
+        self.on_done = []
+        self._outfile = None
+        # bytes of the loaded journal that read back cleanly - anything after them is cut before the next append
+        self._valid_size = None
+
+    @classmethod
+    def create(cls, path, command, orgname, items):
+        '''
+        Starts a new journal with every planned write recorded as pending
+        '''
+        journal = cls(path, command)
+        journal.orgname = orgname
+        journal._append({
+            'type': 'header',
+            'command': command,
+            'orgname': orgname,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        for item in items:
+            key = journal.key(item)
+            journal.items[key] = item
+            journal.status[key] = 'pending'
+            journal._append({'type': 'pending', 'key': key, 'item': item})
+
+        return journal
+
+    @classmethod
+    def load(cls, path, command):
+        '''
+        Reads an existing journal back so the run can be resumed
+        '''
+        journal = cls(path, command)
+
+        with open(path, 'rb') as infile:
+            valid_size = 0
+            for line in infile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted run may be cut short - it (and anything after it) is dropped
+                    break
+                valid_size += len(line)
+
+                record_type = record.get('type')
+                if record_type == 'header':
+                    if record.get('command') != command:
+                        raise ValueError(f'"{path}" is a {record.get("command")} journal, not a {command} journal')
+                    journal.orgname = record.get('orgname')
+                elif record_type == 'pending':
+                    journal.items[record['key']] = record['item']
+                    journal.status.setdefault(record['key'], 'pending')
+                elif record_type == 'done':
+                    journal.status[record['key']] = 'done'
+                    journal.results[record['key']] = record.get('result')
+                    journal.errors.pop(record['key'], None)
+                elif record_type == 'failed':
+                    journal.status[record['key']] = 'failed'
+                    journal.errors[record['key']] = record.get('error')
+
+        journal._valid_size = valid_size
+
+        if journal.orgname is None and not journal.items:
+            raise ValueError(f'"{path}" is not an orgsplit journal')
+
+        return journal
+
+    def counts(self):
+        counts = {'pending': 0, 'done': 0, 'failed': 0}
+        for status in self.status.values():
+            counts[status] += 1
+        return counts
+
+    def remaining(self):
+        '''
+        Items whose write hasn't completed yet (pending or failed), in journal order
+        '''
+        return [item for key, item in self.items.items() if self.status.get(key) != 'done']
+
+    def done_results(self):
+        '''
+        Yields (item, result) for every write completed by the runs this journal was loaded from
+        '''
+        for key, result in self.results.items():
+            if self.status.get(key) == 'done':
+                yield self.items[key], result
+
+    def record(self, item, result, error=None):
+        '''
+        Journals the outcome of one write - a result means done, anything else failed
+        '''
+        key = self.key(item)
+        if result:
+            self.status[key] = 'done'
+            self.errors.pop(key, None)
+            self._append({'type': 'done', 'key': key, 'result': result})
+            for on_done in self.on_done:
+                on_done(item, result)
+        else:
+            self.status[key] = 'failed'
+            self.errors[key] = str(error) if error is not None else 'no result returned'
+            self._append({'type': 'failed', 'key': key, 'error': self.errors[key]})
+
+    def _repair_tail(self):
+        '''
+        Cuts a partly written last line off a loaded journal (and ends the last good record with a newline), so the
+        next record doesn't run into it and get dropped with it on the following load
+        '''
+        with open(self.path, 'r+b') as outfile:
+            outfile.truncate(self._valid_size)
+            if self._valid_size:
+                outfile.seek(self._valid_size - 1)
+                if outfile.read(1) != b'\n':
+                    outfile.seek(0, os.SEEK_END)
+                    outfile.write(b'\n')
+        self._valid_size = None
+
+    def _append(self, record):
+        if self._outfile is None:
+            if self._valid_size is not None:
+                self._repair_tail()
+            self._outfile = open(self.path, 'a')
+        self._outfile.write(json.dumps(record, default=records.json_default) + '\n')
+        self._outfile.flush()
+
+    def close(self):
+        if self._outfile is not None:
+            self._outfile.flush()
+            os.fsync(self._outfile.fileno())
+            self._outfile.close()
+            self._outfile = None
@@ -0,0 +1,104 @@
+import asyncio
+
+from orgsplit_tools.merakilib import pool, scheduler
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - action_batches.py
+
+runs many small writes as Dashboard action batches instead of one API call each
+
+Items are grouped per organization, packed into batches of up to batch_size actions and submitted with
+createOrganizationActionBatch (confirmed, asynchronous).  Each batch is then polled with getOrganizationActionBatch
+until it completes or fails.  Dashboard only allows a handful of confirmed-but-unfinished batches per org, so each
+org gets a semaphore of concurrent_batches, while batches of different orgs run side by side on the session's worker
+pool.
+
+A batch is atomic - when one action fails the whole batch fails and nothing in it is applied - so results come back per
+batch: (items, batch, error) where batch['status']['completed'] tells whether every item in it went through.
+
+example:
+async for items, batch, error in action_batches.iter_batches(
+        dashboard, networks, org_id=lambda network: network['organizationId'],
+        to_action=lambda network: {'resource': f'/networks/{network["id"]}', 'operation': 'update',
+                                   'body': {'name': network['new_name']}}):
+    ...
+'''
+
+# documented limits for asynchronous action batches
+MAX_ACTIONS = 100
+MAX_CONCURRENT_BATCHES = 5
+
+# status polling backs off from POLL_INTERVAL up to MAX_POLL_INTERVAL seconds
+POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 5.0
+
+
+def batch_finished(batch):
+    return batch['status']['completed'] or batch['status']['failed']
+
+
+def batch_errors(batch):
+    return batch['status'].get('errors') or []
+
+
+async def run_batch(aiomeraki, org_id, actions, poll_interval=POLL_INTERVAL):
+    '''
+    Submits one confirmed asynchronous action batch and polls it until it completes or fails
+    '''
+    batch = await aiomeraki.organizations.createOrganizationActionBatch(
+        organizationId=org_id,
+        actions=actions,
+        confirmed=True,
+        synchronous=False,
+    )
+
+    while not batch_finished(batch):
+        await asyncio.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
+        batch = await aiomeraki.organizations.getOrganizationActionBatch(
+            organizationId=org_id,
+            actionBatchId=batch['id'],
+        )
+
+    return batch
+
+
+def _chunks(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+async def iter_batches(dashboard, items, org_id, to_action, batch_size=MAX_ACTIONS,
+                       concurrent_batches=MAX_CONCURRENT_BATCHES):
+    '''
+    Async generator that runs items as action batches and yields (items, batch, error) per batch as they finish
+
+    org_id(item) returns the organizationId an item belongs to and to_action(item) its action.  batch is None when the
+    batch couldn't be created or polled, in which case error holds the exception
+    '''
+    batch_size = max(1, min(batch_size, MAX_ACTIONS))
+
+    org_items = {}
+    for item in items:
+        org_items.setdefault(org_id(item), []).append(item)
+
+    org_slots = {org: asyncio.Semaphore(concurrent_batches) for org in org_items}
+    jobs = [(org, chunk) for org, chunk_items in org_items.items() for chunk in _chunks(chunk_items, batch_size)]
+
+    async def _run_job(job):
+        org, chunk = job
+        async with org_slots[org]:
+            with scheduler.organization(org):
+                try:
+                    batch = await run_batch(dashboard.aiomeraki, org, [to_action(item) for item in chunk])
+                    return chunk, batch, None
+
+                except Exception as e:
+                    return chunk, None, e
+
+    async for result in pool.map_unordered(_run_job, jobs, workers=dashboard.workers, total=len(jobs)):
+        yield result
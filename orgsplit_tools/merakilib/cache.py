@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - cache.py
+
+opt-in persistent response cache for read-only Dashboard API calls (getOrganizations, getOrganizationNetworks)
+
+Entries live in a single SQLite file and are keyed by a hash of the API key, the endpoint (operation name) and its
+parameters, so different keys never see each other's data.  Entries expire after ttl seconds and the least
+recently used entries are evicted once the cache grows past max_bytes.
+
+example:
+cache = ResponseCache(ttl=900)
+networks = cache.get(api_key, 'getOrganizationNetworks', {'organizationId': '1234'})
+if networks is None:
+    networks = ...
+    cache.set(api_key, 'getOrganizationNetworks', {'organizationId': '1234'}, networks)
+'''
+
+DEFAULT_TTL = 900
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def default_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'orgsplit', 'responses.sqlite')
+
+
+def cache_key(api_key, endpoint, params=None):
+    key_hash = hashlib.sha256(str(api_key).encode('utf-8')).hexdigest()
+    params_json = json.dumps(params or {}, sort_keys=True, default=str)
+
+    return hashlib.sha256(f'{key_hash}|{endpoint}|{params_json}'.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        TTL + size bounded LRU cache of JSON responses stored in SQLite
+        """
+        self.path = path or default_path()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, endpoint TEXT, created REAL, accessed REAL, size INTEGER, body BLOB)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def get(self, api_key, endpoint, params=None):
+        '''
+        Returns the cached response, or None on a miss or an expired entry
+        '''
+        key = cache_key(api_key, endpoint, params)
+        row = self._db.execute('SELECT created, body FROM responses WHERE key = ?', (key,)).fetchone()
+
+        now = time.time()
+        if row is None or now - row[0] > self.ttl:
+            if row is not None:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+        self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        self._db.commit()
+        self.hits += 1
+
+        return json.loads(row[1])
+
+    def set(self, api_key, endpoint, params, response):
+        key = cache_key(api_key, endpoint, params)
+        body = json.dumps(response).encode('utf-8')
+        now = time.time()
+
+        self._db.execute(
+            'INSERT OR REPLACE INTO responses (key, endpoint, created, accessed, size, body) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, endpoint, now, now, len(body), body)
+        )
+        self._evict(now)
+        self._db.commit()
+
+    def invalidate(self, api_key, endpoint, params=None):
+        self._db.execute('DELETE FROM responses WHERE key = ?', (cache_key(api_key, endpoint, params),))
+        self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl,))
+
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # least recently used first
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall():
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
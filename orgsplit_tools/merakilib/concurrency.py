@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - concurrency.py
+
+AIMD (additive increase / multiplicative decrease) concurrency limiter for Dashboard API requests
+
+One AdaptiveLimiter is owned by each DashboardSession and gates every HTTP request the SDK makes, so all fan-outs in a
+run share the same budget.  Clean responses grow the limit by roughly one request per "window" of successful calls,
+a 429 halves it (at most once per cooldown) and pauses new requests for the Retry-After interval.
+
+The limits in report() are the raw (fractional) limit rounded to one decimal, so the time-weighted converged value always
+lies between minimum and peak; the number of requests actually allowed in flight is the limit rounded down.
+
+example report():
+{'initial': 10,
+ 'converged': 14.2,
+ 'final': 15.3,
+ 'peak': 22.4,
+ 'minimum': 7.1,
+ 'requests': 5230,
+ 'throttled': 12}
+'''
+
+DEFAULT_INITIAL = 10
+DEFAULT_MINIMUM = 1
+DEFAULT_MAXIMUM = 50
+
+
+class AdaptiveLimiter(object):
+    def __init__(self, initial=DEFAULT_INITIAL, minimum=DEFAULT_MINIMUM, maximum=DEFAULT_MAXIMUM,
+                 decrease_factor=0.5, cooldown=1.0):
+        """
+        async context manager that admits at most int(limit) requests at a time
+        """
+        # --max-concurrency is a hard cap, also on the starting limit
+        minimum = min(minimum, maximum)
+        initial = max(minimum, min(initial, maximum))
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.peak = self.limit
+        self.lowest = self.limit
+
+        self._condition = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        # time-weighted average of the limit, used to report what the run converged on
+        self._started = time.monotonic()
+        self._last_change = self._started
+        self._weighted_sum = 0.0
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def _get_condition(self):
+        # created lazily so the limiter binds to the loop that actually runs the requests
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        pause = self._paused_until - time.monotonic()
+        while pause > 0:
+            await asyncio.sleep(pause)
+            pause = self._paused_until - time.monotonic()
+
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.requests += 1
+
+    async def release(self):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def _set_limit(self, new_limit):
+        now = time.monotonic()
+        self._weighted_sum += self.limit * (now - self._last_change)
+        self._last_change = now
+
+        self.limit = new_limit
+        self.peak = max(self.peak, new_limit)
+        self.lowest = min(self.lowest, new_limit)
+
+    def on_success(self):
+        '''
+        Additive increase - one extra slot after a full window of clean responses
+        '''
+        if self.limit < self.maximum:
+            previous = int(self.limit)
+            self._set_limit(min(self.maximum, self.limit + 1.0 / self.limit))
+            if int(self.limit) > previous:
+                self._notify()
+
+    def on_throttle(self, retry_after=None):
+        '''
+        Multiplicative decrease on 429, and hold new requests until Retry-After has passed
+        '''
+        self.throttled += 1
+        now = time.monotonic()
+
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+        if now - self._last_decrease >= self.cooldown:
+            self._last_decrease = now
+            self._set_limit(max(self.minimum, self.limit * self.decrease_factor))
+
+    def _notify(self):
+        condition = self._condition
+        if condition is None or condition.locked():
+            return
+
+        async def _wake():
+            async with condition:
+                condition.notify_all()
+
+        try:
+            asyncio.get_running_loop().create_task(_wake())
+        except RuntimeError:
+            pass
+
+    def converged(self):
+        '''
+        Time-weighted average limit over the run
+        '''
+        now = time.monotonic()
+        elapsed = now - self._started
+        if elapsed <= 0:
+            return float(self.limit)
+
+        weighted_sum = self._weighted_sum + self.limit * (now - self._last_change)
+        return weighted_sum / elapsed
+
+    def report(self):
+        return {
+            'initial': self.initial,
+            'converged': round(self.converged(), 1),
+            'final': round(self.limit, 1),
+            'peak': round(self.peak, 1),
+            'minimum': round(self.lowest, 1),
+            'requests': self.requests,
+            'throttled': self.throttled,
+        }
@@ -0,0 +1,62 @@
+import meraki
+import time
+import urllib.parse
+
+from orgsplit_tools.merakilib import pages, scheduler
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - get_config_changes.py
+
+small async tool that reads an org's configuration change log (getOrganizationConfigurationChanges)
+
+Used by incremental prechecks to find the networks that changed since the last run.  Returns the set of networkIds
+that have at least one change at or after the given time (org-wide changes without a network are ignored), e.g.
+
+{'L_1234', 'L_5678'}
+'''
+
+# the change log can be read back at most this far
+MAX_LOOKBACK = 365 * 24 * 60 * 60
+PER_PAGE = 5000
+
+
+def iso_timestamp(epoch):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+
+async def changed_network_ids(aiomeraki, org, since):
+    '''
+    Async function that returns the networkIds changed in an org since the given epoch time, or None when the change
+    log couldn't be read (callers should then treat every network as changed)
+    '''
+    if time.time() - since >= MAX_LOOKBACK:
+        return None
+
+    metadata = {
+        'tags': ['organizations', 'monitor', 'configurationChanges'],
+        'operation': 'getOrganizationConfigurationChanges'
+    }
+    organization_id = urllib.parse.quote(str(org['id']), safe='')
+    resource = f'/organizations/{organization_id}/configurationChanges'
+    params = {'t0': iso_timestamp(since), 'perPage': PER_PAGE}
+
+    network_ids = set()
+    with scheduler.organization(org['id']):
+        try:
+            async for page in pages.iter_pages(aiomeraki, metadata, resource, params=params):
+                network_ids.update(change['networkId'] for change in page if change.get('networkId'))
+
+        except meraki.exceptions.AsyncAPIError as e:
+            print(
+                f'Meraki AIO API Error (OrgID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
+            )
+            return None
+        except Exception as e:
+            print(f'some other ERROR: {e}')
+            return None
+
+    return network_ids
@@ -1,9 +1,8 @@
 import meraki
-import meraki.aio
-import asyncio
-import tqdm.asyncio
-import os
-from pprint import pprint
+import urllib.parse
+from collections import Counter
+
+from orgsplit_tools.merakilib import pages, pool, records, scheduler
 
 __author__ = 'Zach Brewer'
 __email__ = 'zbrewer@cisco.com'
@@ -12,45 +11,87 @@ __license__ = 'MIT'
 '''
 meraki - get_devices.py
 
-small async tool that returns all devices for given org
-'''
+small async tool that returns all devices for given org (as records.Device, which refer to their org instead of
+copying its name and id into every device)
 
+asyncstream_devices() hands each page of devices to a callback as it arrives instead of returning them all
 
-def create_logdir(dir_name):
-    path_exists = os.path.exists(dir_name)
-    if not path_exists:
-        os.makedirs(dir_name)
+Device fetches take an optional projection (fields=['productType', ...]) - only those fields of each device are kept
+as its page is parsed, so counting every device of every org holds little more than one page of raw API records
 
+asyncget_device_counts() returns only {productType: count} per org, from the devices overview by model endpoint
+(one call per org) and falls back to enumerating every device only when that endpoint is unavailable.  The overview
+doesn't return product types, so they are estimated from model name prefixes (MODEL_PRODUCT_TYPES) unless a count
+carries its own productType - models no prefix matches are counted as 'other' and returned so they can be listed.
+'''
 
-async def get_devices(aiomeraki, org):
+# model prefix -> productType for the devices overview by model endpoint, first match wins
+MODEL_PRODUCT_TYPES = [
+    ('MX', 'appliance'),
+    ('VMX', 'appliance'),
+    ('Z', 'appliance'),
+    ('MS', 'switch'),
+    # Catalyst 9800 wireless controllers before the Catalyst 9000 switches
+    ('C9800', 'wireless'),
+    ('C9', 'switch'),
+    ('MR', 'wireless'),
+    ('CW', 'wireless'),
+    ('MG', 'cellularGateway'),
+    ('MV', 'camera'),
+    ('MT', 'sensor'),
+    ('MC', 'phone'),
+]
+
+# the only device field the device counts fallback reads
+COUNT_FIELDS = ('productType',)
+
+# statuses that mean the overview endpoint isn't available for this org/API version
+OVERVIEW_UNAVAILABLE = (400, 403, 404, 501)
+
+
+async def iter_org_devices(aiomeraki, org, fields=None):
     '''
-    Async function that calls getOrganizationDevices for a given org
+    Async generator that yields an org's devices one page at a time as the pages arrive - an error before the first
+    page skips the org, an error after it raises pages.IncompleteListing
     '''
-    try:
-
-        print(f'Getting devices for org {org["name"]}')
-        devices = await aiomeraki.organizations.getOrganizationDevices(
-            organizationId=org['id'],
-            total_pages='all'
-            )
-
-    except meraki.exceptions.AsyncAPIError as e:
-        print(
-            f'Meraki AIO API Error (OrganizationID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
-        )
-        devices = None
-
-    except Exception as e:
-        print(f'some other ERROR: {e}')
-        devices = None
-
-    if devices:
-        org_devices = [{
-            'organizationName': org['name'],
-            'organizationId': org['id'],
-            **device_dict, 
-        } for device_dict in devices]
+    metadata = {
+        'tags': ['organizations', 'configure', 'devices'],
+        'operation': 'getOrganizationDevices'
+    }
+    organization_id = urllib.parse.quote(str(org['id']), safe='')
+    resource = f'/organizations/{organization_id}/devices'
+    device_org = records.Organization.from_org(org)
+    pages_read = 0
+
+    with scheduler.organization(org['id']):
+        try:
+
+            print(f'Getting devices for org {org["name"]}')
+            async for page in pages.iter_pages(aiomeraki, metadata, resource):
+                yield [records.Device(device_org, device_dict, fields) for device_dict in page]
+                pages_read += 1
+
+        except Exception as e:
+            if pages_read:
+                # the caller already holds part of this org
+                raise pages.IncompleteListing(org, 'devices', pages_read, e) from e
+            if isinstance(e, meraki.exceptions.AsyncAPIError):
+                print(
+                    f'Meraki AIO API Error (OrganizationID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
+                )
+            else:
+                print(f'some other ERROR: {e}')
+
+
+async def get_devices(aiomeraki, org, fields=None):
+    '''
+    Async function that returns all devices for a given org
+    '''
+    org_devices = []
+    async for page in iter_org_devices(aiomeraki, org, fields):
+        org_devices.extend(page)
 
+    if org_devices:
         return org_devices
 
     else:
@@ -60,57 +101,131 @@ async def get_devices(aiomeraki, org):
         return None
 
 
-async def async_apicall(api_key, orgs, debug_values, cert_path):
-    if debug_values['output_log']:
-        create_logdir(dir_name=debug_values['log_dir'])
-
-    # Instantiate a Meraki dashboard API session
-    # NOTE: you have to use "async with" so that the session will be closed correctly at the end of the usage
-    async with meraki.aio.AsyncDashboardAPI(
-            api_key,
-            base_url='https://api.meraki.com/api/v1',
-            log_file_prefix=__file__[:-3],
-            log_path=debug_values['log_dir'],
-            maximum_concurrent_requests=10,
-            maximum_retries=100,
-            wait_on_rate_limit=True,
-            output_log=debug_values['output_log'],
-            print_console=debug_values['output_console'],
-            suppress_logging=debug_values['suppress_logging'],
-            certificate_path=cert_path) as aiomeraki:
-
-        all_devices = []
-        device_tasks = [get_devices(aiomeraki, org) for org in orgs]
-        for task in tqdm.tqdm(
-                asyncio.as_completed(device_tasks),
-                total=len(all_devices),
-                colour='green',
-        ):
-
-            device_json = await task
-
-            if device_json:
-                all_devices.extend(iter(device_json))
-
-        return all_devices
-
-
-def asyncget_devices(api_key, orgs, debug_app=False, cert_path=None):
-    if debug_app:
-        debug_values = {
-            'output_log': True,
-            'output_console': True,
-            'suppress_logging': False,
-            'log_dir': 'logs'
-        }
-    else:
-        debug_values = {
-            'output_log': False,
-            'output_console': False,
-            'suppress_logging': True,
-            'log_dir': None
-        }
-
-    #begin async loop
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(async_apicall(api_key, orgs, debug_values, cert_path))
\ No newline at end of file
+async def async_apicall(aiomeraki, orgs, workers=pool.DEFAULT_WORKERS, fields=None):
+    all_devices = []
+    async for device_json in pool.map_unordered(
+            lambda org: get_devices(aiomeraki, org, fields),
+            orgs,
+            workers=workers,
+            total=len(orgs),
+    ):
+
+        if device_json:
+            all_devices.extend(iter(device_json))
+
+    return all_devices
+
+
+def asyncget_devices(dashboard, orgs, fields=None):
+    '''
+    Returns all devices for the given orgs using the shared DashboardSession (see session.py), keeping only the given
+    fields of each device when fields is set
+    '''
+    return dashboard.run(async_apicall(dashboard.aiomeraki, orgs, workers=dashboard.workers, fields=fields))
+
+
+async def _stream_devices(aiomeraki, org, on_page, fields=None):
+    async for page in iter_org_devices(aiomeraki, org, fields):
+        on_page(page)
+
+
+async def async_stream(aiomeraki, orgs, on_page, workers=pool.DEFAULT_WORKERS, fields=None):
+    async for _ in pool.map_unordered(
+            lambda org: _stream_devices(aiomeraki, org, on_page, fields),
+            orgs,
+            workers=workers,
+            total=len(orgs),
+    ):
+        pass
+
+
+def asyncstream_devices(dashboard, orgs, on_page, fields=None):
+    '''
+    Calls on_page(devices) for every page of devices of the given orgs as it arrives, without keeping the pages
+    '''
+    dashboard.run(async_stream(dashboard.aiomeraki, orgs, on_page, workers=dashboard.workers, fields=fields))
+
+
+def model_product_type(model):
+    model = (model or '').upper()
+    for prefix, product_type in MODEL_PRODUCT_TYPES:
+        if model.startswith(prefix):
+            return product_type
+    return 'other'
+
+
+async def _get_overview_by_model(aiomeraki, org):
+    overview_by_model = getattr(aiomeraki.organizations, 'getOrganizationDevicesOverviewByModel', None)
+    if overview_by_model is not None:
+        return await overview_by_model(organizationId=org['id'])
+
+    # endpoint predates this SDK release - call it through the SDK session so retries and rate limiting still apply
+    metadata = {
+        'tags': ['organizations', 'monitor', 'devices', 'overview', 'byModel'],
+        'operation': 'getOrganizationDevicesOverviewByModel'
+    }
+    organization_id = urllib.parse.quote(str(org['id']), safe='')
+    resource = f'/organizations/{organization_id}/devices/overview/byModel'
+
+    return await aiomeraki._session.get(metadata, resource)
+
+
+async def get_device_counts(aiomeraki, org):
+    '''
+    Async function that returns (org, {productType: count}, {model: count} of the models counted as 'other') for a
+    given org from the overview endpoint, enumerating the org's devices only if the overview is unavailable (exact
+    counts, returned with None for the models)
+    '''
+    with scheduler.organization(org['id']):
+        try:
+            overview = await _get_overview_by_model(aiomeraki, org)
+
+        except meraki.exceptions.AsyncAPIError as e:
+            if e.status not in OVERVIEW_UNAVAILABLE:
+                print(
+                    f'Meraki AIO API Error (OrganizationID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
+                )
+                return org, None, None
+            overview = None
+
+        except Exception as e:
+            print(f'some other ERROR: {e}')
+            return org, None, None
+
+    if overview is not None and 'counts' in overview:
+        counts = Counter()
+        other_models = Counter()
+        for model_count in overview['counts']:
+            product_type = model_count.get('productType') or model_product_type(model_count['model'])
+            counts[product_type] += model_count['total']
+            if product_type == 'other':
+                other_models[model_count['model']] += model_count['total']
+        return org, counts, other_models
+
+    print(f'Devices overview unavailable for org {org["name"]}, counting every device instead')
+    devices = await get_devices(aiomeraki, org, fields=COUNT_FIELDS)
+
+    return org, Counter(device.get('productType') or 'unknown' for device in devices or []), None
+
+
+async def async_device_counts(aiomeraki, orgs, workers=pool.DEFAULT_WORKERS):
+    all_counts = []
+    async for org, counts, other_models in pool.map_unordered(
+            lambda org: get_device_counts(aiomeraki, org),
+            orgs,
+            workers=workers,
+            total=len(orgs),
+    ):
+
+        if counts is not None:
+            all_counts.append((org, counts, other_models))
+
+    return all_counts
+
+
+def asyncget_device_counts(dashboard, orgs):
+    '''
+    Returns [(org, {productType: count}, {model: count} counted as 'other'), ...] for the given orgs using the shared
+    DashboardSession
+    '''
+    return dashboard.run(async_device_counts(dashboard.aiomeraki, orgs, workers=dashboard.workers))
@@ -1,9 +1,7 @@
 import meraki
-import meraki.aio
-import asyncio
-import tqdm.asyncio
-import os
-from pprint import pprint
+import urllib.parse
+
+from orgsplit_tools.merakilib import pages, pool, records, scheduler
 
 __author__ = 'Zach Brewer'
 __email__ = 'zbrewer@cisco.com'
@@ -14,119 +12,122 @@ meraki - get_networks.py
 
 NOTE: MODIFIED from original to include find and replace strings
 
-small async tool that takes either an API key or orgs from getOrganizations Dashboard API call 
+small async tool that takes a DashboardSession and orgs from getOrganizations Dashboard API call 
 Returns a nested Python object with OrgName, OrgID, and other network data
 
-Useful because Dashboard API does not include orgname in getOrgNetworks
+Useful because Dashboard API does not include orgname in getOrgNetworks - each network is returned as a
+records.Network that refers to its org instead of a copy of the API dict
 
 Also useful to be able to return all given networks for all orgs (or a subset of orgs) and call them via python dict
-'''
 
+asyncstream_networks() hands each page to a callback as it arrives instead, for commands that only keep the
+networks they match
 
-def _create_logdir(dir_name, package_dir):
-    current_path = os.path.dirname(os.path.realpath(__file__))
+Every fetch takes an optional projection (fields=['id', 'name', ...]) - only those fields of each network are kept as
+its page is parsed, for commands that read a few fields of every network
+'''
 
-    # are we in the package directory? if so create our log file in the parent dir
-    if os.path.split(current_path)[1] == package_dir:
-        parent_dir = os.path.abspath(os.path.join(current_path, os.pardir))
-        parent_log_path = os.path.join(parent_dir, dir_name)
-        path_exists = os.path.exists(parent_log_path)
-        log_path = parent_log_path
-    else:
-        path_exists = os.path.exists(dir_name)
-        log_path =  os.path.join(current_path, dir_name)
 
-    if not path_exists:
-        os.makedirs(log_path)
-    
-    return log_path
+async def iter_org_networks(dashboard, org, fields=None):
+    '''
+    Async generator that yields an org's networks one page at a time as the pages arrive - an error before the first
+    page skips the org, an error after it raises pages.IncompleteListing
 
-async def _get_orgnetworks(aiomeraki, org):
+    When the session cache is enabled, a cache hit is yielded as a single page and a miss is still streamed but also
+    kept for the cache (so only uncached runs get one-page peak memory)
+    '''
+    endpoint_params = {'organizationId': org['id']}
+    network_org = records.Organization.from_org(org)
+    cached = dashboard.cache_get('getOrganizationNetworks', endpoint_params)
+    if cached is not None:
+        yield [records.Network(network_org, network, fields) for network in cached]
+        return
+
+    metadata = {
+        'tags': ['organizations', 'configure', 'networks'],
+        'operation': 'getOrganizationNetworks'
+    }
+    organization_id = urllib.parse.quote(str(org['id']), safe='')
+    resource = f'/organizations/{organization_id}/networks'
+
+    to_cache = [] if dashboard.cache is not None else None
+    pages_read = 0
+    with scheduler.organization(org['id']):
+        try:
+            async for page in pages.iter_pages(dashboard.aiomeraki, metadata, resource):
+                if to_cache is not None:
+                    to_cache.extend(page)
+                yield [records.Network(network_org, network, fields) for network in page]
+                pages_read += 1
+
+        except Exception as e:
+            if pages_read:
+                # the caller already holds part of this org
+                raise pages.IncompleteListing(org, 'networks', pages_read, e) from e
+            if isinstance(e, meraki.exceptions.AsyncAPIError):
+                print(
+                    f'Meraki AIO API Error (OrgID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
+                )
+            else:
+                print(f'some other ERROR: {e}')
+            return
+
+    if to_cache is not None:
+        dashboard.cache_set('getOrganizationNetworks', endpoint_params, to_cache)
+
+
+async def _get_orgnetworks(dashboard, org, fields=None):
     '''
-    Async function that calls getOrganizationNetworks for a given org
+    Async function that returns all networks for a given org (served from the session cache when enabled)
     '''
+    org_networks = []
+    async for page in iter_org_networks(dashboard, org, fields):
+        org_networks.extend(page)
+
+    return org_networks or None
+
+
+async def _stream_orgnetworks(dashboard, org, on_page, fields=None):
+    async for page in iter_org_networks(dashboard, org, fields):
+        on_page(page)
+
+
+async def _async_apicall(dashboard, orgs, fields=None):
+    all_orgnetworks = []
 
-    try:
-        networks = await aiomeraki.organizations.getOrganizationNetworks(
-            organizationId=org['id'], total_pages=-1)
-
-    except meraki.exceptions.AsyncAPIError as e:
-        print(
-            f'Meraki AIO API Error (OrgID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }'
-        )
-        networks = None
-    except Exception as e:
-        print(f'some other ERROR: {e}')
-        networks = None
-
-    if networks:
-        org_networks = [{
-            'organizationName': org['name'],
-            'organizationId': org['id'],
-            **network_dict, 
-        } for network_dict in networks]
-    
-    else:
-        org_networks = None
-    
-    return org_networks
-
-
-async def _async_apicall(api_key, orgs, debug_values, cert_path):
-    if debug_values['output_log']:
-        log_path = _create_logdir(dir_name=debug_values['log_dir'], package_dir = 'masync')
-    else:
-        log_path = debug_values['log_dir']
-    
-    # Instantiate a Meraki dashboard API session
-    # NOTE: you have to use "async with" so that the session will be closed correctly at the end of the usage
-    async with meraki.aio.AsyncDashboardAPI(
-            api_key,
-            base_url='https://api.meraki.com/api/v1',
-            log_file_prefix=__file__[:-3],
-            log_path=log_path,
-            maximum_concurrent_requests=10,
-            maximum_retries=100,
-            wait_on_rate_limit=True,
-            output_log=debug_values['output_log'],
-            print_console=debug_values['output_console'],
-            suppress_logging=debug_values['suppress_logging'],
-            certificate_path=cert_path) as aiomeraki:
-
-        all_orgnetworks = []
-
-        network_tasks = [_get_orgnetworks(aiomeraki, org) for org in orgs]
-        for task in tqdm.tqdm(
-                asyncio.as_completed(network_tasks),
-                total=len(all_orgnetworks),
-                colour='green',
-        ):
-
-            network_json = await task
-            if network_json:
-                all_orgnetworks.extend(iter(network_json))
-        
-        return all_orgnetworks
-
-def asyncget_networks(api_key, orgs, debug_app=False, cert_path=None):
-    if debug_app:
-        debug_values = {
-            'output_log': True,
-            'output_console': True,
-            'suppress_logging': False,
-            'log_dir': 'logs'
-        }
-    else:
-        debug_values = {
-            'output_log': False,
-            'output_console': False,
-            'suppress_logging': True,
-            'log_dir': None
-        }
-
-    #begin async loop
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(_async_apicall(api_key, orgs, debug_values, cert_path))
+    async for network_json in pool.map_unordered(
+            lambda org: _get_orgnetworks(dashboard, org, fields),
+            orgs,
+            workers=dashboard.workers,
+            total=len(orgs),
+    ):
 
+        if network_json:
+            all_orgnetworks.extend(iter(network_json))
 
+    return all_orgnetworks
 
+
+async def _async_stream(dashboard, orgs, on_page, fields=None):
+    async for _ in pool.map_unordered(
+            lambda org: _stream_orgnetworks(dashboard, org, on_page, fields),
+            orgs,
+            workers=dashboard.workers,
+            total=len(orgs),
+    ):
+        pass
+
+
+def asyncget_networks(dashboard, orgs, fields=None):
+    '''
+    Returns all networks for the given orgs using the shared DashboardSession (see session.py), keeping only the given
+    fields of each network when fields is set
+    '''
+    return dashboard.run(_async_apicall(dashboard, orgs, fields))
+
+
+def asyncstream_networks(dashboard, orgs, on_page, fields=None):
+    '''
+    Calls on_page(networks) for every page of networks of the given orgs as it arrives, without keeping the pages
+    '''
+    dashboard.run(_async_stream(dashboard, orgs, on_page, fields))
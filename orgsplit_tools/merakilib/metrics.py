@@ -0,0 +1,291 @@
+import bisect
+import contextvars
+import functools
+import json
+import time
+from collections import Counter
+
+from orgsplit_tools.merakilib import scheduler
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - metrics.py
+
+per-run Dashboard API metrics - latency histograms, retries, 429s and Retry-After waits per endpoint and per org
+
+ApiMetrics.instrument() wraps the SDK session's request(), so every logical call (one SDK call or one page, including
+all of its retries) is timed end to end and attributed to its operation (e.g. getOrganizationNetworks) and to the org
+set with scheduler.organization().  The session's aiohttp trace hooks report each HTTP attempt back through
+on_attempt_start()/on_attempt_end(), which separates time spent waiting for the scheduler from time on the wire.
+
+Recorded per call: endpoint, org, total seconds, seconds before the first attempt was sent (scheduler/limiter wait),
+seconds on the wire, attempts (retries = attempts - 1), 429s, Retry-After seconds and the final status.
+
+write() stores the aggregate as JSON and in Prometheus text format, e.g.
+orgsplit_api_call_duration_seconds_bucket{endpoint="getOrganizationNetworks",le="0.5"} 12
+'''
+
+# histogram bucket upper bounds in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_call = contextvars.ContextVar('orgsplit_current_call', default=None)
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        """
+        cumulative-on-export latency histogram with Prometheus style bucket bounds
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        '''
+        Returns [(upper bound, calls at or below it)], ending with ('+Inf', count)
+        '''
+        running = 0
+        cumulative = []
+        for bound, count in zip([*self.buckets, '+Inf'], self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative
+
+    def quantile(self, q):
+        '''
+        Upper bound of the bucket holding the q-th quantile (None when empty)
+        '''
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+        return '+Inf'
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'mean': round(self.sum / self.count, 3) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): running for bound, running in self.cumulative()},
+        }
+
+
+class CallStats(object):
+    def __init__(self):
+        """
+        aggregate of the calls made to one endpoint (or for one org)
+        """
+        self.calls = 0
+        self.attempts = 0
+        self.throttled = 0
+        self.retry_after_seconds = 0.0
+        self.statuses = Counter()
+        self.duration = Histogram()
+        self.wait = Histogram()
+        self.wire = Histogram()
+
+    def add(self, call):
+        self.calls += 1
+        self.attempts += call.attempts
+        self.throttled += call.throttled
+        self.retry_after_seconds += call.retry_after_seconds
+        self.statuses[str(call.status)] += 1
+        self.duration.observe(call.duration)
+        self.wait.observe(call.wait)
+        self.wire.observe(call.wire)
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'attempts': self.attempts,
+            'retries': max(self.attempts - self.calls, 0),
+            'throttled': self.throttled,
+            'retry_after_seconds': round(self.retry_after_seconds, 1),
+            'statuses': dict(self.statuses),
+            'duration_seconds': self.duration.as_dict(),
+            'wait_seconds': self.wait.as_dict(),
+            'wire_seconds': self.wire.as_dict(),
+        }
+
+
+class Call(object):
+    __slots__ = ('endpoint', 'org_id', 'started', 'first_attempt', 'attempt_started', 'duration', 'wait', 'wire',
+                 'attempts', 'throttled', 'retry_after_seconds', 'status')
+
+    def __init__(self, endpoint, org_id):
+        self.endpoint = endpoint
+        self.org_id = org_id
+        self.started = time.perf_counter()
+        self.first_attempt = None
+        self.attempt_started = None
+        self.duration = 0.0
+        self.wait = 0.0
+        self.wire = 0.0
+        self.attempts = 0
+        self.throttled = 0
+        self.retry_after_seconds = 0.0
+        self.status = None
+
+
+class ApiMetrics(object):
+    def __init__(self):
+        """
+        collects every Dashboard call of one CLI command run
+        """
+        self.started = time.time()
+        self.endpoints = {}
+        self.organizations = {}
+        self.total = CallStats()
+        # callables handed every finished Call (e.g. tracing.Tracer.add_call)
+        self.listeners = []
+
+    def instrument(self, rest_session):
+        '''
+        Wraps the SDK session's request() so every call through it is recorded
+        '''
+        request = rest_session.request
+
+        @functools.wraps(request)
+        async def measured_request(metadata, method, url, **kwargs):
+            call = Call(metadata.get('operation', 'unknown'), scheduler.current_organization())
+            token = _current_call.set(call)
+            try:
+                response = await request(metadata, method, url, **kwargs)
+                call.status = getattr(response, 'status', None)
+                return response
+
+            except Exception as e:
+                call.status = getattr(e, 'status', None) or type(e).__name__
+                raise
+
+            finally:
+                _current_call.reset(token)
+                self.record(call)
+
+        rest_session.request = measured_request
+
+    # aiohttp trace hooks, called by the session for each HTTP attempt of the current call
+
+    def on_attempt_start(self):
+        call = _current_call.get()
+        if call is not None:
+            call.attempt_started = time.perf_counter()
+            if call.first_attempt is None:
+                call.first_attempt = call.attempt_started
+
+    def on_attempt_end(self, status=None, retry_after=None):
+        call = _current_call.get()
+        if call is None:
+            return
+
+        call.attempts += 1
+        if call.attempt_started is not None:
+            call.wire += time.perf_counter() - call.attempt_started
+            call.attempt_started = None
+        if status == 429:
+            call.throttled += 1
+            call.retry_after_seconds += retry_after or 0
+
+    def record(self, call):
+        call.duration = time.perf_counter() - call.started
+        call.wait = (call.first_attempt or time.perf_counter()) - call.started
+
+        self.total.add(call)
+        self.endpoints.setdefault(call.endpoint, CallStats()).add(call)
+        self.organizations.setdefault(str(call.org_id or 'unattributed'), CallStats()).add(call)
+
+        for listener in self.listeners:
+            listener(call)
+
+    def as_dict(self, **extra):
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            **extra,
+            'total': self.total.as_dict(),
+            'endpoints': {endpoint: stats.as_dict() for endpoint, stats in sorted(self.endpoints.items())},
+            'organizations': {org_id: stats.as_dict() for org_id, stats in sorted(self.organizations.items())},
+        }
+
+    def prometheus(self):
+        '''
+        Returns the aggregate in Prometheus text exposition format
+        '''
+        lines = []
+
+        def family(name, metric_type, help):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        for name, attribute, help in [
+            ('orgsplit_api_call_duration_seconds', 'duration', 'Dashboard API call time including scheduler waits and retries'),
+            ('orgsplit_api_call_wait_seconds', 'wait', 'Time a Dashboard API call waited before its first attempt was sent'),
+            ('orgsplit_api_call_wire_seconds', 'wire', 'Time a Dashboard API call spent on HTTP attempts'),
+        ]:
+            family(name, 'histogram', help)
+            for endpoint, stats in sorted(self.endpoints.items()):
+                histogram = getattr(stats, attribute)
+                for bound, running in histogram.cumulative():
+                    lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=bound)} {running}')
+                lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {round(histogram.sum, 6)}')
+                lines.append(f'{name}_count{_labels(endpoint=endpoint)} {histogram.count}')
+
+        family('orgsplit_api_calls_total', 'counter', 'Dashboard API calls by endpoint and final status')
+        for endpoint, stats in sorted(self.endpoints.items()):
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'orgsplit_api_calls_total{_labels(endpoint=endpoint, status=status)} {count}')
+
+        for name, attribute, help in [
+            ('orgsplit_api_attempts_total', 'attempts', 'HTTP attempts (calls plus retries)'),
+            ('orgsplit_api_throttled_total', 'throttled', 'Attempts answered with 429'),
+            ('orgsplit_api_retry_after_seconds_total', 'retry_after_seconds', 'Retry-After seconds requested by 429 responses'),
+        ]:
+            family(name, 'counter', help)
+            for endpoint, stats in sorted(self.endpoints.items()):
+                lines.append(f'{name}{_labels(endpoint=endpoint)} {round(getattr(stats, attribute), 3)}')
+
+        for name, attribute, help in [
+            ('orgsplit_api_org_calls_total', 'calls', 'Dashboard API calls per organization'),
+            ('orgsplit_api_org_throttled_total', 'throttled', 'Attempts answered with 429 per organization'),
+        ]:
+            family(name, 'counter', help)
+            for org_id, stats in sorted(self.organizations.items()):
+                lines.append(f'{name}{_labels(organization=org_id)} {getattr(stats, attribute)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path_prefix, **extra):
+        '''
+        Writes <path_prefix>.json and <path_prefix>.prom, returning both paths
+        '''
+        json_path = f'{path_prefix}.json'
+        prom_path = f'{path_prefix}.prom'
+
+        with open(json_path, 'w') as outfile:
+            outfile.write(json.dumps(self.as_dict(**extra), indent=4))
+        with open(prom_path, 'w') as outfile:
+            outfile.write(self.prometheus())
+
+        return json_path, prom_path
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
@@ -0,0 +1,59 @@
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - pages.py
+
+page-by-page pagination for Dashboard API list endpoints
+
+The SDK's get_pages (total_pages=-1 / 'all') downloads every page into one list before returning it.  iter_pages() is
+an async generator that yields each page as soon as it arrives and follows the Link "next" header for the following
+one, so a consumer only ever holds the page it is working on.  Requests go through the SDK session (retries, 429
+handling, the OrgScheduler) exactly like the SDK's own pagination.
+
+Because pages are handed on as they arrive, a listing that fails part way can't simply be dropped - the org's fetch
+raises IncompleteListing instead, so the command aborts rather than carrying on with part of the org.
+
+example:
+async for page in pages.iter_pages(aiomeraki, metadata, f'/organizations/{org_id}/networks'):
+    for network in page:
+        ...
+'''
+
+
+class IncompleteListing(Exception):
+    def __init__(self, org, items, pages_read, error):
+        """
+        an org's listing that failed after some of its pages were already handed on - the rest of the org is missing
+        """
+        self.org = org
+        self.items = items
+        self.pages_read = pages_read
+        self.error = error
+        super().__init__(
+            f'Listing the {items} of org "{org["name"]}" (OrgID "{org["id"]}") failed after {pages_read} pages, '
+            f'the rest of its {items} are missing: {error}'
+        )
+
+
+async def iter_pages(aiomeraki, metadata, url, params=None):
+    '''
+    Async generator that yields one list of items per page of the given GET endpoint
+    '''
+    session = aiomeraki._session
+    metadata = dict(metadata, page=1)
+
+    response = await session.request(metadata, 'GET', url, params=params)
+    while True:
+        async with response:
+            page = await response.json(content_type=None)
+            next_link = response.links.get('next')
+
+        yield page
+
+        if not next_link:
+            break
+
+        metadata['page'] += 1
+        response = await session.request(metadata, 'GET', str(next_link['url']))
@@ -0,0 +1,88 @@
+import asyncio
+
+import tqdm
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - pool.py
+
+bounded worker pool for merakilib fan-outs
+
+asyncio.as_completed() over a list of coroutines wraps every one of them in a Task up front, so a 40k network org means
+40k live tasks (and their frames and arguments) before the first request is sent.  map_unordered() instead feeds the
+items through a small queue to a fixed number of workers, so the number of live coroutines stays at `workers` no
+matter how many items there are.  items may be any iterable, including a generator, or an async iterable whose
+items are handed to the workers as they arrive (so a fan-out can start before its input is complete).
+
+The session's limiter/scheduler still decides how many requests are actually in flight; workers only needs to be at
+least the limiter's maximum so the pool never becomes the bottleneck (DashboardSession.workers).
+
+example:
+async for settings in pool.map_unordered(_get_appliance_settings_for, networks, workers=50, total=len(networks)):
+    ...
+'''
+
+DEFAULT_WORKERS = 50
+
+_DONE = object()
+
+
+async def map_unordered(func, items, workers=DEFAULT_WORKERS, total=None, progress=True):
+    '''
+    Async generator that awaits func(item) for every item on a bounded pool of workers and yields the results in
+    completion order, with a tqdm progress bar (the same bar the as_completed fan-outs used to draw)
+    '''
+    if total is not None:
+        workers = max(1, min(workers, total))
+
+    work = asyncio.Queue(maxsize=workers * 2)
+    results = asyncio.Queue()
+
+    async def produce():
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await work.put(item)
+            else:
+                for item in items:
+                    await work.put(item)
+        except Exception as e:
+            results.put_nowait((False, e))
+        for _ in range(workers):
+            await work.put(_DONE)
+
+    async def consume():
+        try:
+            while True:
+                item = await work.get()
+                if item is _DONE:
+                    break
+                results.put_nowait((True, await func(item)))
+        except Exception as e:
+            results.put_nowait((False, e))
+        finally:
+            results.put_nowait((None, _DONE))
+
+    tasks = [asyncio.ensure_future(produce())]
+    tasks.extend(asyncio.ensure_future(consume()) for _ in range(workers))
+
+    try:
+        with tqdm.tqdm(total=total, colour='green', disable=not progress) as progress_bar:
+            running = workers
+            while running:
+                ok, result = await results.get()
+                if result is _DONE:
+                    running -= 1
+                elif ok:
+                    progress_bar.update(1)
+                    yield result
+                else:
+                    raise result
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
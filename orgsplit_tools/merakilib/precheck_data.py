@@ -0,0 +1,130 @@
+import asyncio
+
+from orgsplit_tools.merakilib import get_appliance, get_config_changes, get_networks, pool
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - precheck_data.py
+
+gathers everything precheck needs as one concurrent pipeline on the shared DashboardSession
+
+The three inputs used to be fetched one after another (license overviews, then every org's networks, then every
+appliance network's settings).  Here the license overviews run alongside the network listing, and each appliance
+network is handed to the appliance settings workers as soon as the page it's on arrives, so the total time follows
+the longest chain (listing the largest org plus its last settings call) instead of the sum of the phases.
+
+Given the saved state of earlier prechecks (precheck_state.py), each such org's configuration change log is read
+alongside, and appliance networks that haven't changed since reuse their saved settings instead of being queried.
+
+fields projects the listed networks (see get_networks.py); the appliance settings calls need id, name and productTypes.
+
+example:
+license_overviews, networks, appliance_settings, reused = precheck_data.gather(dashboard, orgs, previous=states)
+'''
+
+_DONE = object()
+
+
+async def _unchanged_settings(dashboard, org, state):
+    '''
+    Async function that returns {networkId: saved appliance settings} for the networks of an org unchanged since state
+    '''
+    changed = await get_config_changes.changed_network_ids(dashboard.aiomeraki, org, state['since'])
+    if changed is None:
+        print(f'Could not read the configuration change log of org "{ org["name"] }", re-checking all of its networks')
+        return {}
+
+    return {
+        appliance['networkId']: appliance for appliance in state['applianceSettings']
+        if appliance['networkId'] not in changed
+    }
+
+
+async def _appliance_networks(dashboard, orgs, all_networks, unchanged, reused, fields):
+    '''
+    Async generator that streams the networks of every org and yields the appliance networks that need checking as
+    their pages arrive - the saved settings of unchanged networks go to reused instead
+    '''
+    arrived = asyncio.Queue()
+
+    def on_page(page):
+        all_networks.extend(page)
+        for network in page:
+            if 'appliance' in network['productTypes']:
+                arrived.put_nowait(network)
+
+    async def stream():
+        try:
+            await get_networks._async_stream(dashboard, orgs, on_page, fields)
+        finally:
+            arrived.put_nowait(_DONE)
+
+    streaming = asyncio.ensure_future(stream())
+    try:
+        while True:
+            network = await arrived.get()
+            if network is _DONE:
+                break
+
+            if network['organizationId'] in unchanged:
+                saved = (await unchanged[network['organizationId']]).get(network['id'])
+                if saved is not None:
+                    reused.append(dict(saved, networkName=network['name']))
+                    continue
+
+            yield network
+
+        # surfaces any error the listing raised
+        await streaming
+
+    finally:
+        if not streaming.done():
+            streaming.cancel()
+            await asyncio.gather(streaming, return_exceptions=True)
+
+
+async def _gather(dashboard, orgs, previous, fields):
+    licensing = asyncio.ensure_future(dashboard._get_license_overviews(orgs))
+    unchanged = {
+        org['id']: asyncio.ensure_future(_unchanged_settings(dashboard, org, previous[org['id']]))
+        for org in orgs if previous.get(org['id'])
+    }
+
+    all_networks = []
+    all_appliance_settings = []
+    reused = []
+    try:
+        async for network_json in pool.map_unordered(
+                lambda network: get_appliance._get_appliance_settings(dashboard.aiomeraki, network),
+                _appliance_networks(dashboard, orgs, all_networks, unchanged, reused, fields),
+                workers=dashboard.workers,
+        ):
+
+            if network_json:
+                all_appliance_settings.extend(iter(network_json))
+
+        license_overviews = {org['id']: overview for org, overview in await licensing}
+        # orgs without an appliance network never awaited their change log
+        await asyncio.gather(*unchanged.values())
+
+    finally:
+        for task in [licensing, *unchanged.values()]:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(licensing, *unchanged.values(), return_exceptions=True)
+
+    all_appliance_settings.extend(reused)
+
+    return license_overviews, all_networks, all_appliance_settings, len(reused)
+
+
+def gather(dashboard, orgs, previous=None, fields=None):
+    '''
+    Returns ({org id: license overview}, networks, appliance settings, number of settings reused from previous) for the
+    given orgs in one pass - previous is {org id: saved precheck state} for incremental prechecks, fields the network
+    fields to keep
+    '''
+    return dashboard.run(_gather(dashboard, orgs, previous or {}, fields))
@@ -0,0 +1,245 @@
+import sys
+from collections.abc import Mapping
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - records.py
+
+compact read-only records for the networks and devices the merakilib fetches return
+
+The fetches used to copy every API record into a new dict with the org's name and id splatted in front.  A record
+keeps the known API fields in __slots__ instead, holds a reference to one shared Organization per org (the org's name
+and id are never copied), interns string values that repeat across a fleet (models, product types, firmware, time
+zones, network ids) and stores list fields as shared tuples.  Fields the class doesn't know are kept in a small extra
+dict, so nothing the API returns is lost.
+
+A fetch given a projection (fields=[...]) builds records holding only those fields, dropping the rest of each API
+record as its page is parsed - organizationName and organizationId are always available from the org.
+
+Records are read-only Mappings, so existing code keeps working unchanged - network['name'], network.get('tags'),
+'appliance' in network['productTypes'], dict(network) and {**network, ...} all behave like the old dicts, with
+organizationName and organizationId as the first two keys.  json.dumps() needs default=json_default to write them.
+
+example:
+org = Organization('1234', 'ACME')
+network = Network(org, {'id': 'L_1', 'name': 'Site 1 - switch', 'productTypes': ['switch'], ...})
+network['organizationName'] -> 'ACME'
+device = Device(org, {'serial': 'Q2XX-...', 'productType': 'switch', ...}, fields=['productType'])
+'''
+
+# one tuple per distinct list value (productTypes, tags) shared by every record holding it
+_shared_tuples = {}
+
+_intern = sys.intern
+
+# how Record.__init__ stores each known field
+_PLAIN = 'plain'
+_INTERNED = 'interned'
+_SHARED = 'shared'
+_EXTRA = 'extra'
+
+
+def _shared(value):
+    if not isinstance(value, list):
+        return value
+    try:
+        value = tuple(value)
+        return _shared_tuples.setdefault(value, value)
+    except TypeError:
+        # list of unhashable values - kept as-is
+        return value
+
+
+def json_default(value):
+    '''
+    json.dumps(default=...) hook - records are written as the plain dicts they stand for
+    '''
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class Organization(object):
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        """
+        the org every record of one fetch refers to
+        """
+        self.id = sys.intern(id) if isinstance(id, str) else id
+        self.name = sys.intern(name) if isinstance(name, str) else name
+
+    @classmethod
+    def from_org(cls, org):
+        return cls(org['id'], org['name'])
+
+    def __repr__(self):
+        return f'Organization({self.id!r}, {self.name!r})'
+
+
+class Record(Mapping):
+    __slots__ = ('org', 'extra')
+
+    # known API fields, in the API's order - each is a slot
+    FIELDS = ()
+    # string fields whose values repeat across records
+    INTERNED = frozenset()
+    # list fields stored as shared tuples
+    SHARED = frozenset()
+
+    def __init__(self, org, data, fields=None):
+        self.org = org
+        extra = None
+        if fields is None:
+            kinds = self._kinds
+            pairs = data.items()
+        else:
+            # only the projected fields are looked up, the rest of data is never touched
+            kinds = self.projection(fields)
+            pairs = [(key, data[key]) for key in kinds if key in data]
+
+        for key, value in pairs:
+            kind = kinds.get(key)
+            if kind is None:
+                if key == 'organizationName' or key == 'organizationId':
+                    # served from the shared org
+                    continue
+                kind = _EXTRA
+            if kind is _EXTRA:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+
+            if kind is _INTERNED and value.__class__ is str:
+                value = _intern(value)
+            elif kind is _SHARED:
+                value = _shared(value)
+            setattr(self, key, value)
+        self.extra = extra
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.FIELDS)
+        cls._kinds = {
+            field: _INTERNED if field in cls.INTERNED else _SHARED if field in cls.SHARED else _PLAIN
+            for field in cls.FIELDS
+        }
+        cls._projections = {}
+
+    @classmethod
+    def projection(cls, fields):
+        '''
+        Returns {field: kind} for the given fields (cached per projection) - fields the class doesn't know are kept in
+        extra, organizationName and organizationId always come from the org
+        '''
+        fields = tuple(fields)
+        kinds = cls._projections.get(fields)
+        if kinds is None:
+            kinds = cls._projections[fields] = {
+                field: cls._kinds.get(field, _EXTRA)
+                for field in fields if field != 'organizationName' and field != 'organizationId'
+            }
+        return kinds
+
+    @classmethod
+    def from_flat(cls, data, organizations, fields=None):
+        '''
+        Builds a record from a dict that carries organizationName/organizationId itself (e.g. a snapshot row),
+        sharing one Organization per org id through the organizations dict
+        '''
+        org = organizations.get(data['organizationId'])
+        if org is None:
+            org = organizations[data['organizationId']] = Organization(data['organizationId'], data.get('organizationName'))
+        return cls(org, data, fields)
+
+    def __getitem__(self, key):
+        if key == 'organizationName':
+            return self.org.name
+        if key == 'organizationId':
+            return self.org.id
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                # field the API didn't return for this record
+                raise KeyError(key) from None
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield 'organizationName'
+        yield 'organizationId'
+        for field in self.FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+
+class Network(Record):
+    __slots__ = (
+        'id', 'name', 'productTypes', 'timeZone', 'tags', 'enrollmentString', 'url', 'notes',
+        'isBoundToConfigTemplate', 'configTemplateId', 'isVirtual',
+    )
+    FIELDS = __slots__
+    INTERNED = frozenset(['timeZone'])
+    SHARED = frozenset(['productTypes', 'tags'])
+
+
+class Device(Record):
+    __slots__ = (
+        'serial', 'name', 'mac', 'networkId', 'productType', 'model', 'address', 'lat', 'lng', 'notes', 'tags',
+        'firmware', 'lanIp', 'url',
+    )
+    FIELDS = __slots__
+    INTERNED = frozenset(['networkId', 'productType', 'model', 'firmware'])
+    SHARED = frozenset(['tags'])
+
+
+class Rename(Mapping):
+    __slots__ = ('network', 'new_name')
+
+    # the keys of a rename, in the order rename results have always been written
+    KEYS = (
+        'organizationName', 'organizationId', 'network_id', 'name', 'productTypes', 'timeZone', 'tags',
+        'enrollmentString', 'url', 'notes', 'isBoundToConfigTemplate', 'new_name', 'old_name',
+    )
+    _key_set = frozenset(KEYS)
+
+    def __init__(self, network, new_name):
+        """
+        one planned rename - refers to the matched network instead of copying its fields
+        """
+        self.network = network
+        self.new_name = new_name
+
+    def __getitem__(self, key):
+        if key == 'network_id':
+            return self.network['id']
+        if key == 'old_name':
+            return self.network['name']
+        if key == 'new_name':
+            return self.new_name
+        if key in self._key_set:
+            return self.network.get(key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f'Rename({dict(self)!r})'
@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+import contextvars
+import time
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - scheduler.py
+
+per-organization token bucket scheduler for Dashboard API requests
+
+The Dashboard API rate limit is applied per organization, so each organizationId gets its own token bucket and
+requests for different orgs never wait on each other's budget.  A key-level bucket caps the total request rate
+of the API key, and the session's AdaptiveLimiter (concurrency.py) still bounds the number of requests in flight.
+
+merakilib coroutines tag their requests with the org they belong to:
+
+async def iter_org_networks(dashboard, org):
+    with scheduler.organization(org['id']):
+        async for page in pages.iter_pages(dashboard.aiomeraki, metadata, f'/organizations/{org["id"]}/networks'):
+            yield page
+
+Requests made outside of an organization() block only draw from the key-level bucket.
+'''
+
+# documented Dashboard API limits
+ORG_RATE = 10
+ORG_BURST = 10
+KEY_RATE = 100
+KEY_BURST = 100
+
+_current_org = contextvars.ContextVar('orgsplit_current_org', default=None)
+
+
+@contextlib.contextmanager
+def organization(org_id):
+    '''
+    Attributes every Dashboard request made inside the block (in the current task) to org_id
+    '''
+    token = _current_org.set(str(org_id) if org_id is not None else None)
+    try:
+        yield
+    finally:
+        _current_org.reset(token)
+
+
+def current_organization():
+    return _current_org.get()
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        """
+        classic token bucket - refills at rate tokens/second up to capacity
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.requests = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        '''
+        Takes a token and returns how many seconds the caller must wait before using it
+        '''
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        self.requests += 1
+
+        delay = 0.0
+        if self.tokens < 0:
+            delay = -self.tokens / self.rate
+        delay = max(delay, self.paused_until - now)
+
+        self.waited += delay
+        return delay
+
+    def penalize(self, seconds):
+        '''
+        Stops handing out tokens for the given number of seconds (e.g. a 429 Retry-After)
+        '''
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class OrgScheduler(object):
+    def __init__(self, limiter, org_rate=ORG_RATE, org_burst=ORG_BURST, key_rate=KEY_RATE, key_burst=KEY_BURST):
+        """
+        async context manager that gates a single Dashboard request on its org bucket, the key bucket and the limiter
+        """
+        self.limiter = limiter
+        self.org_rate = org_rate
+        self.org_burst = org_burst
+        self.key_bucket = TokenBucket(key_rate, key_burst)
+        self.org_buckets = {}
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter.release()
+
+    def bucket(self, org_id):
+        bucket = self.org_buckets.get(org_id)
+        if bucket is None:
+            bucket = self.org_buckets[org_id] = TokenBucket(self.org_rate, self.org_burst)
+        return bucket
+
+    async def acquire(self):
+        org_id = current_organization()
+
+        # reserve both tokens up front and sleep once for whichever is further away
+        delay = self.key_bucket.delay()
+        if org_id is not None:
+            delay = max(delay, self.bucket(org_id).delay())
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # only take a concurrency slot once the request is actually allowed to go out
+        await self.limiter.acquire()
+
+    async def release(self):
+        await self.limiter.release()
+
+    def on_throttle(self, retry_after=None):
+        '''
+        A 429 pauses the org it was attributed to; other orgs keep their budget
+        '''
+        org_id = current_organization()
+        if org_id is not None:
+            self.bucket(org_id).penalize(retry_after or 1.0)
+        else:
+            self.key_bucket.penalize(retry_after or 1.0)
+
+    def report(self):
+        return {
+            'organizations': len(self.org_buckets),
+            'requests': self.key_bucket.requests,
+            'org_wait_seconds': round(sum(bucket.waited for bucket in self.org_buckets.values()), 1),
+            'key_wait_seconds': round(self.key_bucket.waited, 1),
+        }
@@ -0,0 +1,343 @@
+import meraki
+import meraki.aio
+import aiohttp
+import asyncio
+import os
+import time
+
+from orgsplit_tools.merakilib import cache, concurrency, metrics, pool, scheduler, tracing
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - session.py
+
+one AsyncDashboardAPI session and one event loop shared by every merakilib call made during a CLI command
+
+The subcommands open a DashboardSession once and pass it to the merakilib modules instead of an API key, so
+getOrganizations, network listings, appliance fan-outs and writes all reuse the same warm, keep-alive connection pool.
+
+example:
+with DashboardSession(api_key) as dashboard:
+    all_orgs = dashboard.get_organizations()
+    networks = get_networks.asyncget_networks(dashboard=dashboard, orgs=all_orgs)
+'''
+
+BASE_URL = 'https://api.meraki.com/api/v1'
+
+# seconds an idle connection is kept open - long enough to survive the interactive confirms between phases
+KEEPALIVE_TIMEOUT = 120
+CONNECTION_LIMIT = 100
+
+
+def _create_logdir(dir_name):
+    path_exists = os.path.exists(dir_name)
+    if not path_exists:
+        os.makedirs(dir_name)
+
+    return dir_name
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class DashboardSession(object):
+    def __init__(self, api_key, debug=False, cert_path=None, base_url=BASE_URL,
+                 max_concurrency=concurrency.DEFAULT_MAXIMUM, org_rate=scheduler.ORG_RATE, key_rate=scheduler.KEY_RATE,
+                 response_cache=None, refresh=False, metrics_dir=None, command=None):
+        """
+        owns the event loop and the AsyncDashboardAPI client used for the lifetime of a CLI command
+        """
+        self.api_key = api_key
+        self.debug = debug
+        self.cert_path = cert_path
+        self.base_url = base_url
+
+        # optional cache.ResponseCache - refresh skips cached reads but still stores fresh responses
+        self.cache = response_cache
+        self.refresh = refresh
+
+        # shared by every fan-out made through this session (see concurrency.py and scheduler.py)
+        self.limiter = concurrency.AdaptiveLimiter(maximum=max_concurrency)
+        self.scheduler = scheduler.OrgScheduler(
+            self.limiter,
+            org_rate=org_rate,
+            org_burst=max(org_rate, scheduler.ORG_BURST),
+            key_rate=key_rate,
+            key_burst=max(key_rate, scheduler.KEY_BURST),
+        )
+        # fan-out worker pool size (pool.py) - as many workers as the limiter may ever allow requests in flight
+        self.workers = self.limiter.maximum
+
+        # every call made through the session is measured (metrics.py) and written to metrics_dir on close
+        self.metrics = metrics.ApiMetrics()
+        self.metrics_dir = metrics_dir
+        self.command = command
+        # with orgsplit --trace, each call also becomes a span on its org's track of the timeline
+        if tracing.active() is not None:
+            self.metrics.listeners.append(tracing.active().add_call)
+
+        if debug:
+            self.debug_values = {
+                'output_log': True,
+                'output_console': True,
+                'suppress_logging': False,
+                'log_dir': 'logs'
+            }
+        else:
+            self.debug_values = {
+                'output_log': False,
+                'output_console': False,
+                'suppress_logging': True,
+                'log_dir': None
+            }
+
+        self.loop = None
+        self.aiomeraki = None
+
+    @classmethod
+    def from_options(cls, api_key, options):
+        '''
+        Builds a session from the global CLI options stored on the click context object (ctx.obj)
+        '''
+        options = options or {}
+
+        response_cache = None
+        if options.get('cache'):
+            # --cache-ttl 0 is a valid ttl (every entry is already stale), so only a missing option falls back to the default
+            ttl = cache.DEFAULT_TTL if options.get('cache_ttl') is None else options['cache_ttl']
+            response_cache = cache.ResponseCache(ttl=ttl)
+
+        return cls(
+            api_key,
+            debug=options.get('debug', False),
+            cert_path=options.get('cert_path'),
+            base_url=options.get('base_url') or BASE_URL,
+            max_concurrency=options.get('max_concurrency') or concurrency.DEFAULT_MAXIMUM,
+            org_rate=options.get('org_rate') or scheduler.ORG_RATE,
+            key_rate=options.get('key_rate') or scheduler.KEY_RATE,
+            response_cache=response_cache,
+            refresh=options.get('refresh', False),
+            metrics_dir=options.get('metrics_dir'),
+            command=options.get('command'),
+        )
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        if self.aiomeraki is not None:
+            return self
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.aiomeraki = self.loop.run_until_complete(self._open())
+
+        return self
+
+    async def _open(self):
+        if self.debug_values['output_log']:
+            log_path = _create_logdir(dir_name=self.debug_values['log_dir'])
+        else:
+            log_path = self.debug_values['log_dir']
+
+        # NOTE: the SDK creates its aiohttp session in __init__, so it has to be instantiated inside the running loop
+        aiomeraki = meraki.aio.AsyncDashboardAPI(
+            self.api_key,
+            base_url=self.base_url,
+            log_file_prefix=__file__[:-3],
+            log_path=log_path,
+            maximum_concurrent_requests=self.limiter.maximum,
+            maximum_retries=100,
+            wait_on_rate_limit=True,
+            output_log=self.debug_values['output_log'],
+            print_console=self.debug_values['output_console'],
+            suppress_logging=self.debug_values['suppress_logging'],
+            certificate_path=self.cert_path)
+
+        await self._install_client(aiomeraki)
+
+        return aiomeraki
+
+    async def _install_client(self, aiomeraki):
+        '''
+        Replaces the SDK's default aiohttp session with one tuned for connection reuse across command phases,
+        and the SDK's fixed request semaphore with the session's per-org scheduler and adaptive limiter
+        '''
+        rest_session = aiomeraki._session
+        headers = getattr(rest_session, '_headers', None)
+        if headers is None or not hasattr(rest_session, '_req_session'):
+            # unexpected SDK internals - keep the SDK's own client
+            return
+
+        await rest_session._req_session.close()
+
+        # every SDK request (including each page and retry loop) is wrapped in "async with" this object
+        rest_session._concurrent_requests_semaphore = self.scheduler
+        self.metrics.instrument(rest_session)
+
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        rest_session._req_session = aiohttp.ClientSession(
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=rest_session._single_request_timeout),
+            connector=connector,
+            trace_configs=[self._trace_config()],
+        )
+
+    def _trace_config(self):
+        '''
+        aiohttp request hooks that feed response status back into the scheduler, adaptive limiter and metrics
+        '''
+        async def on_request_start(client_session, trace_ctx, params):
+            self.metrics.on_attempt_start()
+
+        async def on_request_exception(client_session, trace_ctx, params):
+            self.metrics.on_attempt_end()
+
+        async def on_request_end(client_session, trace_ctx, params):
+            status = params.response.status
+            retry_after = _retry_after(params.response.headers) if status == 429 else None
+            self.metrics.on_attempt_end(status=status, retry_after=retry_after)
+
+            if status == 429:
+                self.scheduler.on_throttle(retry_after=retry_after)
+                # an org-attributed 429 only pauses that org's bucket, not every request in the run
+                if scheduler.current_organization() is not None:
+                    retry_after = None
+                self.limiter.on_throttle(retry_after=retry_after)
+            elif 200 <= status < 300:
+                self.limiter.on_success()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_request_end.append(on_request_end)
+
+        return trace_config
+
+    def run(self, coro):
+        '''
+        Runs a merakilib coroutine to completion on the shared loop
+        '''
+        return self.loop.run_until_complete(coro)
+
+    def close(self):
+        if self.aiomeraki is None:
+            return
+
+        if self.limiter.requests:
+            report = self.limiter.report()
+            print(
+                f'Adaptive concurrency converged on {report["converged"]} concurrent requests '
+                f'(peak { report["peak"] }, { report["throttled"] } rate limited responses, { report["requests"] } requests '
+                f'across { self.scheduler.report()["organizations"] } organizations)'
+            )
+
+        if self.metrics_dir and self.metrics.total.calls:
+            self.write_metrics()
+
+        try:
+            self.loop.run_until_complete(self.aiomeraki.__aexit__(None, None, None))
+            # give aiohttp a moment to shut down TLS transports cleanly
+            self.loop.run_until_complete(asyncio.sleep(0.25))
+        finally:
+            self.aiomeraki = None
+            self.loop.close()
+            asyncio.set_event_loop(None)
+            if self.cache is not None:
+                self.cache.close()
+
+    def write_metrics(self):
+        '''
+        Writes this run's API metrics as JSON and Prometheus text to metrics_dir
+        '''
+        _create_logdir(dir_name=self.metrics_dir)
+        timestr = time.strftime("%Y%m%d-%H%M%S")
+        path_prefix = os.path.join(self.metrics_dir, f'orgsplit_{self.command or "command"}_{timestr}_metrics')
+
+        json_path, prom_path = self.metrics.write(
+            path_prefix,
+            command=self.command,
+            concurrency=self.limiter.report() if self.limiter.requests else None,
+            scheduler=self.scheduler.report(),
+        )
+        print(f'API metrics written to "{ json_path }" and "{ prom_path }"')
+
+    async def cached(self, endpoint, params, fetch):
+        '''
+        Returns the cached response for endpoint/params, otherwise awaits fetch() and caches its result
+        '''
+        if self.cache is None:
+            return await fetch()
+
+        response = self.cache_get(endpoint, params)
+        if response is not None:
+            return response
+
+        response = await fetch()
+        self.cache_set(endpoint, params, response)
+
+        return response
+
+    def cache_get(self, endpoint, params):
+        '''
+        Returns the cached response for endpoint/params, or None when it's missing or caching is off (or --refresh)
+        '''
+        if self.cache is None or self.refresh:
+            return None
+        return self.cache.get(self.api_key, endpoint, params)
+
+    def cache_set(self, endpoint, params, response):
+        if self.cache is not None and response is not None:
+            self.cache.set(self.api_key, endpoint, params, response)
+
+    def invalidate(self, endpoint, params=None):
+        '''
+        Drops a cached response after a write has made it stale
+        '''
+        if self.cache is not None:
+            self.cache.invalidate(self.api_key, endpoint, params)
+
+    def get_organizations(self):
+        return self.run(self.cached('getOrganizations', None, self.aiomeraki.organizations.getOrganizations))
+
+    def get_license_overview(self, org_id):
+        return self.run(self._get_license_overview(org_id))
+
+    async def _get_license_overview(self, org_id):
+        with scheduler.organization(org_id):
+            return await self.aiomeraki.organizations.getOrganizationLicensesOverview(organizationId=org_id)
+
+    def get_license_overviews(self, orgs):
+        '''
+        Returns [(org, license overview)] for every org, fetched concurrently - the overview is None when the call failed
+        '''
+        return self.run(self._get_license_overviews(orgs))
+
+    async def _get_license_overviews(self, orgs):
+        async def _org_overview(org):
+            try:
+                return org, await self._get_license_overview(org['id'])
+
+            except meraki.exceptions.AsyncAPIError as e:
+                print(f'Meraki AIO API Error (OrgID "{ org["id"] }", OrgName "{ org["name"] }"): \n { e }')
+                return org, None
+
+        return [
+            org_overview async for org_overview in
+            pool.map_unordered(_org_overview, orgs, workers=self.workers, total=len(orgs), progress=False)
+        ]
@@ -0,0 +1,165 @@
+import contextlib
+import cProfile
+import itertools
+import json
+import os
+import re
+import time
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - tracing.py
+
+Chrome trace-event timeline of a command run (orgsplit --trace FILE), viewable in chrome://tracing or ui.perfetto.dev
+
+Commands mark their phases with tracing.phase('network fetch'), which is a no-op unless a Tracer is active.  Phases
+are complete ("X") events on the "phases" track.  Every Dashboard API call (recorded by metrics.py, retries included)
+becomes an async event on its organization's track, with its status, attempts, 429s and scheduler wait as args, so
+the API calls line up under the phase that made them.
+
+With profile=True each top-level phase also runs under cProfile and its stats are written next to the trace
+(<trace>.<n>_<phase>.prof, readable with python -m pstats or snakeviz), so local CPU hot spots can be compared with
+the network waits on the timeline.
+
+example:
+tracer = tracing.activate(tracing.Tracer('run.trace.json', profile=True))
+with tracing.phase('network fetch'):
+    ...
+tracer.close()
+'''
+
+PHASES_TID = 0
+
+_active = None
+
+
+class Tracer(object):
+    def __init__(self, path, profile=False):
+        """
+        collects trace events for one command run and writes them to path on close()
+        """
+        self.path = path
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.org_tids = {}
+        self.call_ids = itertools.count(1)
+        self.profiles = []
+        self._depth = 0
+        self._phase_count = 0
+
+    def _ts(self, perf_counter):
+        # trace timestamps are microseconds
+        return round((perf_counter - self.started) * 1e6, 1)
+
+    def _org_tid(self, org_id):
+        org_id = str(org_id or 'unattributed')
+        tid = self.org_tids.get(org_id)
+        if tid is None:
+            tid = self.org_tids[org_id] = len(self.org_tids) + 1
+        return tid
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        self._phase_count += 1
+        profile_path = None
+        profiler = None
+        # cProfile can't nest, so only top-level phases are profiled
+        if self.profile and self._depth == 0:
+            slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+            profile_path = f'{self.path}.{self._phase_count:02d}_{slug}.prof'
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            self._depth -= 1
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+                self.profiles.append(profile_path)
+                args = dict(args, profile=profile_path)
+
+            self.events.append({
+                'name': name,
+                'cat': 'phase',
+                'ph': 'X',
+                'ts': self._ts(started),
+                'dur': round((ended - started) * 1e6, 1),
+                'pid': self.pid,
+                'tid': PHASES_TID,
+                'args': args,
+            })
+
+    def add_call(self, call):
+        '''
+        metrics.ApiMetrics listener - records one finished API call as an async begin/end pair on its org's track
+        '''
+        call_id = next(self.call_ids)
+        tid = self._org_tid(call.org_id)
+        event = {
+            'name': call.endpoint,
+            'cat': 'api',
+            'id': call_id,
+            'pid': self.pid,
+            'tid': tid,
+        }
+        self.events.append(dict(event, ph='b', ts=self._ts(call.started), args={
+            'organizationId': call.org_id,
+            'status': call.status,
+            'attempts': call.attempts,
+            'throttled': call.throttled,
+            'retry_after_seconds': call.retry_after_seconds,
+            'wait_ms': round(call.wait * 1e3, 1),
+            'wire_ms': round(call.wire * 1e3, 1),
+        }))
+        self.events.append(dict(event, ph='e', ts=self._ts(call.started + call.duration)))
+
+    def trace(self):
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': PHASES_TID, 'args': {'name': 'orgsplit'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': PHASES_TID, 'args': {'name': 'phases'}},
+        ]
+        for org_id, tid in self.org_tids.items():
+            metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': f'org {org_id}'}})
+
+        return {
+            'traceEvents': metadata + sorted(self.events, key=lambda event: event['ts']),
+            'displayTimeUnit': 'ms',
+            'otherData': {'profiles': self.profiles},
+        }
+
+    def close(self):
+        with open(self.path, 'w') as outfile:
+            json.dump(self.trace(), outfile)
+
+        print(f'Trace written to "{ self.path }" (open it in chrome://tracing or ui.perfetto.dev)')
+        for profile_path in self.profiles:
+            print(f'Phase profile written to "{ profile_path }"')
+
+
+def activate(tracer):
+    global _active
+    _active = tracer
+    return tracer
+
+
+def active():
+    return _active
+
+
+def phase(name, **args):
+    '''
+    Context manager marking a command phase on the active trace (does nothing when --trace isn't used)
+    '''
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name, **args)
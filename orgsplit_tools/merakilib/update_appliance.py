@@ -0,0 +1,123 @@
+import meraki
+
+from orgsplit_tools.merakilib import action_batches, pool, scheduler
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+meraki - update_appliance.py
+
+small async tool that sets the appliance client tracking method for a list of networks (precheck --fix)
+
+Takes the appliance settings records returned by get_appliance.asyncget_networks, either one
+updateNetworkApplianceSettings call per network on the session's worker pool or packed into per-org action batches,
+and returns one result per network with the previous and the new tracking method:
+
+[{'networkName': 'Site 1 - appliance',
+  'networkId': 'L_12345',
+  'organizationId': '1234',
+  'previousClientTrackingMethod': 'Unique client identifier',
+  'clientTrackingMethod': 'MAC address'}]
+'''
+
+MAC_ADDRESS = 'MAC address'
+
+
+def _result(network, method, **extra):
+    return {
+        'networkName': network['networkName'],
+        'networkId': network['networkId'],
+        'organizationId': network['organizationId'],
+        'previousClientTrackingMethod': network['clientTrackingMethod'],
+        'clientTrackingMethod': method,
+        **extra,
+    }
+
+
+async def _update_client_tracking(aiomeraki, network, method):
+    '''
+    Async function that calls updateNetworkApplianceSettings for a given network
+    '''
+
+    with scheduler.organization(network['organizationId']):
+        try:
+            appliance_settings = await aiomeraki.appliance.updateNetworkApplianceSettings(
+                networkId=network['networkId'],
+                clientTrackingMethod=method
+            )
+
+        except meraki.exceptions.AsyncAPIError as e:
+            print(
+                f'Meraki AIO API Error (networkID "{ network["networkId"] }", networkName "{ network["networkName"] }"): \n { e }'
+            )
+            appliance_settings = None
+
+        except Exception as e:
+            print(f'some other ERROR: {e}')
+            appliance_settings = None
+
+    return _result(network, appliance_settings['clientTrackingMethod']) if appliance_settings else None
+
+
+async def _async_apicall(dashboard, networks, method):
+    update_results = []
+
+    async for network_json in pool.map_unordered(
+            lambda network: _update_client_tracking(dashboard.aiomeraki, network, method),
+            networks,
+            workers=dashboard.workers,
+            total=len(networks),
+    ):
+
+        if network_json:
+            update_results.append(network_json)
+
+    return update_results
+
+
+async def _async_batch_apicall(dashboard, networks, method, batch_size):
+    update_results = []
+    failed_networks = []
+
+    async for batch_networks, batch, error in action_batches.iter_batches(
+            dashboard,
+            networks,
+            org_id=lambda network: network['organizationId'],
+            to_action=lambda network: {
+                'resource': f'/networks/{network["networkId"]}/appliance/settings',
+                'operation': 'update',
+                'body': {'clientTrackingMethod': method},
+            },
+            batch_size=batch_size,
+    ):
+
+        if batch is not None and batch['status']['completed']:
+            update_results.extend(_result(network, method, actionBatchId=batch['id']) for network in batch_networks)
+            continue
+
+        if batch is not None:
+            error = action_batches.batch_errors(batch)
+        print(
+            f'Action batch for { len(batch_networks) } networks failed (OrgID "{ batch_networks[0]["organizationId"] }"): \n { error }'
+        )
+        failed_networks.extend(batch_networks)
+
+    # a failed batch applies none of its actions, so update its networks one at a time to isolate the bad ones
+    if failed_networks:
+        print(f'Retrying { len(failed_networks) } networks from failed action batches one at a time')
+        update_results.extend(await _async_apicall(dashboard, failed_networks, method))
+
+    return update_results
+
+
+def async_update_client_tracking(dashboard, networks, method=MAC_ADDRESS, action_batch=False,
+                                 batch_size=action_batches.MAX_ACTIONS):
+    '''
+    Sets clientTrackingMethod on the given appliance networks using the shared DashboardSession (see session.py)
+    '''
+    if action_batch:
+        return dashboard.run(_async_batch_apicall(dashboard, networks, method, batch_size))
+
+    return dashboard.run(_async_apicall(dashboard, networks, method))
@@ -1,9 +1,6 @@
 import meraki
-import meraki.aio
-import asyncio
-import tqdm.asyncio
-import os
-from pprint import pprint
+
+from orgsplit_tools.merakilib import action_batches, pool, scheduler
 
 __author__ = 'Zach Brewer'
 __email__ = 'zbrewer@cisco.com'
@@ -39,104 +36,113 @@ example list with one or more dicts and required fields to pass into async_updat
   'timeZone': 'America/Los_Angeles',
   'url': 'https://n51.meraki.com/url'}]'''
 
-def _create_logdir(dir_name, package_dir):
-    current_path = os.path.dirname(os.path.realpath(__file__))
-
-    # are we in the package directory? if so create our log file in the parent dir
-    if os.path.split(current_path)[1] == package_dir:
-        parent_dir = os.path.abspath(os.path.join(current_path, os.pardir))
-        parent_log_path = os.path.join(parent_dir, dir_name)
-        path_exists = os.path.exists(parent_log_path)
-        log_path = parent_log_path
-    else:
-        path_exists = os.path.exists(dir_name)
-        log_path =  os.path.join(current_path, dir_name)
-
-    if not path_exists:
-        os.makedirs(log_path)
-    
-    return log_path
-
-async def _update_networks(aiomeraki, network_to_update):
+async def _update_networks(aiomeraki, network_to_update, journal=None):
     '''
-    Async function that calls updateNetwork for a given network
+    Async function that calls updateNetwork for a given network (and journals the outcome when given a journal)
     '''
 
-    try:
-        updated_network = await aiomeraki.networks.updateNetwork(
-            networkId=network_to_update['network_id'],
-            name=network_to_update['new_name']
-        )
-
-    except meraki.exceptions.AsyncAPIError as e:
+    error = None
+    with scheduler.organization(network_to_update['organizationId']):
+        try:
+            updated_network = await aiomeraki.networks.updateNetwork(
+                networkId=network_to_update['network_id'],
+                name=network_to_update['new_name']
+            )
+
+        except meraki.exceptions.AsyncAPIError as e:
+            print(
+                f'Meraki AIO API Error (NetworkID "{ network_to_update["network_id"] }", Network Name "{ network_to_update["old_name"] }"): \n { e }'
+            )
+
+            updated_network = None
+            error = e
+
+        except Exception as e:
+            print(e)
+            print(f'some other ERROR: {e}')
+            updated_network = None
+            error = e
+
+    update_json = [{**network_to_update, **updated_network}] if updated_network else None
+    if journal is not None:
+        journal.record(network_to_update, update_json[0] if update_json else None, error)
+
+    return update_json
+
+async def _async_apicall(dashboard, networks, journal=None):
+    update_results = []
+
+    async for network_json in pool.map_unordered(
+            lambda network: _update_networks(dashboard.aiomeraki, network, journal),
+            networks,
+            workers=dashboard.workers,
+            total=len(networks),
+    ):
+
+        # with a journal the results stream to it (and on to the result file) instead of being collected here
+        if network_json and journal is None:
+            update_results.extend(iter(network_json))
+
+    # cached network listings for the touched orgs are now stale
+    for org_id in {network['organizationId'] for network in networks}:
+        dashboard.invalidate('getOrganizationNetworks', {'organizationId': org_id})
+
+    return update_results
+
+def _rename_action(network_to_update):
+    return {
+        'resource': f'/networks/{network_to_update["network_id"]}',
+        'operation': 'update',
+        'body': {'name': network_to_update['new_name']},
+    }
+
+async def _async_batch_apicall(dashboard, networks, batch_size, journal=None):
+    update_results = []
+    failed_networks = []
+
+    async for batch_networks, batch, error in action_batches.iter_batches(
+            dashboard,
+            networks,
+            org_id=lambda network: network['organizationId'],
+            to_action=_rename_action,
+            batch_size=batch_size,
+    ):
+
+        if batch is not None and batch['status']['completed']:
+            for network in batch_networks:
+                update_json = {**network, 'name': network['new_name'], 'actionBatchId': batch['id']}
+                if journal is not None:
+                    journal.record(network, update_json)
+                else:
+                    update_results.append(update_json)
+            continue
+
+        if batch is not None:
+            error = action_batches.batch_errors(batch)
         print(
-            f'Meraki AIO API Error (NetworkIDs "{ network_to_update["network_ids"] }", Combined Network Name "{ network_to_update["network_name_combined"] }"): \n { e }'
+            f'Action batch for { len(batch_networks) } networks failed (OrgID "{ batch_networks[0]["organizationId"] }"): \n { error }'
         )
+        failed_networks.extend(batch_networks)
+
+    # a failed batch applies none of its actions, so rename its networks one at a time to isolate the bad ones
+    if failed_networks:
+        print(f'Retrying { len(failed_networks) } networks from failed action batches one at a time')
+        update_results.extend(await _async_apicall(dashboard, failed_networks, journal))
 
-        updated_network = None
-
-    except Exception as e:
-        print(e)
-        print(f'some other ERROR: {e}')
-        updated_network = None
-
-    return [{**network_to_update, **updated_network}] if updated_network else None
-
-async def _async_apicall(api_key, networks, debug_values, cert_path):
-    # if debug_values['output_log']:
-    #     log_path = _create_logdir(dir_name=debug_values['log_dir'], package_dir = 'masync')
-    # else:
-    #     log_path = debug_values['log_dir']
-
-    # Instantiate a Meraki dashboard API session
-    # NOTE: you have to use "async with" so that the session will be closed correctly at the end of the usage
-    async with meraki.aio.AsyncDashboardAPI(
-            api_key,
-            base_url='https://api.meraki.com/api/v1',
-            log_file_prefix=__file__[:-3],
-            # log_path=log_path,
-            maximum_concurrent_requests=10,
-            maximum_retries=100,
-            wait_on_rate_limit=True,
-            output_log=debug_values['output_log'],
-            print_console=debug_values['output_console'],
-            suppress_logging=debug_values['suppress_logging'],
-            certificate_path=cert_path) as aiomeraki:
-
-        update_results = []
-
-        network_tasks = [_update_networks(aiomeraki, network) for network in networks]
-        for task in tqdm.tqdm(
-                asyncio.as_completed(network_tasks),
-                total=len(networks),
-                colour='green',
-        ):
-
-            network_json = await task
-            if network_json:
-                update_results.extend(iter(network_json))
-
-        return update_results
-
-def async_update_networks(api_key, networks, debug_app=False, cert_path=None):
-    if debug_app:
-        debug_values = {
-            'output_log': True,
-            'output_console': True,
-            'suppress_logging': False,
-            'log_dir': 'logs'
-        }
-    else:
-        debug_values = {
-            'output_log': False,
-            'output_console': False,
-            'suppress_logging': True,
-            'log_dir': None
-        }
-
-    #begin async loop
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(_async_apicall(api_key, networks, debug_values, cert_path))
+    for org_id in {network['organizationId'] for network in networks}:
+        dashboard.invalidate('getOrganizationNetworks', {'organizationId': org_id})
 
+    return update_results
 
+def async_update_networks(dashboard, networks, action_batch=False, batch_size=action_batches.MAX_ACTIONS, journal=None):
+    '''
+    Renames the given networks using the shared DashboardSession (see session.py)
+
+    action_batch=True packs the renames into per-org action batches of batch_size instead of one updateNetwork call
+    per network.  Each rename is recorded in journal (journal.py) as it completes when one is given, and only
+    without a journal are the results collected and returned
+    '''
+    if action_batch:
+        return dashboard.run(_async_batch_apicall(dashboard, networks, batch_size, journal))
 
+    return dashboard.run(_async_apicall(dashboard, networks, journal))
@@ -0,0 +1,635 @@
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+mockserver.py
+
+local stand-in for the Dashboard API endpoints used by orgsplit, for benchmarks and end-to-end testing
+
+Generates synthetic organizations whose networks follow the product-type split naming convention
+("Site 00042 - appliance", "Site 00042 - switch", ...), paginates with Link headers like the real API and can inject
+latency, 429s (with Retry-After) and 5xx errors.  Networks are generated on the fly from their index, so 100k-network
+orgs cost almost no memory; renames and combines are kept in a small overlay.
+
+usage:
+python -m orgsplit_tools.mockserver --orgs 3 --networks 10000 --latency 0.05 --throttle-rate 0.01
+orgsplit --base-url http://127.0.0.1:8080/api/v1 device-count -k anykey -o all
+
+GET /_mock/stats returns request counts per endpoint and status, POST /_mock/reset clears them.
+'''
+
+PRODUCT_TYPES = ['appliance', 'switch', 'wireless']
+SUFFIXES = {
+    'appliance': ' - appliance',
+    'switch': ' - switch',
+    'wireless': ' - wireless',
+}
+MODELS = {
+    'appliance': 'MX68',
+    'switch': 'MS120-8',
+    'wireless': 'MR36',
+}
+
+# the SDK prepends its base URL to any pagination link that doesn't contain "meraki.com", so links carry a marker
+LINK_MARKER = 'source=orgsplit-mock.meraki.com'
+
+
+class MockDashboard(object):
+    def __init__(self, orgs=1, networks=1000, devices_per_network=2, seed=0, latency=0.0, jitter=0.0,
+                 throttle_rate=0.0, error_rate=0.0, retry_after=1, org_rate=0, overview=True, batch_delay=0.0):
+        """
+        synthetic Dashboard state plus the fault injection settings used by MockRequestHandler
+        """
+        self.org_count = orgs
+        self.network_count = networks
+        self.devices_per_network = devices_per_network
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        # when set, emulate the real per-org rate limit (requests/second) and answer 429 above it
+        self.org_rate = org_rate
+        # serve devices/overview/byModel (False answers 404 like an API without the endpoint)
+        self.overview = overview
+        # action batches report completed only after this many seconds (their actions apply at creation)
+        self.batch_delay = batch_delay
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.renamed = {}
+        self.appliance_overrides = {}
+        self.deleted = set()
+        self.combined = {str(org_id): [] for org_id in self.org_ids()}
+        self.action_batches = {}
+        self.changes = []
+        self.org_windows = {}
+        self.stats = {}
+        self.started = time.monotonic()
+
+    def org_ids(self):
+        return [str(100000 + index) for index in range(self.org_count)]
+
+    def organization(self, org_id):
+        index = int(org_id) - 100000
+        return {
+            'id': org_id,
+            'name': f'Mock Org {index:03d}',
+            'url': f'https://n1.meraki.com/o/{org_id}/manage/organization/overview',
+            'api': {'enabled': True},
+            'licensing': {'model': 'co-term'},
+            'cloud': {'region': {'name': 'North America'}},
+        }
+
+    def network_id(self, org_id, index):
+        return f'N_{org_id}_{index}'
+
+    def parse_network_id(self, network_id):
+        match = re.match(r'^N_(\d+)_(c?\d+)$', network_id)
+        if not match:
+            return None, None
+        return match.group(1), match.group(2)
+
+    def network(self, org_id, index):
+        network_id = self.network_id(org_id, index)
+        product = PRODUCT_TYPES[index % len(PRODUCT_TYPES)]
+        site = index // len(PRODUCT_TYPES)
+
+        return {
+            'id': network_id,
+            'organizationId': org_id,
+            'name': self.renamed.get(network_id, f'Site {site:05d}{SUFFIXES[product]}'),
+            'productTypes': [product],
+            'timeZone': 'America/Los_Angeles',
+            'tags': [],
+            'enrollmentString': None,
+            'url': f'https://n1.meraki.com/{network_id}/manage/usage/list',
+            'notes': '',
+            'isBoundToConfigTemplate': index % 50 == 0,
+        }
+
+    def find_network(self, network_id):
+        org_id, index = self.parse_network_id(network_id)
+        if org_id not in self.combined or network_id in self.deleted:
+            return None
+        if index.startswith('c'):
+            for network in self.combined[org_id]:
+                if network['id'] == network_id:
+                    return network
+            return None
+        if int(index) >= self.network_count:
+            return None
+        return self.network(org_id, int(index))
+
+    def iter_networks(self, org_id, start=0):
+        '''
+        Yields (cursor, network) for every live network in the org, starting at cursor start
+        '''
+        for index in range(start, self.network_count):
+            network_id = self.network_id(org_id, index)
+            if network_id not in self.deleted:
+                yield index + 1, self.network(org_id, index)
+
+        combined = self.combined[org_id]
+        for position in range(max(0, start - self.network_count), len(combined)):
+            yield self.network_count + position + 1, combined[position]
+
+    def iter_devices(self, org_id, start=0):
+        per_network = self.devices_per_network
+        for position in range(start, self.network_count * per_network):
+            index, device = divmod(position, per_network)
+            product = PRODUCT_TYPES[index % len(PRODUCT_TYPES)]
+            yield position + 1, {
+                'serial': f'Q2XX-{org_id[-3:]}{index:06d}-{device:02d}',
+                'name': f'device {index}-{device}',
+                'mac': f'00:18:0a:{(index >> 16) & 255:02x}:{(index >> 8) & 255:02x}:{index & 255:02x}',
+                'networkId': self.network_id(org_id, index),
+                'productType': product,
+                'model': MODELS[product],
+                'address': '',
+                'lat': 37.4180951010362,
+                'lng': -122.098531723022,
+                'notes': '',
+                'tags': [],
+                'firmware': 'wireless-29-5-1',
+                'lanIp': None,
+            }
+
+    def devices_overview(self, org_id):
+        per_model = self.network_count // len(PRODUCT_TYPES) * self.devices_per_network
+        remainder = self.network_count % len(PRODUCT_TYPES)
+        counts = []
+        for position, product in enumerate(PRODUCT_TYPES):
+            total = per_model + (self.devices_per_network if position < remainder else 0)
+            counts.append({'model': MODELS[product], 'total': total})
+        return {'counts': counts}
+
+    def appliance_settings(self, network):
+        index = int(self.parse_network_id(network['id'])[1].lstrip('c'))
+        method = 'Unique client identifier' if index % 10 == 0 else 'MAC address'
+        return {
+            'clientTrackingMethod': method,
+            'deploymentMode': 'routed',
+            'dynamicDns': {'enabled': False, 'prefix': 'mock', 'url': 'mock.dynamic-m.com'},
+            **self.appliance_overrides.get(network['id'], {}),
+        }
+
+    def update_appliance_settings(self, network, body):
+        previous = self.appliance_settings(network)
+        overrides = self.appliance_overrides.setdefault(network['id'], {})
+        overrides.update({key: value for key, value in body.items() if key in ('clientTrackingMethod', 'deploymentMode')})
+        settings = self.appliance_settings(network)
+        for key in ('clientTrackingMethod', 'deploymentMode'):
+            if previous[key] != settings[key]:
+                self.log_change(network, 'Appliance settings', key, previous[key], settings[key])
+        return settings
+
+    def rename_network(self, network, name):
+        self.log_change(network, 'Network settings', 'Network name', network['name'], name)
+        self.renamed[network['id']] = name
+        network['name'] = name
+
+    def log_change(self, network, page, label, old_value, new_value):
+        '''
+        Appends to the configuration change log (callers hold the lock)
+        '''
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.changes.append({
+            'ts': now.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            '_epoch': now.timestamp(),
+            '_organizationId': network['organizationId'],
+            'adminName': 'Mock Admin',
+            'adminEmail': 'admin@example.com',
+            'adminId': '1',
+            'networkName': network['name'],
+            'networkId': network['id'],
+            'networkUrl': network['url'],
+            'page': page,
+            'label': label,
+            'oldValue': json.dumps(old_value),
+            'newValue': json.dumps(new_value),
+        })
+
+    def iter_changes(self, org_id, since, start=0):
+        for index, change in enumerate(self.changes):
+            if index >= start and change['_organizationId'] == org_id and change['_epoch'] >= since:
+                yield index + 1, {key: value for key, value in change.items() if not key.startswith('_')}
+
+    def license_overview(self, org_id):
+        return {
+            'status': 'OK',
+            'expirationDate': 'Dec 31, 2030 UTC',
+            'licensedDeviceCounts': {
+                'MX68': self.network_count // 3,
+                'MS120-8': self.network_count // 3,
+                'wireless': self.network_count // 3,
+            },
+        }
+
+    def check_action(self, action):
+        '''
+        Returns (network, error) for one action batch action - error is set when the action can't be applied
+        '''
+        match = re.match(r'^/networks/([^/]+)(/appliance/settings)?$', action.get('resource', ''))
+        if not match or action.get('operation') != 'update':
+            return None, f'Unsupported action {action.get("operation")} {action.get("resource")}'
+
+        network = self.find_network(match.group(1))
+        if network is None:
+            return None, f'Network {match.group(1)} not found'
+        if match.group(2) and 'appliance' not in network['productTypes']:
+            return None, f'Network {match.group(1)} has no appliance'
+        if not match.group(2) and 'name' in action.get('body', {}) and not action['body']['name']:
+            return None, 'Name cannot be blank'
+        return network, None
+
+    def create_action_batch(self, org_id, actions):
+        now = time.monotonic()
+        with self.lock:
+            pending = [batch for batch in self.action_batches.values()
+                       if batch['organizationId'] == org_id and now < batch['_ready']]
+            if len(pending) >= 5:
+                return 400, {'errors': ['Too many concurrently executing batches. Maximum is 5 confirmed but not yet executed batches.']}
+            if not actions or len(actions) > 100:
+                return 400, {'errors': ['Action batches must contain between 1 and 100 actions']}
+
+            # batches are atomic - validate every action first and apply nothing if one of them is bad
+            checked = [self.check_action(action) for action in actions]
+            errors = [error for network, error in checked if error]
+            if not errors:
+                for action, (network, error) in zip(actions, checked):
+                    if action['resource'].endswith('/appliance/settings'):
+                        self.update_appliance_settings(network, action.get('body', {}))
+                    elif 'name' in action.get('body', {}):
+                        self.rename_network(network, action['body']['name'])
+
+            batch_id = str(len(self.action_batches) + 1)
+            self.action_batches[batch_id] = {
+                'id': batch_id,
+                'organizationId': org_id,
+                'confirmed': True,
+                'synchronous': False,
+                'actions': actions,
+                'status': {'completed': False, 'failed': False, 'errors': errors, 'createdResources': []},
+                '_failed': bool(errors),
+                '_ready': now + self.batch_delay,
+            }
+        return 201, self.action_batch(batch_id)
+
+    def action_batch(self, batch_id):
+        batch = self.action_batches.get(batch_id)
+        if batch is None:
+            return None
+        finished = time.monotonic() >= batch['_ready']
+        status = dict(batch['status'], completed=finished and not batch['_failed'], failed=finished and batch['_failed'])
+        return {**{key: value for key, value in batch.items() if not key.startswith('_')}, 'status': status}
+
+    def record(self, endpoint, status):
+        with self.lock:
+            counts = self.stats.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def over_org_rate(self, org_id):
+        if not self.org_rate or org_id is None:
+            return False
+
+        now = time.monotonic()
+        with self.lock:
+            window = [stamp for stamp in self.org_windows.get(org_id, []) if now - stamp < 1.0]
+            if len(window) >= self.org_rate:
+                self.org_windows[org_id] = window
+                return True
+            window.append(now)
+            self.org_windows[org_id] = window
+        return False
+
+    def report(self):
+        with self.lock:
+            total = sum(sum(counts.values()) for counts in self.stats.values())
+            return {
+                'requests': total,
+                'elapsed': round(time.monotonic() - self.started, 3),
+                'endpoints': json.loads(json.dumps(self.stats)),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.started = time.monotonic()
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # set by make_server()
+    dashboard = None
+
+    routes = [
+        ('GET', r'^/api/v1/organizations$', 'getOrganizations'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/networks$', 'getOrganizationNetworks'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/devices$', 'getOrganizationDevices'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/devices/overview/byModel$', 'getOrganizationDevicesOverviewByModel'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/licenses/overview$', 'getOrganizationLicensesOverview'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/configurationChanges$', 'getOrganizationConfigurationChanges'),
+        ('POST', r'^/api/v1/organizations/(?P<org>[^/]+)/networks/combine$', 'combineOrganizationNetworks'),
+        ('POST', r'^/api/v1/organizations/(?P<org>[^/]+)/actionBatches$', 'createOrganizationActionBatch'),
+        ('GET', r'^/api/v1/organizations/(?P<org>[^/]+)/actionBatches/(?P<batch>[^/]+)$', 'getOrganizationActionBatch'),
+        ('GET', r'^/api/v1/networks/(?P<network>[^/]+)/appliance/settings$', 'getNetworkApplianceSettings'),
+        ('PUT', r'^/api/v1/networks/(?P<network>[^/]+)/appliance/settings$', 'updateNetworkApplianceSettings'),
+        ('PUT', r'^/api/v1/networks/(?P<network>[^/]+)$', 'updateNetwork'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _dispatch(self, method):
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        dashboard = self.dashboard
+
+        if parsed.path == '/_mock/stats':
+            return self._send(200, dashboard.report())
+        if parsed.path == '/_mock/reset':
+            self._read_body()
+            dashboard.reset()
+            return self._send(204)
+
+        for route_method, pattern, endpoint in self.routes:
+            match = re.match(pattern, parsed.path)
+            if route_method == method and match:
+                break
+        else:
+            dashboard.record('unknown', 404)
+            return self._send(404, {'errors': ['Not found']})
+
+        params = match.groupdict()
+        body = self._read_body() if method in ('POST', 'PUT') else {}
+
+        delay = dashboard.latency + (dashboard.random.uniform(0, dashboard.jitter) if dashboard.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        org_id = params.get('org')
+        if org_id is None and params.get('network'):
+            org_id = dashboard.parse_network_id(params['network'])[0]
+
+        roll = dashboard.random.random()
+        if roll < dashboard.throttle_rate or dashboard.over_org_rate(org_id):
+            dashboard.record(endpoint, 429)
+            return self._send(429, {'errors': ['API rate limit exceeded for organization']},
+                              {'Retry-After': str(dashboard.retry_after)})
+        if roll < dashboard.throttle_rate + dashboard.error_rate:
+            status = dashboard.random.choice([500, 502, 503])
+            dashboard.record(endpoint, status)
+            return self._send(status, {'errors': ['Injected server error']})
+
+        status, response, headers = getattr(self, f'_{endpoint}')(params, query, body)
+        dashboard.record(endpoint, status)
+        self._send(status, response, headers)
+
+    def _page(self, items, path, query, default_per_page):
+        '''
+        Slices (cursor, item) pairs into one page and builds the Link header for the next one
+        '''
+        per_page = int(query.get('perPage') or default_per_page)
+        page = []
+        next_cursor = None
+        for cursor, item in items:
+            if len(page) == per_page:
+                next_cursor = page_cursor
+                break
+            page.append(item)
+            page_cursor = cursor
+
+        headers = {}
+        if next_cursor is not None:
+            host = self.headers.get('Host')
+            next_url = f'http://{host}{path}?perPage={per_page}&startingAfter={next_cursor}&{LINK_MARKER}'
+            headers['Link'] = f'<{next_url}>; rel=next'
+
+        return page, headers
+
+    def _known_org(self, org_id):
+        return org_id in self.dashboard.combined
+
+    def _getOrganizations(self, params, query, body):
+        return 200, [self.dashboard.organization(org_id) for org_id in self.dashboard.org_ids()], None
+
+    def _getOrganizationNetworks(self, params, query, body):
+        if not self._known_org(params['org']):
+            return 404, {'errors': ['Organization not found']}, None
+        start = int(query.get('startingAfter') or 0)
+        with self.dashboard.lock:
+            page, headers = self._page(
+                self.dashboard.iter_networks(params['org'], start),
+                f'/api/v1/organizations/{params["org"]}/networks', query, 1000
+            )
+        return 200, page, headers
+
+    def _getOrganizationDevices(self, params, query, body):
+        if not self._known_org(params['org']):
+            return 404, {'errors': ['Organization not found']}, None
+        start = int(query.get('startingAfter') or 0)
+        page, headers = self._page(
+            self.dashboard.iter_devices(params['org'], start),
+            f'/api/v1/organizations/{params["org"]}/devices', query, 1000
+        )
+        return 200, page, headers
+
+    def _getOrganizationDevicesOverviewByModel(self, params, query, body):
+        if not self._known_org(params['org']) or not self.dashboard.overview:
+            return 404, {'errors': ['Not found']}, None
+        return 200, self.dashboard.devices_overview(params['org']), None
+
+    def _getOrganizationLicensesOverview(self, params, query, body):
+        if not self._known_org(params['org']):
+            return 404, {'errors': ['Organization not found']}, None
+        return 200, self.dashboard.license_overview(params['org']), None
+
+    def _getOrganizationConfigurationChanges(self, params, query, body):
+        if not self._known_org(params['org']):
+            return 404, {'errors': ['Organization not found']}, None
+        try:
+            since = datetime.datetime.fromisoformat(query['t0'].replace('Z', '+00:00')).timestamp() if query.get('t0') else 0
+        except ValueError:
+            return 400, {'errors': ['Invalid t0']}, None
+        start = int(query.get('startingAfter') or 0)
+        with self.dashboard.lock:
+            page, headers = self._page(
+                self.dashboard.iter_changes(params['org'], since, start),
+                f'/api/v1/organizations/{params["org"]}/configurationChanges', query, 5000
+            )
+        return 200, page, headers
+
+    def _getNetworkApplianceSettings(self, params, query, body):
+        network = self.dashboard.find_network(params['network'])
+        if network is None:
+            return 404, {'errors': ['Network not found']}, None
+        if 'appliance' not in network['productTypes']:
+            return 400, {'errors': ['This endpoint only supports MX networks']}, None
+        return 200, self.dashboard.appliance_settings(network), None
+
+    def _updateNetworkApplianceSettings(self, params, query, body):
+        with self.dashboard.lock:
+            network = self.dashboard.find_network(params['network'])
+            if network is None:
+                return 404, {'errors': ['Network not found']}, None
+            if 'appliance' not in network['productTypes']:
+                return 400, {'errors': ['This endpoint only supports MX networks']}, None
+            settings = self.dashboard.update_appliance_settings(network, body)
+        return 200, settings, None
+
+    def _updateNetwork(self, params, query, body):
+        with self.dashboard.lock:
+            network = self.dashboard.find_network(params['network'])
+            if network is None:
+                return 404, {'errors': ['Network not found']}, None
+            if 'name' in body:
+                self.dashboard.rename_network(network, body['name'])
+        return 200, network, None
+
+    def _createOrganizationActionBatch(self, params, query, body):
+        if not self._known_org(params['org']):
+            return 404, {'errors': ['Organization not found']}, None
+        status, response = self.dashboard.create_action_batch(params['org'], body.get('actions', []))
+        return status, response, None
+
+    def _getOrganizationActionBatch(self, params, query, body):
+        with self.dashboard.lock:
+            batch = self.dashboard.action_batch(params['batch'])
+        if batch is None or batch['organizationId'] != params['org']:
+            return 404, {'errors': ['Action batch not found']}, None
+        return 200, batch, None
+
+    def _combineOrganizationNetworks(self, params, query, body):
+        org_id = params['org']
+        if not self._known_org(org_id):
+            return 404, {'errors': ['Organization not found']}, None
+
+        with self.dashboard.lock:
+            networks = [self.dashboard.find_network(network_id) for network_id in body.get('networkIds', [])]
+            if len(networks) < 2 or None in networks:
+                return 400, {'errors': ['At least two existing networks are required']}, None
+
+            product_types = sorted({product for network in networks for product in network['productTypes']})
+            combined_id = f'N_{org_id}_c{len(self.dashboard.combined[org_id])}'
+            resulting_network = {
+                **networks[0],
+                'id': combined_id,
+                'name': body.get('name'),
+                'productTypes': product_types,
+                'enrollmentString': body.get('enrollmentString'),
+                'url': f'https://n1.meraki.com/{combined_id}/manage/usage/list',
+            }
+            self.dashboard.combined[org_id].append(resulting_network)
+            self.dashboard.deleted.update(network['id'] for network in networks)
+
+        return 200, {'resultingNetwork': resulting_network}, None
+
+
+def make_server(dashboard, host='127.0.0.1', port=0):
+    '''
+    Returns a ThreadingHTTPServer bound to host:port (port 0 picks a free port) serving the given MockDashboard
+    '''
+    handler = type('BoundMockRequestHandler', (MockRequestHandler,), {'dashboard': dashboard})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(dashboard, host='127.0.0.1', port=0):
+    '''
+    Starts the mock server on a daemon thread and returns (server, base_url)
+    '''
+    server = make_server(dashboard, host=host, port=port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, f'http://{host}:{server.server_address[1]}/api/v1'
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8080, show_default=True, type=int)
+@click.option('--orgs', default=1, show_default=True, type=int, help='Number of synthetic organizations')
+@click.option('--networks', default=1000, show_default=True, type=int, help='Networks per organization')
+@click.option('--devices-per-network', default=2, show_default=True, type=int)
+@click.option('--latency', default=0.0, show_default=True, type=float, help='Seconds added to every response')
+@click.option('--jitter', default=0.0, show_default=True, type=float, help='Random extra latency, up to this many seconds')
+@click.option('--throttle-rate', default=0.0, show_default=True, type=float, help='Fraction of requests answered with 429')
+@click.option('--error-rate', default=0.0, show_default=True, type=float, help='Fraction of requests answered with 5xx')
+@click.option('--retry-after', default=1, show_default=True, type=int, help='Retry-After seconds sent with 429s')
+@click.option('--org-rate', default=0, show_default=True, type=int, help='Emulated per-org requests/second limit (0 = off)')
+@click.option('--no-overview', is_flag=True, help='Answer 404 for the devices overview by model endpoint')
+@click.option('--batch-delay', default=0.0, show_default=True, type=float,
+              help='Seconds before an action batch reports completed')
+@click.option('--seed', default=0, show_default=True, type=int)
+def main(host, port, orgs, networks, devices_per_network, latency, jitter, throttle_rate, error_rate, retry_after,
+         org_rate, no_overview, batch_delay, seed):
+    """
+    Serve a synthetic Dashboard API for benchmarks and testing
+    """
+    dashboard = MockDashboard(
+        orgs=orgs,
+        networks=networks,
+        devices_per_network=devices_per_network,
+        seed=seed,
+        latency=latency,
+        jitter=jitter,
+        throttle_rate=throttle_rate,
+        error_rate=error_rate,
+        retry_after=retry_after,
+        org_rate=org_rate,
+        overview=not no_overview,
+        batch_delay=batch_delay,
+    )
+    server = make_server(dashboard, host=host, port=port)
+    click.secho(f'Mock Dashboard API listening on http://{host}:{server.server_address[1]}/api/v1', fg='green')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+network_groups.py
+
+groups split networks back into the network they were split from for the recombine command
+
+An org split turns "Site 1" into "Site 1 - appliance", "Site 1 - switch", ... .  Each network's name is checked once
+against the known suffixes (longest first, so " - cellular gateway" wins over a shorter suffix it ends with) and the
+network is bucketed under its exact base name in a dict, so grouping is a single pass and "Site 1 - switch" can never
+land in "Site 10".  Networks are keyed per organizationId, and already combined networks are skipped.
+
+Custom suffix sets (localized or renamed split conventions) are passed as suffixes=[...].
+
+example:
+groups = SplitNetworkGroups(suffixes=[' - appliance', ' - switch'])
+groups.add_many(networks)
+groups.as_list()    -> [{'Site 1': [{...'name': 'Site 1 - appliance'...}, {...'name': 'Site 1 - switch'...}]}]
+groups.to_combine() -> [{'network_name_combined': 'Site 1', 'network_ids': [...], 'networks': [...],
+                         'enrollment_string': ..., 'organization_id': ...}]
+'''
+
+DEFAULT_SUFFIXES = [
+    ' - appliance',
+    ' - switch',
+    ' - wireless',
+    ' - cellular gateway',
+    ' - camera',
+    ' - environmental',
+    ' - phone',
+]
+
+
+class SplitNetworkGroups(object):
+    def __init__(self, suffixes=None):
+        """
+        split networks bucketed by (organizationId, base name), in the order the base names were first seen
+        """
+        self.suffixes = sorted(set(suffixes or DEFAULT_SUFFIXES), key=len, reverse=True)
+        self.groups = {}
+
+    def base_name(self, name):
+        '''
+        Returns the name without its split suffix, or None when it doesn't end in a recognized suffix
+        '''
+        for suffix in self.suffixes:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                return name[:-len(suffix)]
+        return None
+
+    def add(self, network):
+        # filter out any potential combined networks
+        if 'combined' in network['productTypes']:
+            return
+
+        base_name = self.base_name(network['name'])
+        if base_name is None:
+            return
+
+        self.groups.setdefault((network['organizationId'], base_name), []).append(network)
+
+    def add_many(self, networks):
+        for network in networks:
+            self.add(network)
+
+    def combinable(self):
+        '''
+        Yields (base name, networks) for every group with at least two networks to combine
+        '''
+        for (org_id, base_name), networks in self.groups.items():
+            if len(networks) > 1:
+                yield base_name, networks
+
+    def singles(self):
+        '''
+        Yields the networks that carry a split suffix but have nothing to be combined with
+        '''
+        for networks in self.groups.values():
+            if len(networks) == 1:
+                yield networks[0]
+
+    def as_list(self):
+        return [{base_name: networks} for base_name, networks in self.combinable()]
+
+    def to_combine(self):
+        '''
+        Payload for recombine_networks.async_recombine_networks
+        '''
+        return [{
+            'network_name_combined': base_name,
+            'network_ids': [network['id'] for network in networks],
+            'networks': networks,
+            'enrollment_string': networks[0]['enrollmentString'],
+            'organization_id': networks[0]['organizationId'],
+        } for base_name, networks in self.combinable()]
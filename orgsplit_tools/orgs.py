@@ -0,0 +1,71 @@
+import click
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+orgs.py
+
+organization selection shared by every orgsplit command
+
+-o/--orgname takes a single organization name (case insensitive) or "all", optionally narrowed with -f/--filter to
+the organizations whose names begin with the given (case sensitive) string.
+'''
+
+
+def clean_orgs(all_orgs, org_name):
+
+    user_org = org_name.lower().strip()
+
+    cleaned_orgs = []
+    for org in all_orgs:
+        if org['name'].lower().strip() == user_org:
+            cleaned_orgs.append(org)
+
+    if cleaned_orgs:
+        return cleaned_orgs
+
+    else:
+        click.secho(f'[WARNING] Could not find given Organiztion Name: "{org_name}."\n',
+            fg='yellow')
+        click.secho(
+        'NOTE: Organization names that contain spaces must be wrapped in quotes (e.g. "Org Name")\n',
+        fg='yellow'
+        )
+
+        if click.confirm('Print all org names that this apikey has access to?'):
+            for org in all_orgs:
+                click.secho(f'{org["name"]}',
+                fg='green',
+                )
+            exit(0)
+
+        else:
+            exit(0)
+
+
+def select_orgs(all_orgs, org_name, org_filter=None):
+    '''
+    Returns the organizations selected by -o/--orgname and -f/--filter
+    '''
+    if org_name.lower().strip() != 'all':
+        if org_filter:
+            click.secho(f'[WARNING] --filter (-f) option is ignored when used with a single organization.\n',
+            fg='yellow',
+            bold=True)
+
+        return clean_orgs(all_orgs=all_orgs, org_name=org_name)
+
+    if org_filter:
+        user_orgs = [org for org in all_orgs if org['name'].startswith(org_filter)]
+    else:
+        user_orgs = list(all_orgs)
+
+    if not user_orgs:
+        click.secho(f'[WARNING] No organization names begin with "{org_filter}" (--filter is case sensitive).\n',
+            fg='yellow',
+            bold=True)
+        exit(0)
+
+    return user_orgs
@@ -1,9 +1,6 @@
-import click
+import importlib
 
-import orgsplit_tools.subcommands.device_count as device_count
-import orgsplit_tools.subcommands.precheck as precheck
-import orgsplit_tools.subcommands.rename as rename
-import orgsplit_tools.subcommands.recombine as recombine
+import click
 
 # override general help to match other options, use group callback to this dict
 ctx_settings = dict(help_option_names=['-h', '--help'])
@@ -13,12 +10,133 @@ __email__ = 'zbrewer@cisco.com'
 __version__ = '0.1.0'
 __license__ = 'MIT'
 
+'''
+Command specific entry points go here
+
+FORMAT: command name: (module, function, short help)
+Subcommand modules (and the meraki SDK, aiohttp, prettytable and tqdm they pull in) are only imported when their
+command runs, so -h and shell completion stay fast.  The short help is shown in the command list without importing
+the module and must match the first line of the command's docstring (benchmarks/bench_startup.py checks this).
+'''
+LAZY_SUBCOMMANDS = {
+    'apply': ('orgsplit_tools.subcommands.apply', 'apply', 'Executes a plan written by rename or recombine --plan-out'),
+    'device-count': ('orgsplit_tools.subcommands.device_count', 'device_count', 'Device counts for one or more organizations'),
+    'precheck': ('orgsplit_tools.subcommands.precheck', 'precheck', 'Identify settings that may need to be changed prior to an org-split'),
+    'recombine': ('orgsplit_tools.subcommands.recombine', 'recombine', 'Recombines networks that were previously split by product type (post org-split)'),
+    'rename': ('orgsplit_tools.subcommands.rename', 'rename', 'Replaces part or all of a network name in one or more organizations'),
+    'snapshot': ('orgsplit_tools.subcommands.snapshot', 'snapshot', 'Saves organizations, networks and devices to a local SQLite snapshot'),
+}
+
+
+def short_help(help, limit=45):
+    '''
+    Shortens a help text the way click shortens a command's docstring for the command list: the first paragraph, cut
+    after its first sentence or else at a word boundary with "..." so it fits in limit characters (a local copy of
+    click.utils.make_default_short_help, which is deprecated)
+    '''
+    paragraph_end = help.find('\n\n')
+    if paragraph_end != -1:
+        help = help[:paragraph_end]
+
+    words = help.split()
+    if not words:
+        return ''
+    if words[0] == '\b':
+        words = words[1:]
+
+    total_length = 0
+    last_index = len(words) - 1
+    for index, word in enumerate(words):
+        total_length += len(word) + (index > 0)
+        if total_length > limit:
+            break
+        if word[-1] == '.':
+            # sentence end - cut without "..."
+            return ' '.join(words[:index + 1])
+        if total_length == limit and index != last_index:
+            break
+    else:
+        return ' '.join(words)
+
+    # drop words until the text and "..." fit
+    total_length += len('...')
+    while index > 0:
+        total_length -= len(words[index]) + (index > 0)
+        if total_length <= limit:
+            break
+        index -= 1
+
+    return ' '.join(words[:index]) + '...'
+
+
+class LazyGroup(click.Group):
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """
+        click group that imports a subcommand's module only when that subcommand is invoked
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, function_name, _ = self.lazy_subcommands[cmd_name]
+            self.add_command(getattr(importlib.import_module(module_name), function_name), cmd_name)
+
+        return super().get_command(ctx, cmd_name)
+
+    def command_short_help(self, cmd_name, limit=45):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            return short_help(self.lazy_subcommands[cmd_name][2], limit)
+        return self.commands[cmd_name].get_short_help_str(limit)
+
+    def format_commands(self, ctx, formatter):
+        names = self.list_commands(ctx)
+        if not names:
+            return
+
+        # same layout as click.Group.format_commands, with the short help taken from lazy_subcommands
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        with formatter.section('Commands'):
+            formatter.write_dl([(name, self.command_short_help(name, limit)) for name in names])
+
+    def shell_complete(self, ctx, incomplete):
+        from click.shell_completion import CompletionItem
+
+        results = [
+            CompletionItem(name, help=self.command_short_help(name))
+            for name in self.list_commands(ctx) if name.startswith(incomplete)
+        ]
+        # options of the group itself, skipping click.Group's command completion (it would import every module)
+        results.extend(click.Command.shell_complete(self, ctx, incomplete))
+        return results
+
 # begin click group and cli options for mtk parent
-@click.group(context_settings=ctx_settings)
+@click.group(cls=LazyGroup, lazy_subcommands=LAZY_SUBCOMMANDS, context_settings=ctx_settings)
 @click.option('-d', '--debug', is_flag=True, help='Flag for debug')
 @click.option('-c', 'certpath', help='Optional path to api.meraki.com cert for rare error')
+@click.option('--max-concurrency', type=click.IntRange(min=1), default=50, show_default=True,
+              help='Upper bound for the adaptive number of concurrent API requests')
+@click.option('--org-rate', type=click.FloatRange(min=0, min_open=True), default=10, show_default=True,
+              help='Requests per second allowed per organization')
+@click.option('--key-rate', type=click.FloatRange(min=0, min_open=True), default=100, show_default=True,
+              help='Requests per second allowed for the API key across all organizations')
+@click.option('--cache', is_flag=True, help='Cache organization and network listings on disk between runs')
+@click.option('--cache-ttl', type=click.IntRange(min=0), default=900, show_default=True,
+              help='Seconds a cached response stays valid (used with --cache)')
+@click.option('--refresh', is_flag=True, help='Ignore cached responses and re-fetch them (used with --cache)')
+@click.option('--base-url', default='https://api.meraki.com/api/v1', show_default=True,
+              help='Dashboard API base URL, e.g. a local mock server (python -m orgsplit_tools.mockserver)')
+@click.option('--metrics-dir', metavar='[DIRECTORY]',
+              help='Write per-run API metrics (latency histograms, retries, 429s per endpoint and org) as JSON and Prometheus text to this directory')
+@click.option('--trace', 'trace_path', metavar='[FILE]',
+              help='Write a Chrome trace-event timeline of the run (phases and every API call per org) to this file, viewable in chrome://tracing or ui.perfetto.dev')
+@click.option('--profile', is_flag=True, help='Also cProfile each traced phase and write the stats next to the trace file (used with --trace)')
 @click.pass_context
-def entry_point(ctx, debug, certpath):
+def entry_point(ctx, debug, certpath, max_concurrency, org_rate, key_rate, cache, cache_ttl, refresh, base_url, metrics_dir,
+                trace_path, profile):
     '''orgsplit.py 
     CLI suite of tools for pre and post Meraki Organization split
     
@@ -30,18 +148,26 @@ def entry_point(ctx, debug, certpath):
 
     ctx.obj['debug'] = debug
     ctx.obj['cert_path'] = certpath
+    ctx.obj['max_concurrency'] = max_concurrency
+    ctx.obj['org_rate'] = org_rate
+    ctx.obj['key_rate'] = key_rate
+    ctx.obj['cache'] = cache
+    ctx.obj['cache_ttl'] = cache_ttl
+    ctx.obj['refresh'] = refresh
+    ctx.obj['base_url'] = base_url
+    ctx.obj['metrics_dir'] = metrics_dir
+    ctx.obj['command'] = ctx.invoked_subcommand
 
+    if profile and not trace_path:
+        raise click.UsageError('--profile is only used with --trace FILE')
 
-'''
-Command specific entry points go here
+    if trace_path:
+        from orgsplit_tools.merakilib import tracing
+
+        # written when the command finishes, after the session has closed
+        tracer = tracing.activate(tracing.Tracer(trace_path, profile=profile))
+        ctx.call_on_close(tracer.close)
 
-FORMAT: package.function
-The module must have been imported first!
-'''
-entry_point.add_command(device_count.device_count)
-entry_point.add_command(precheck.precheck)
-entry_point.add_command(recombine.recombine)
-entry_point.add_command(rename.rename)
 
 if __name__ == "__main__":
     entry_point()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import time
+
+from orgsplit_tools.merakilib import records
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+plan.py
+
+reviewable change plans for the rename and recombine commands (--plan-out PLAN), executed later with `orgsplit apply`
+
+A plan holds the operations the command computed (the same items its journal records, so apply hands them straight
+to the writers) and a hash of the state of every network they target.  apply re-lists only the plan's orgs, hashes
+the targeted networks again and refuses to run (or, with --skip-changed, drops the affected operations) when any of
+them was changed, deleted or moved since the plan was made - nothing is matched or grouped again.
+
+The plan's own stateHash covers the operations and network hashes together, so a plan edited by hand after review is
+rejected as well.
+
+example:
+{"type": "orgsplit-plan", "planVersion": 1, "command": "rename", "orgname": "ACME", "created": "...",
+ "organizations": [{"id": "1234", "name": "ACME"}], "operations": [{"network_id": "L_1", "new_name": ...}],
+ "networkState": {"L_1": "3f1c..."}, "stateHash": "9ab0..."}
+'''
+
+PLAN_VERSION = 1
+
+# network fields a planned write depends on - any difference means the network changed since it was planned
+STATE_FIELDS = ('id', 'organizationId', 'name', 'productTypes', 'tags', 'timeZone', 'notes', 'enrollmentString', 'isBoundToConfigTemplate')
+
+# the networks each command's operations write to (rename items keep the network's fields, keyed network_id)
+TARGETS = {
+    'rename': lambda item: [dict(item, id=item['network_id'])],
+    'recombine': lambda item: item['networks'],
+}
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':'), default=records.json_default).encode('utf-8')).hexdigest()
+
+
+def network_hash(network):
+    return _digest({field: network.get(field) for field in STATE_FIELDS})
+
+
+class Plan(object):
+    def __init__(self, command, orgname, organizations, operations, network_state, created=None, source=None):
+        """
+        planned operations of one rename or recombine run - use Plan.build() to make one and Plan.load() to read one
+        """
+        if command not in TARGETS:
+            raise ValueError(f'command "{command}" cannot be planned')
+
+        self.command = command
+        self.orgname = orgname
+        self.organizations = organizations
+        self.operations = operations
+        self.network_state = network_state
+        self.created = created or time.strftime('%Y-%m-%d %H:%M:%S')
+        self.source = source
+
+    @classmethod
+    def build(cls, command, orgname, organizations, operations, source=None):
+        '''
+        Plans the given operations, hashing every network they target as it is now
+        '''
+        plan = cls(
+            command,
+            orgname,
+            [{'id': org['id'], 'name': org['name']} for org in organizations],
+            operations,
+            {},
+            source=source,
+        )
+        for operation in operations:
+            for network in plan.targets(operation):
+                plan.network_state[network['id']] = network_hash(network)
+
+        return plan
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as infile:
+            try:
+                data = json.load(infile)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'"{path}" is not valid JSON: {e}')
+
+        if not isinstance(data, dict) or data.get('type') != 'orgsplit-plan':
+            raise ValueError(f'"{path}" is not an orgsplit plan')
+        if data.get('planVersion') != PLAN_VERSION:
+            raise ValueError(f'"{path}" was written by an incompatible version (planVersion {data.get("planVersion")})')
+
+        plan = cls(
+            data['command'],
+            data['orgname'],
+            data['organizations'],
+            data['operations'],
+            data['networkState'],
+            created=data.get('created'),
+            source=data.get('source'),
+        )
+        if plan.state_hash() != data.get('stateHash'):
+            raise ValueError(f'"{path}" was modified after it was written (stateHash does not match)')
+
+        return plan
+
+    def targets(self, operation):
+        return TARGETS[self.command](operation)
+
+    def state_hash(self):
+        return _digest({'command': self.command, 'operations': self.operations, 'networkState': self.network_state})
+
+    def as_dict(self):
+        return {
+            'type': 'orgsplit-plan',
+            'planVersion': PLAN_VERSION,
+            'command': self.command,
+            'orgname': self.orgname,
+            'created': self.created,
+            'source': self.source,
+            'organizations': self.organizations,
+            'operations': self.operations,
+            'networkState': self.network_state,
+            'stateHash': self.state_hash(),
+        }
+
+    def write(self, path):
+        # written whole then moved into place, so a plan on disk is never half written
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as outfile:
+            outfile.write(json.dumps(self.as_dict(), indent=4, default=records.json_default))
+        os.replace(tmp_path, path)
+
+    def changed_networks(self, live_networks):
+        '''
+        Returns {network id: reason} for every targeted network that differs from the plan, given the live networks
+        of the plan's orgs as {network id: network}
+        '''
+        changed = {}
+        for network_id, planned_hash in self.network_state.items():
+            network = live_networks.get(network_id)
+            if network is None:
+                changed[network_id] = 'not found (deleted or moved to another organization)'
+            elif network_hash(network) != planned_hash:
+                changed[network_id] = 'changed since the plan was made'
+        return changed
+
+    def without(self, network_ids):
+        '''
+        Returns the operations that don't target any of the given networks
+        '''
+        return [
+            operation for operation in self.operations
+            if not any(network['id'] in network_ids for network in self.targets(operation))
+        ]
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+from orgsplit_tools.merakilib import cache
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+precheck_state.py
+
+last precheck results per organization, so a rerun only re-checks the networks changed since then
+
+One JSON file per API key and org under ~/.cache/orgsplit/precheck/ holds the time the last precheck started gathering
+and the appliance settings it found.  On the next run the org's configuration change log (get_config_changes.py)
+says which networks changed since that time; only those, and appliance networks that weren't there before, are
+queried again.  precheck --full ignores the saved state.
+
+example state:
+{"organizationId": "1234", "checkedAt": 1690365600.0,
+ "applianceSettings": [{"networkName": "Site 1 - appliance", "networkId": "L_1234", ...}]}
+'''
+
+# change log entries are timestamped by Dashboard, so look back a little further than the saved time
+CLOCK_SKEW = 300
+
+
+def default_dir():
+    return os.path.join(os.path.dirname(cache.default_path()), 'precheck')
+
+
+class PrecheckState(object):
+    def __init__(self, api_key, state_dir=None):
+        """
+        saved precheck results for the orgs one API key can see
+        """
+        self.state_dir = state_dir or default_dir()
+        self.key_hash = hashlib.sha256(str(api_key).encode('utf-8')).hexdigest()[:16]
+
+    def path(self, org_id):
+        return os.path.join(self.state_dir, f'{self.key_hash}_{org_id}.json')
+
+    def load(self, org_id):
+        '''
+        Returns the saved state of an org with 'since' (the time to read the change log from), or None
+        '''
+        try:
+            with open(self.path(org_id)) as infile:
+                state = json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+        if state.get('organizationId') != org_id or 'checkedAt' not in state:
+            return None
+
+        state['since'] = state['checkedAt'] - CLOCK_SKEW
+        return state
+
+    def save(self, org_id, checked_at, appliance_settings):
+        if not os.path.exists(self.state_dir):
+            os.makedirs(self.state_dir)
+
+        # written aside and swapped in, so an interrupted save never leaves half a state file
+        path = self.path(org_id)
+        with open(f'{path}.tmp', 'w') as outfile:
+            json.dump({
+                'organizationId': org_id,
+                'checkedAt': checked_at,
+                'applianceSettings': appliance_settings,
+            }, outfile)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,176 @@
+import csv
+import re
+from collections import deque
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+rename_map.py
+
+find -> replace rules for the rename command, matched against every network name in a single pass
+
+Literal rules are compiled into one Aho-Corasick automaton, so each name is scanned once no matter how many rules there
+are.  Matches are replaced leftmost-longest and never overlap, which for a single rule is exactly str.replace().
+Regex rules run afterwards, in file order, each with its own compiled pattern (so backreferences and named groups
+mean what they do in the rule on its own).
+
+mapping file (CSV, header optional, lines starting with # are ignored):
+find,replace,regex
+Site ,Branch ,
+-SW-,-SWITCH-,
+^(\\w+) - (\\d+)$,\\2 \\1,yes
+
+example:
+renames = RenameMap.from_csv('renames.csv')
+renames.rename('Site 1 - appliance')  -> 'Branch 1 - appliance' (None when no rule matched)
+'''
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'regex')
+
+
+class Rule(object):
+    def __init__(self, find, replace, regex=False, line=None, path=None):
+        if not find:
+            raise ValueError(f'rename rule{_on_line(line, path)} has an empty find string')
+
+        self.find = find
+        self.replace = replace
+        self.regex = regex
+        self.line = line
+
+        if regex:
+            try:
+                self.pattern = re.compile(find)
+            except re.error as e:
+                raise ValueError(f'invalid regex "{find}"{_on_line(line, path)}: {e}')
+
+
+def _on_line(line, path=None):
+    if line is None:
+        return ''
+    return f' on line {line} of {path}' if path is not None else f' on line {line}'
+
+
+class Automaton(object):
+    def __init__(self, patterns):
+        """
+        Aho-Corasick automaton over the given strings - iter_matches() reports every occurrence in one scan
+        """
+        self.lengths = [len(pattern) for pattern in patterns]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = next_state
+            self.out[state].append(index)
+
+        # breadth first so every state's fail link is finished before its children need it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.out[next_state] = self.out[next_state] + self.out[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        '''
+        Yields (start, pattern index) for every occurrence of every pattern in text
+        '''
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield position - lengths[index] + 1, index
+
+
+class RenameMap(object):
+    def __init__(self, rules):
+        """
+        compiled rename rules - literal rules share one automaton, regex rules each keep their own pattern
+        """
+        self.rules = list(rules)
+
+        # the first rule for a given find string wins
+        literals = {}
+        for rule in self.rules:
+            if not rule.regex:
+                literals.setdefault(rule.find, rule.replace)
+        self.literal_finds = list(literals)
+        self.literal_replaces = list(literals.values())
+        self.automaton = Automaton(self.literal_finds) if literals else None
+
+        self.regex_rules = [rule for rule in self.rules if rule.regex]
+
+    def __len__(self):
+        return len(self.rules)
+
+    @classmethod
+    def from_csv(cls, path):
+        rules = []
+        with open(path, newline='', encoding='utf-8-sig') as infile:
+            for line, row in enumerate(csv.reader(infile), start=1):
+                if not row or not ''.join(row).strip() or row[0].startswith('#'):
+                    continue
+                if line == 1 and row[0].strip().lower() == 'find':
+                    continue
+                if len(row) < 2:
+                    raise ValueError(f'expected "find,replace[,regex]" on line {line} of {path}')
+
+                regex = len(row) > 2 and row[2].strip().lower() in TRUE_VALUES
+                rules.append(Rule(row[0], row[1], regex=regex, line=line, path=path))
+
+        return cls(rules)
+
+    def _replace_literals(self, name):
+        finds = self.literal_finds
+        matches = sorted(self.automaton.iter_matches(name), key=lambda match: (match[0], -len(finds[match[1]])))
+        if not matches:
+            return name
+
+        pieces = []
+        position = 0
+        for start, index in matches:
+            # leftmost-longest, skipping anything that overlaps a replacement already made
+            if start < position:
+                continue
+            pieces.append(name[position:start])
+            pieces.append(self.literal_replaces[index])
+            position = start + len(finds[index])
+        pieces.append(name[position:])
+
+        return ''.join(pieces)
+
+    def rename(self, name):
+        '''
+        Returns the new name, or None when no rule matched
+        '''
+        new_name = name
+        if self.automaton is not None:
+            new_name = self._replace_literals(new_name)
+
+        for rule in self.regex_rules:
+            new_name = rule.pattern.sub(rule.replace, new_name)
+
+        if new_name == name:
+            return None
+        return new_name
@@ -0,0 +1,121 @@
+import json
+import os
+import textwrap
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from orgsplit_tools.merakilib import records
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+results.py
+
+streaming result files for the rename and recombine commands (and apply)
+
+Each completed write is appended to a newline-delimited JSON file (one record per line) and flushed as soon as the
+journal records it, so partial results are always on disk and no run holds its results in memory.  --pretty-json
+converts the finished file into the indented JSON list the commands used to write, one record at a time.
+
+Records are encoded with orjson when it is installed (pip install orgsplit[fast]) and the standard json module
+otherwise; both write the same records.
+
+example:
+with ResultWriter('ACME_rename_20230726-100000.ndjson') as writer:
+    writer.write({'network_id': 'L_1234', 'name': 'Branch 1', ...})
+to_pretty_json('ACME_rename_20230726-100000.ndjson', 'ACME_rename_20230726-100000.json')
+'''
+
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+
+def encode(record):
+    '''
+    Returns one record as a line of UTF-8 JSON
+    '''
+    if orjson is not None:
+        return orjson.dumps(record, default=records.json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=records.json_default) + '\n').encode('utf-8')
+
+
+class ResultWriter(object):
+    def __init__(self, path):
+        """
+        appends one JSON record per line to path, flushing each record as it is written
+        """
+        self.path = path
+        self.count = 0
+        self._outfile = open(path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, record):
+        self._outfile.write(encode(record))
+        self._outfile.flush()
+        self.count += 1
+
+    def close(self):
+        if self._outfile is not None:
+            self._outfile.close()
+            self._outfile = None
+
+
+class OrgResultWriters(object):
+    def __init__(self, path_for):
+        """
+        one ResultWriter per organization, opened on its first record - path_for(org name) returns the org's file
+        """
+        self.path_for = path_for
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writer(self, org_name):
+        writer = self.writers.get(org_name)
+        if writer is None:
+            writer = self.writers[org_name] = ResultWriter(self.path_for(org_name))
+        return writer
+
+    def write(self, org_name, record):
+        self.writer(org_name).write(record)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def iter_records(path):
+    with open(path, 'rb') as infile:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
+
+
+def to_pretty_json(ndjson_path, json_path=None):
+    '''
+    Converts a results file to an indented JSON list (same layout as json.dumps(records, indent=4)) one record at a
+    time, returning the new file's path
+    '''
+    json_path = json_path or f'{os.path.splitext(ndjson_path)[0]}.json'
+
+    with open(json_path, 'w') as outfile:
+        outfile.write('[')
+        for index, record in enumerate(iter_records(ndjson_path)):
+            outfile.write(',\n' if index else '\n')
+            outfile.write(textwrap.indent(json.dumps(record, indent=4), '    '))
+        outfile.write('\n]' if outfile.tell() > 1 else ']')
+
+    return json_path
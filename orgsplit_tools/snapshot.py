@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+import time
+
+import click
+
+from orgsplit_tools.merakilib import records
+
+__author__ = 'Zach Brewer'
+__email__ = 'zbrewer@cisco.com'
+__version__ = '0.1.0'
+__license__ = 'MIT'
+'''
+snapshot.py
+
+local SQLite inventory of organizations, networks, devices and (optionally) precheck data
+
+`orgsplit snapshot` writes one file per run; --from-snapshot lets device-count, precheck, rename --dry-run and
+recombine plan against that file instead of the Dashboard API.  Every record keeps the full API payload as JSON next
+to the indexed columns the commands filter on, so rows read back are the same records the merakilib fetches return
+(records.Network and records.Device, organizationName/organizationId included).
+
+example:
+with Snapshot.create('acme.sqlite') as inventory:
+    inventory.add_organizations(orgs)
+    get_networks.asyncstream_networks(dashboard=dashboard, orgs=orgs, on_page=inventory.add_networks)
+
+with Snapshot.open('acme.sqlite') as inventory:
+    for page in inventory.iter_network_pages(org_ids):
+        ...
+'''
+
+SCHEMA_VERSION = 1
+PAGE_SIZE = 1000
+
+SCHEMA = [
+    'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE organizations (id TEXT PRIMARY KEY, name TEXT, data TEXT)',
+    'CREATE TABLE networks ('
+    'id TEXT PRIMARY KEY, organizationId TEXT, name TEXT, productTypes TEXT, tags TEXT, '
+    'isBoundToConfigTemplate INTEGER, data TEXT)',
+    'CREATE INDEX networks_org ON networks (organizationId, name)',
+    'CREATE TABLE devices ('
+    'serial TEXT PRIMARY KEY, organizationId TEXT, networkId TEXT, productType TEXT, model TEXT, data TEXT)',
+    'CREATE INDEX devices_org ON devices (organizationId, productType)',
+    'CREATE INDEX devices_network ON devices (networkId)',
+    'CREATE TABLE license_overviews (organizationId TEXT PRIMARY KEY, data TEXT)',
+    'CREATE TABLE appliance_settings (networkId TEXT PRIMARY KEY, organizationId TEXT, data TEXT)',
+    'CREATE INDEX appliance_settings_org ON appliance_settings (organizationId)',
+]
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+class Snapshot(object):
+    def __init__(self, path, db):
+        """
+        an open snapshot file - use Snapshot.create() to write a new one and Snapshot.open() to read one back
+        """
+        self.path = path
+        self._db = db
+
+    @classmethod
+    def create(cls, path, **meta):
+        '''
+        Starts a new snapshot, replacing any file already at path
+        '''
+        if os.path.exists(path):
+            os.remove(path)
+
+        db = sqlite3.connect(path)
+        for statement in SCHEMA:
+            db.execute(statement)
+
+        snapshot = cls(path, db)
+        snapshot.set_meta(schemaVersion=SCHEMA_VERSION, created=time.strftime('%Y-%m-%d %H:%M:%S'), **meta)
+
+        return snapshot
+
+    @classmethod
+    def open(cls, path):
+        db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        snapshot = cls(path, db)
+
+        try:
+            version = snapshot.meta().get('schemaVersion')
+        except sqlite3.DatabaseError:
+            version = None
+        if version != str(SCHEMA_VERSION):
+            db.close()
+            raise ValueError(f'"{path}" is not an orgsplit snapshot (or was written by an incompatible version)')
+
+        return snapshot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def commit(self):
+        self._db.commit()
+
+    def discard(self):
+        '''
+        Closes and deletes a snapshot that couldn't be completed, so no --from-snapshot run can trust it
+        '''
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def set_meta(self, **meta):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            [(key, str(value)) for key, value in meta.items()]
+        )
+
+    def meta(self):
+        return dict(self._db.execute('SELECT key, value FROM meta'))
+
+    # writers - each takes what the merakilib fetch (or its on_page callback) hands over
+
+    def add_organizations(self, orgs):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO organizations (id, name, data) VALUES (?, ?, ?)',
+            [(org['id'], org['name'], json.dumps(org)) for org in orgs]
+        )
+
+    def add_networks(self, networks):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO networks VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(
+                network['id'],
+                network['organizationId'],
+                network['name'],
+                json.dumps(network.get('productTypes') or []),
+                json.dumps(network.get('tags') or []),
+                int(bool(network.get('isBoundToConfigTemplate'))),
+                json.dumps(network, default=records.json_default),
+            ) for network in networks]
+        )
+
+    def add_devices(self, devices):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?)',
+            [(
+                device['serial'],
+                device['organizationId'],
+                device.get('networkId'),
+                device.get('productType'),
+                device.get('model'),
+                json.dumps(device, default=records.json_default),
+            ) for device in devices]
+        )
+
+    def add_license_overview(self, org_id, license_overview):
+        self._db.execute(
+            'INSERT OR REPLACE INTO license_overviews VALUES (?, ?)',
+            (org_id, json.dumps(license_overview))
+        )
+
+    def add_appliance_settings(self, appliance_settings):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO appliance_settings VALUES (?, ?, ?)',
+            [(appliance['networkId'], appliance['organizationId'], json.dumps(appliance)) for appliance in appliance_settings]
+        )
+
+    # readers
+
+    def _iter_pages(self, query, params, page_size, record, fields):
+        # one shared Organization per org across every page, like a live fetch
+        organizations = {}
+        cursor = self._db.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                break
+            yield [record.from_flat(json.loads(row[0]), organizations, fields) for row in rows]
+
+    def organizations(self):
+        return [json.loads(row[0]) for row in self._db.execute('SELECT data FROM organizations ORDER BY name')]
+
+    def counts(self):
+        return {
+            table: self._db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('organizations', 'networks', 'devices', 'license_overviews', 'appliance_settings')
+        }
+
+    def iter_network_pages(self, org_ids, page_size=PAGE_SIZE, fields=None):
+        '''
+        Yields the networks of the given orgs in pages, like get_networks.asyncstream_networks hands them to on_page
+        '''
+        return self._iter_pages(
+            f'SELECT data FROM networks WHERE organizationId IN ({_placeholders(org_ids)}) ORDER BY organizationId, name',
+            list(org_ids), page_size, records.Network, fields
+        )
+
+    def networks(self, org_ids, fields=None):
+        return [network for page in self.iter_network_pages(org_ids, fields=fields) for network in page]
+
+    def iter_device_pages(self, org_ids, page_size=PAGE_SIZE, fields=None):
+        return self._iter_pages(
+            f'SELECT data FROM devices WHERE organizationId IN ({_placeholders(org_ids)})',
+            list(org_ids), page_size, records.Device, fields
+        )
+
+    def device_counts(self, org_ids):
+        '''
+        Returns {org id: {productType: count}} counted by SQLite, without loading the device records
+        '''
+        by_org = {org_id: {} for org_id in org_ids}
+        for org_id, product_type, count in self._db.execute(
+                'SELECT organizationId, productType, COUNT(*) FROM devices '
+                f'WHERE organizationId IN ({_placeholders(org_ids)}) GROUP BY organizationId, productType',
+                list(org_ids)):
+            by_org[org_id][product_type or 'unknown'] = count
+        return by_org
+
+    def license_overviews(self, org_ids):
+        return {
+            org_id: json.loads(data) for org_id, data in self._db.execute(
+                f'SELECT organizationId, data FROM license_overviews WHERE organizationId IN ({_placeholders(org_ids)})',
+                list(org_ids))
+        }
+
+    def appliance_settings(self, org_ids):
+        return [
+            json.loads(row[0]) for row in self._db.execute(
+                f'SELECT data FROM appliance_settings WHERE organizationId IN ({_placeholders(org_ids)})',
+                list(org_ids))
+        ]
+
+
+def open_snapshot(path):
+    '''
+    Opens a snapshot for a --from-snapshot command, exiting with a message when it can't be read
+    '''
+    try:
+        inventory = Snapshot.open(path)
+
+    except (sqlite3.Error, ValueError) as e:
+        click.secho(f'[ERROR] Could not read snapshot: {e}\n', fg='red', bold=True)
+        exit(0)
+
+    click.secho(f'Using snapshot "{ path }" taken { inventory.meta().get("created") } - no Dashboard API calls are made.\n', fg='green', bold=True)
+    return inventory
+
+
+def prompt_apikey(apikey):
+    '''
+    Returns the -k/--apikey value, asking for it (hidden) when it wasn't given - commands that accept --from-snapshot
+    only call this for live runs, since an offline run never needs an API key
+    '''
+    if apikey is None:
+        apikey = click.prompt('Apikey', hide_input=True)
+    return apikey
+
+
+def from_snapshot_option(help):
+    return click.option(
+        '--from-snapshot',
+        metavar='[SNAPSHOT FILE]',
+        type=click.Path(exists=True, dir_okay=False),
+        required=False,
+        help=help
+    )
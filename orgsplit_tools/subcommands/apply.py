@@ -0,0 +1,120 @@
+import click
+from prettytable import PrettyTable
+
+from orgsplit_tools import plan
+from orgsplit_tools.merakilib import get_networks, pages, session, tracing
+from orgsplit_tools.subcommands import recombine, rename
+
+
+@click.group()
+@click.pass_context
+def apply_group(ctx):
+     pass
+
+@apply_group.command(name='apply')
+@click.option(
+    '-k',
+    '--apikey',
+    prompt=True,
+    hide_input=True,
+    required=True,
+    metavar='[APIKEY]',
+    help='API key with access to one or more organizations.'
+    )
+@click.option(
+            '--action-batch',
+            is_flag=True,
+            help='Rename through Dashboard action batches (up to --batch-size renames per API call) instead of one call per network (rename plans only).'
+            )
+@click.option(
+            '--batch-size',
+            default=100,
+            show_default=True,
+            type=click.IntRange(1, 100),
+            help='Renames per action batch when --action-batch is used.'
+            )
+@click.option(
+            '--skip-changed',
+            is_flag=True,
+            help='Apply the rest of the plan when some of its networks changed since it was made, instead of applying nothing.'
+            )
+@click.option(
+            '--pretty-json',
+            is_flag=True,
+            help='Also convert the results (written one JSON record per line as each operation completes) to indented JSON files at the end.'
+            )
+@click.argument('plan_file', metavar='[PLAN FILE]', type=click.Path(exists=True, dir_okay=False))
+
+@click.pass_context
+def apply(ctx, apikey, action_batch, batch_size, skip_changed, pretty_json, plan_file):
+    """
+    Executes a plan written by rename or recombine --plan-out
+    """
+
+    try:
+        change_plan = plan.Plan.load(plan_file)
+
+    except (OSError, ValueError, KeyError) as e:
+        click.secho(f'[ERROR] Could not read plan: {e}\n', fg='red', bold=True)
+        exit(0)
+
+    if action_batch and change_plan.command != 'rename':
+        raise click.UsageError('--action-batch only applies to rename plans.')
+
+    click.secho(f'Applying {change_plan.command} plan "{ plan_file }" made { change_plan.created } from { change_plan.source }: {len(change_plan.operations)} operations on {len(change_plan.network_state)} networks in {len(change_plan.organizations)} organizations\n', fg='green', bold=True)
+
+    dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+    # the check must see the live networks, never a cached listing (fresh listings are still cached)
+    dashboard.refresh = True
+
+    # only the planned networks are kept from each page - nothing is matched or grouped again
+    live_networks = {}
+
+    def keep_targets(networks):
+        for network in networks:
+            if network['id'] in change_plan.network_state:
+                live_networks[network['id']] = network
+
+    click.secho('Checking that the planned networks have not changed...\n', fg='green')
+    try:
+        with tracing.phase('plan check', networks=len(change_plan.network_state)):
+            get_networks.asyncstream_networks(dashboard=dashboard, orgs=change_plan.organizations, on_page=keep_targets)
+
+    except pages.IncompleteListing as e:
+        click.secho(f'\n[ERROR] {e}\n\nThe plan could not be checked, nothing was applied - run apply again.\n', fg='red', bold=True)
+        exit(0)
+
+    changed = change_plan.changed_networks(live_networks)
+    operations = change_plan.operations
+
+    if changed:
+        planned_names = {network['id']: network['name'] for operation in change_plan.operations for network in change_plan.targets(operation)}
+
+        changed_table = PrettyTable(['Network ID', 'Planned Name', 'Problem'])
+        for network_id, reason in changed.items():
+            changed_table.add_row([network_id, planned_names.get(network_id), reason])
+
+        print('\n')
+        print(changed_table)
+        print('\n')
+
+        if not skip_changed:
+            click.secho(f'[ERROR] {len(changed)} planned networks changed since the plan was made - nothing was applied.  Make a new plan, or pass --skip-changed to apply the operations that only target unchanged networks.\n', fg='red', bold=True)
+            exit(0)
+
+        operations = change_plan.without(changed)
+        click.secho(f'Skipping {len(change_plan.operations) - len(operations)} operations that target the networks above.\n', fg='yellow', bold=True)
+        if not operations:
+            click.secho('Nothing left to apply.\n', fg='yellow', bold=True)
+            exit(0)
+
+    else:
+        click.secho(f'All {len(change_plan.network_state)} planned networks are unchanged.\n', fg='green', bold=True)
+
+    if change_plan.command == 'rename':
+        rename.execute_renames(dashboard, change_plan.orgname, operations, None, action_batch, batch_size, pretty_json)
+    else:
+        recombine.execute_combines(dashboard, change_plan.orgname, operations, None, pretty_json)
+
+if __name__ == "__main__":
+    apply()
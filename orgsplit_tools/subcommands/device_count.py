@@ -1,66 +1,11 @@
-import itertools
+import json
 
 import click
 import meraki
 
 # from merakilib import get_networks
-from orgsplit_tools.merakilib import get_devices
-
-
-class CallDashboard(object):
-    def __init__(self, apikey, debug):
-        """
-        call to dashboard API and makes session available to other methods in this class
-        """
-        if debug:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=True,
-            print_console=True,
-            suppress_logging=False,
-            )
-        else:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=False,
-            print_console=False,
-            suppress_logging=True,
-            )
-
-    def get_allorgs(self):
-        return self.api_session.organizations.getOrganizations()
-
-def clean_orgs(all_orgs, org_name):
-
-    user_org = org_name.lower().strip()
-    
-    cleaned_orgs = []
-    for org in all_orgs:
-        if org['name'].lower().strip() == user_org:
-            cleaned_orgs.append(org)
-
-    if cleaned_orgs:
-        return cleaned_orgs
-
-    else:
-        click.secho(f'[WARNING] Could not find given Organiztion Name: "{org_name}."\n',
-            fg='yellow')
-        click.secho(
-        'NOTE: Organization names that contain spaces must be wrapped in quotes (e.g. "Org Name")\n',
-        fg='yellow'
-        )
-
-        if click.confirm('Print all org names that this apikey has access to?'):
-            for org in all_orgs:
-                click.secho(f'{org["name"]}',
-                fg='green',
-                )
-            exit(0)
-
-        else:
-            exit(0)
+from orgsplit_tools import device_counts, orgs, snapshot
+from orgsplit_tools.merakilib import get_devices, pages, session, tracing
 
 
 @click.group()
@@ -71,12 +16,9 @@ def device_count_group(ctx):
 @device_count_group.command(name='device-count')
 @click.option(
     '-k',
-    '--apikey', 
-    prompt=True, 
-    hide_input=True,
-    required=True,  
+    '--apikey',
     metavar='[APIKEY]',
-    help='API key with access to one or more organizations.'
+    help='API key with access to one or more organizations (asked for when not given, unless --from-snapshot is used).'
     )
 @click.option(
             '-o', 
@@ -92,108 +34,103 @@ def device_count_group(ctx):
             required=False,  
             help='A filter to perform on any organization names that begin with the given string (Case sensitive).'
             )
+@click.option(
+            '--summary',
+            is_flag=True,
+            help='Count devices from the org-level devices overview (one call per org) instead of listing every device.  Product types are estimated from model name prefixes, so totals can differ from a full count; unrecognized models are counted as "other" and listed.'
+            )
+@click.option(
+            '--output-json',
+            metavar='[FILENAME]',
+            required=False,
+            help='Also write the per-org and total device counts to the given JSON file.'
+            )
+@snapshot.from_snapshot_option(help='Count devices from a snapshot file (see the snapshot command) instead of the Dashboard API.')
 
 @click.pass_context
-def device_count(ctx, apikey, orgname, filter):
+def device_count(ctx, apikey, orgname, filter, summary, output_json, from_snapshot):
     """
     Device counts for one or more organizations
     """
 
-    if ctx.obj is not None:
-        debug = ctx.obj['debug']
-        cert_path = ctx.obj['cert_path']
+    if not from_snapshot:
+        apikey = snapshot.prompt_apikey(apikey)
 
-    click.secho('Getting org info...\n', fg='green')
+    if from_snapshot:
+        inventory = ctx.with_resource(snapshot.open_snapshot(from_snapshot))
+        all_orgs = inventory.organizations()
 
-    try:
-        session = CallDashboard(apikey=apikey, debug=debug)
-        all_orgs = session.get_allorgs()
+    else:
+        click.secho('Getting org info...\n', fg='green')
 
-    except meraki.exceptions.APIError as e:
-        print(f'Meraki API ERROR: {e}\n')
-        exit(0)
+        try:
+            with tracing.phase('org lookup'):
+                dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+                all_orgs = dashboard.get_organizations()
 
-    except Exception as e:
-        print(f'Non Meraki-SDK ERROR: {e}')
-        exit(0)
+        except meraki.exceptions.AsyncAPIError as e:
+            print(f'Meraki API ERROR: {e}\n')
+            exit(0)
+
+        except Exception as e:
+            print(f'Non Meraki-SDK ERROR: {e}')
+            exit(0)
 
-    if orgname != 'all':
-        if filter:
-            click.secho(f'[WARNING] --filter (-f) option is ignored when used with a single organization.\n',
-            fg='yellow')
+    user_orgs = orgs.select_orgs(all_orgs=all_orgs, org_name=orgname, org_filter=filter)
 
+    org_device_counts = device_counts.DeviceCounts(orgs=user_orgs)
+    # --summary only: {model: count} of the models no product type could be estimated for, None while every org was
+    # counted exactly (the overview wasn't available)
+    other_models = None
 
-        user_orgs = clean_orgs(all_orgs=all_orgs, org_name=orgname)
-    
-    else:
-        
-        if filter:
-            filtered_orgs = [org for org in all_orgs if org['name'].startswith(filter)]
-            user_orgs = filtered_orgs
-
-    async_org_devices = get_devices.asyncget_devices(api_key=apikey, orgs=user_orgs, cert_path=cert_path)
-
-    all_org_devices = [{user_org['name']: 
-                        [{'cellularGateway':[0],
-                    'switch':[0],
-                    'appliance':[0],
-                    'wireless':[0],
-                    'sensor':[0],
-                    'camera':[0],
-                    'total':[0]}]}for user_org in user_orgs]
-
-    for device, org_name, in itertools.product(async_org_devices, all_org_devices):    
-        for k in org_name.items():
-            org_name_dictkey = k[0]
-            if org_name_dictkey in device['organizationName']:
-                product_type = device['productType']
-                org_name[org_name_dictkey][0][product_type][0] += 1
-                org_name[org_name_dictkey][0]['total'][0] += 1
-
-    all_devices = 0
-    cellular_gateway = 0
-    switch = 0
-    appliance = 0
-    wireless = 0
-    sensor = 0
-    camera = 0
+    try:
+        with tracing.phase('device fetch', organizations=len(user_orgs)):
+            if from_snapshot:
+                # counted by SQLite, the device records never leave the snapshot
+                for org_id, counts in inventory.device_counts(org_ids=[org['id'] for org in user_orgs]).items():
+                    org_device_counts.add_counts(org_id, counts)
+            elif summary:
+                for org, counts, org_other_models in get_devices.asyncget_device_counts(dashboard=dashboard, orgs=user_orgs):
+                    org_device_counts.add_counts(org['id'], counts)
+                    if org_other_models is not None:
+                        other_models = other_models or {}
+                        for model, count in org_other_models.items():
+                            other_models[model] = other_models.get(model, 0) + count
+            else:
+                # count each page as it arrives rather than holding every device of every org
+                get_devices.asyncstream_devices(dashboard=dashboard, orgs=user_orgs, on_page=org_device_counts.add_many, fields=device_counts.FIELDS)
+
+    except pages.IncompleteListing as e:
+        # partial counts would look like real ones
+        click.secho(f'\n[ERROR] {e}\n\nNo counts were reported - run device-count again.\n', fg='red', bold=True)
+        exit(0)
+    counts = org_device_counts.as_dict()
 
     print('\n')
 
-    for each_org in all_org_devices:
-        for org_name, quantities in each_org.items():
-            print(f'quantities for org {org_name}:')
-            for all_quantities in quantities:
-                for device, quantity in all_quantities.items():
-                    print(f'{device}: {quantity[0]}')
-                    if device == 'total':
-                        all_devices += quantity[0]
-                    elif device == 'cellularGateway':
-                        cellular_gateway += quantity[0]
-                    elif device == 'switch':
-                        switch += quantity[0]
-                    elif device == 'appliance':
-                        appliance += quantity[0]
-                    elif device == 'wireless':
-                        wireless += quantity[0]
-                    elif device == 'sensor':
-                        sensor += quantity[0]
-                    elif device == 'camera':
-                        camera += quantity[0]
-                    else:
-                        click.secho(f'[WARNING] Unknown device type: "{device}."\n',
-                            fg='yellow')
+    for org_counts in counts['organizations']:
+        print(f'quantities for org {org_counts["organizationName"]}:')
+        for product_type, quantity in org_counts['counts'].items():
+            print(f'{product_type}: {quantity}')
+        print(f'total: {org_counts["total"]}')
 
         print('\n')
 
     print('Total devices in all orgs:')
-    print(f'cellularGateways: {cellular_gateway}')
-    print(f'switches: {switch}')
-    print(f'appliances: {appliance}')
-    print(f'wireless: {wireless}')
-    print(f'sensors: {sensor}')
-    print(f'camera: {camera}')
-    print(f'total: {all_devices}')
+    for product_type, quantity in counts['totals'].items():
+        print(f'{device_counts.TOTAL_LABELS.get(product_type, product_type)}: {quantity}')
+    print(f'total: {counts["total"]}')
+
+    if other_models is not None:
+        click.secho('\n--summary product types are estimated from model name prefixes - run without --summary for exact counts.', fg='yellow')
+        if other_models:
+            click.secho(f'Models counted as "other": {", ".join(f"{model} ({count})" for model, count in sorted(other_models.items()))}', fg='yellow', bold=True)
+
+    if output_json:
+        with tracing.phase('JSON output'), open (output_json, 'w') as outfile:
+            outfile.write(json.dumps(counts, indent=4))
+
+        click.secho(f'\nDevice counts written to "{ output_json }."\n', fg='green')
 
 if __name__ == "__main__":
     device_count()
@@ -1,75 +1,153 @@
-import itertools
+import json
+import time
 
 import click
 import meraki
+from prettytable import PrettyTable
+
+from orgsplit_tools import orgs, precheck_state, snapshot
+from orgsplit_tools.merakilib import pages, precheck_data, session, tracing, update_appliance
+
+
+UNIQUE_CLIENT = 'Unique client identifier'
+
+# the network fields the report and the appliance settings calls read (organizationId always comes with the record)
+NETWORK_FIELDS = ('id', 'name', 'productTypes', 'isBoundToConfigTemplate')
+
+
+def license_check(license_overview):
+    '''
+    Returns (passed, message) for an org's license overview
+    '''
+    if not license_overview or 'status' not in license_overview:
+        return False, 'No License overview status found - check license status in dashboard and coordinate with Meraki support before proceeding with org split.'
+
+    if license_overview['status'] == 'License Expired':
+        return False, 'WARNING: License EXPIRED on this org, it is not reccomended to proceed with org split.'
+    elif license_overview['status'] == 'License Required':
+        return False, 'WARNING: License REQUIRED for this org, it is not reccomended to proceed with org split.'
+    elif license_overview['status'] == 'OK':
+        return True, 'LICSENSE PRECHECK PASSED!'
+
+    return False, f'WARNING: Unexpected license status "{license_overview["status"]}" - check license status in dashboard before proceeding with org split.'
+
+
+def build_report(org, license_overview, networks, appliance_settings):
+    '''
+    Org Split Readiness Report for one org - also written to JSON as-is
+    '''
+    license_passed, license_message = license_check(license_overview)
+    tracksby_unique_client = [appliance_setting for appliance_setting in appliance_settings if appliance_setting['clientTrackingMethod'] == UNIQUE_CLIENT]
+    template_bound = [{'name': network['name'], 'id': network['id']} for network in networks if network['isBoundToConfigTemplate']]
+
+    return {
+        'organizationName': org['name'],
+        'organizationId': org['id'],
+        'license': {
+            'passed': license_passed,
+            'status': (license_overview or {}).get('status'),
+            'message': license_message,
+        },
+        'clientTracking': {
+            'passed': not tracksby_unique_client,
+            'networks': tracksby_unique_client,
+        },
+        'templates': {
+            'passed': not template_bound,
+            'networks': template_bound,
+        },
+    }
+
+
+def print_report(report):
+    click.secho(f'\n::ORG SPLIT READINESS REPORT - {report["organizationName"]}::\n', fg='green', bold=True)
+
+    click.secho('.:LICENSE STATUS:.\n', fg='green', bold=True)
+    if report['license']['passed']:
+        click.secho(f'{report["license"]["message"]}\n', fg='green')
+    else:
+        click.secho(f'{report["license"]["message"]}\n', fg='yellow', bold=True)
 
-from orgsplit_tools.merakilib import get_appliance, get_networks
-
-
-class CallDashboard(object):
-    def __init__(self, apikey, debug):
-        """
-        call to dashboard API and makes session available to other methods in this class
-        """
-        if debug:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=True,
-            print_console=True,
-            suppress_logging=False,
-            )
-        else:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=False,
-            print_console=False,
-            suppress_logging=True,
-            )
+    click.secho('.:CLIENT TRACKING STATUS:.\n', fg='green', bold=True)
+    if report['clientTracking']['networks']:
+        click.secho('The following networks are tracking by unique client identifier.  They must be changed to track by MAC address before an org split\n', fg='yellow', bold=True)
+        click.secho('This setting can be changed in Security & SD-WAN --> Addressing and VLANs\n', fg='yellow', bold=True)
 
-    def get_allorgs(self):
-        return self.api_session.organizations.getOrganizations()
-    
-    def get_lic_overview(self, org_id):
-        return self.api_session.organizations.getOrganizationLicensesOverview(organizationId=org_id)
+        for appliance in report['clientTracking']['networks']:
+            click.secho(f'Network Name: {appliance["networkName"]} Network ID: {appliance["networkId"]}\n', fg='yellow', bold=True)
+    else:
+        click.secho('CLIENT TRACKING PRECHECK PASSED!\n', fg='green')
 
-    def get_org_networks(self, org_id):
-        return self.api_session.organizations.getOrganizationNetworks(organizationId=org_id, total_pages='all')
+        click.secho('No networks in this organization are tracking by Unique Client ID. No client tracking changes are needed prior to org split.\n', fg='green')
 
-def clean_orgs(all_orgs, org_name):
+    click.secho('.:NETWORK TEMPLATE STATUS:.\n', fg='green', bold=True)
+    if report['templates']['networks']:
+        click.secho('The following networks are bound to configuration templates.\n', fg='yellow', bold=True)
+        click.secho('configuration templates must be unbound before an org split. Please work with support as removing configuration templates can change settings.\n', fg='yellow', bold=True)
+        click.secho('You may also want to use the TemplateBreaker tool written by Nico Darrow: https://github.com/wifiguru10/templateBreaker \n', fg='yellow', bold=True)
+        for network in report['templates']['networks']:
+            click.secho(f'Network Name: {network["name"]} Network ID: {network["id"]}\n', fg='yellow', bold=True)
+    else:
+        click.secho('NETWORK PRECHECK PASSED!\n', fg='green')
 
-    user_org = org_name.lower().strip()
-    
-    cleaned_orgs = []
-    for org in all_orgs:
-        if org['name'].lower().strip() == user_org:
-            cleaned_orgs.append(org)
- 
+        click.secho('No template bound networks found in this org. No changes to network templates are necessary prior to Org Split.\n', fg='green')
 
-            
 
-    print(f'cleaned_orgs: {cleaned_orgs}')
-    if cleaned_orgs:
-        return cleaned_orgs
+def print_fleet_summary(reports):
+    passed = lambda check: 'PASSED' if check['passed'] else 'CHECK'
 
-    else:
-        click.secho(f'[WARNING] Could not find given Organiztion Name: "{org_name}."\n',
-            fg='yellow', bold=True)
-        click.secho(
-        'NOTE: Organization names that contain spaces must be wrapped in quotes (e.g. "Org Name")\n',
-        fg='yellow', bold=True
+    summary_table = PrettyTable(['Organization', 'License', 'Client Tracking', 'Templates', 'Report File'])
+    for report in reports:
+        summary_table.add_row([
+            report['organizationName'],
+            passed(report['license']),
+            f'{passed(report["clientTracking"])} ({len(report["clientTracking"]["networks"])})',
+            f'{passed(report["templates"])} ({len(report["templates"]["networks"])})',
+            report['reportFile'],
+        ])
+
+    click.secho('\n::FLEET SUMMARY::\n', fg='green', bold=True)
+    print(summary_table)
+
+    ready = sum(1 for report in reports if report['license']['passed'] and report['clientTracking']['passed'] and report['templates']['passed'])
+    click.secho(f'\n{ready} of {len(reports)} organizations passed every precheck.\n', fg='green', bold=True)
+
+
+def fix_client_tracking(dashboard, orgname, tracksby_unique_client, action_batch, batch_size):
+    '''
+    Backs up the current tracking method of each network, then switches them all to MAC address
+    '''
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    backup_filename = f'{orgname}_client_tracking_backup_{timestr}.json'
+
+    with open (backup_filename, 'w') as outfile:
+        outfile.write(json.dumps(tracksby_unique_client, indent=4))
+
+    click.secho(f'.:CLIENT TRACKING FIX:.\n', fg='green', bold=True)
+    click.secho(f'Current client tracking settings written to backup filename "{ backup_filename }."\n', fg='yellow', bold=True)
+
+    if not click.confirm(f'Switch {len(tracksby_unique_client)} networks to track clients by MAC address?'):
+        return
+
+    with tracing.phase('write execution', networks=len(tracksby_unique_client)):
+        fixed_networks = update_appliance.async_update_client_tracking(
+            dashboard=dashboard,
+            networks=tracksby_unique_client,
+            method=update_appliance.MAC_ADDRESS,
+            action_batch=action_batch,
+            batch_size=batch_size
         )
 
-        if click.confirm('Print all org names that this apikey has access to?'):
-            for org in all_orgs:
-                click.secho(f'{org["name"]}',
-                fg='green',
-                )
-            exit(0)
+    fixed_ids = {network['networkId'] for network in fixed_networks}
+    for network in tracksby_unique_client:
+        if network['networkId'] not in fixed_ids:
+            click.secho(f'NOT CHANGED - Network Name: {network["networkName"]} Network ID: {network["networkId"]}', fg='yellow', bold=True)
 
-        else:
-            exit(0)
+    results_filename = f'{orgname}_client_tracking_fixed_{timestr}.json'
+    with open (results_filename, 'w') as outfile:
+        outfile.write(json.dumps(fixed_networks, indent=4))
+
+    click.secho(f'\n{len(fixed_networks)} of {len(tracksby_unique_client)} networks now track clients by MAC address - results written to "{ results_filename }."\n', fg='green', bold=True)
 
 
 @click.group()
@@ -80,128 +158,177 @@ def precheck_group(ctx):
 @precheck_group.command(name='precheck')
 @click.option(
     '-k',
-    '--apikey', 
-    prompt=True, 
-    hide_input=True,
-    required=True,  
+    '--apikey',
     metavar='[APIKEY]',
-    help='API key with access to one or more organizations.'
+    help='API key with access to one or more organizations (asked for when not given, unless --from-snapshot is used).'
     )
 @click.option(
             '-o', 
             '--orgname',
-            metavar='[ORGNAME]', 
+            metavar='[ORGNAME] or [All]', 
             required=True,  
-            help='Perform the action on a single organization'
+            help='Perform the action on a single organization or use "all" for all orgnames. Organization name or ALL must follow --orgname option'
             )
+@click.option(
+            '-f', 
+            '--filter',
+            metavar='[FILTER STRING]', 
+            required=False,  
+            help='A filter to perform on any organization names that begin with the given string (Case sensitive).'
+            )
+@click.option(
+            '--full',
+            is_flag=True,
+            help='Re-check every network instead of only the networks changed since the last precheck of each org.'
+            )
+@click.option(
+            '--fix',
+            is_flag=True,
+            help='After the report, switch every appliance network tracking clients by unique client identifier to MAC address (prior values are backed up to JSON first).'
+            )
+@click.option(
+            '--action-batch',
+            is_flag=True,
+            help='Apply --fix through Dashboard action batches instead of one API call per network.'
+            )
+@click.option(
+            '--batch-size',
+            default=100,
+            show_default=True,
+            type=click.IntRange(1, 100),
+            help='Changes per action batch when --action-batch is used.'
+            )
+@snapshot.from_snapshot_option(help='Check the orgs in a snapshot file taken with "snapshot --appliance" instead of the Dashboard API (no --fix).')
 
 @click.pass_context
-def precheck(ctx, apikey, orgname):
+def precheck(ctx, apikey, orgname, filter, full, fix, action_batch, batch_size, from_snapshot):
     """
     Identify settings that may need to be changed prior to an org-split
     """
 
-    if ctx.obj is not None:
-        debug = ctx.obj['debug']
-        cert_path = ctx.obj['cert_path']
+    if from_snapshot and fix:
+        raise click.UsageError('--fix changes the Dashboard and cannot be used with --from-snapshot.')
 
-    click.secho('Getting org info...\n', fg='green')
+    if not from_snapshot:
+        apikey = snapshot.prompt_apikey(apikey)
 
-    try:
-        session = CallDashboard(apikey=apikey, debug=debug)
-        all_orgs = session.get_allorgs()
-        
-    except meraki.exceptions.APIError as e:
-        print(f'Meraki API ERROR: {e}\n')
-        exit(0)
+    if from_snapshot:
+        inventory = ctx.with_resource(snapshot.open_snapshot(from_snapshot))
+        if inventory.meta().get('appliance') != 'True':
+            click.secho(f'[ERROR] "{ from_snapshot }" has no appliance settings - take the snapshot with --appliance to precheck from it.\n', fg='red', bold=True)
+            exit(0)
+        all_orgs = inventory.organizations()
 
-    except Exception as e:
-        print(f'Non Meraki-SDK ERROR: {e}')
-        exit(0)
+    else:
+        click.secho('Getting org info...\n', fg='green')
 
+        try:
+            with tracing.phase('org lookup'):
+                dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+                all_orgs = dashboard.get_organizations()
 
-    user_org = clean_orgs(all_orgs=all_orgs, org_name=orgname)
-    user_orgid = user_org[0]['id']
+        except meraki.exceptions.AsyncAPIError as e:
+            print(f'Meraki API ERROR: {e}\n')
+            exit(0)
+
+        except Exception as e:
+            print(f'Non Meraki-SDK ERROR: {e}')
+            exit(0)
 
-    license_check_status = None
-    license_check_message = None
-    client_tracking_message = None
-    client_tracking_status = None
-    template_tracking_message = None
-    template_tracking_status = None
 
-    readiness_report = []
+    user_orgs = orgs.select_orgs(all_orgs=all_orgs, org_name=orgname, org_filter=filter)
 
     click.secho('::PRECHECK MODE::\n', fg='green', bold=True)
     click.secho('This mode will check for issues that may prevent a successful org split.\n', fg='green')
-    click.secho('No changes will be made to the Dashboard Organization in this mode.\n', fg='green')
+    click.secho(f'Organizations to check: {[org["name"] for org in user_orgs]}\n', fg='green')
+    if fix:
+        click.secho('--fix: networks tracking clients by unique client identifier will be switched to MAC address after the report (you will be asked to confirm).\n', fg='yellow', bold=True)
+    else:
+        click.secho('No changes will be made to the Dashboard Organization in this mode.\n', fg='green')
 
-    if click.confirm('Continue?'):
-        # ToDo : tracking type, MT only networks, templates, 
-        click.secho('Gathering license information...\n', fg='green', bold=True)
+    if not click.confirm('Continue?'):
+        exit(0)
+
+    if from_snapshot:
+        org_ids = [org['id'] for org in user_orgs]
+        license_overviews = inventory.license_overviews(org_ids)
+        all_networks = inventory.networks(org_ids, fields=NETWORK_FIELDS)
+        all_appliance_settings = inventory.appliance_settings(org_ids)
 
+    else:
+        # ToDo : MT only networks
+        # license overviews, network listings and appliance settings are fetched as one concurrent pipeline - appliance
+        # settings calls start as soon as the first page of networks arrives (see merakilib/precheck_data.py)
+        click.secho(f'Gathering license, network and appliance information for {len(user_orgs)} organizations...\n', fg='green', bold=True)
+
+        # orgs checked before only re-check the networks their configuration change log lists since then
+        saved_state = precheck_state.PrecheckState(apikey)
+        previous = {} if full else {org['id']: saved_state.load(org['id']) for org in user_orgs}
+        if any(previous.values()):
+            click.secho(f'Incremental precheck for {sum(1 for state in previous.values() if state)} organizations checked before (use --full to re-check every network)...\n', fg='green')
+
+        checked_at = time.time()
         try:
-            license_overview = session.get_lic_overview(org_id=user_orgid)
+            # one span - the network pages and the appliance fan-out overlap by design
+            with tracing.phase('network fetch and appliance fan-out', organizations=len(user_orgs)):
+                license_overviews, all_networks, all_appliance_settings, reused = precheck_data.gather(dashboard=dashboard, orgs=user_orgs, previous=previous, fields=NETWORK_FIELDS)
 
-        except meraki.exceptions.APIError as e:
-            print(f'Meraki API ERROR: {e}\n')
+        except pages.IncompleteListing as e:
+            click.secho(f'\n[ERROR] {e}\n\nNo reports were written - run precheck again.\n', fg='red', bold=True)
             exit(0)
 
         except Exception as e:
             print(f'Non Meraki-SDK ERROR: {e}')
             exit(0)
 
-        # first precheck - client tracking
-        click.secho(f'Getting network info for org {orgname} ...\n', fg='green')
-        all_networks = get_networks.asyncget_networks(api_key=apikey, orgs=user_org, cert_path=cert_path)
-        click.secho(f'Checking network appliance tracking type for each network in org {orgname} ...\n', fg='green')
-        all_appliance_settings = get_appliance.asyncget_networks(api_key=apikey, networks=all_networks)
-
-        if click.confirm('\nAll data gathered print Org Split Readiness Report?.\n'):
-            click.secho('.:LICENSE STATUS:.\n', fg='green', bold=True)
-
-        # second precheck = license
-            if 'status' in license_overview:
-                if license_overview['status'] == 'License Expired' or 'License Required':
-                    click.secho('WARNING: License EXPIRED on this org, it is not reccomended to proceed with org split.\n', fg='yellow', bold=True)
-                elif license_overview['status'] == 'License Expired' or 'License Required':
-                    click.secho('WARNING: License REQUIRED for this org, it is not reccomended to proceed with org split.\n', fg='yellow', bold=True)
-                elif license_overview['status'] == 'OK':
-                    click.secho('LICSENSE PRECHECK PASSED!\n', fg='green')
-            else:
-                click.secho('No License overview status found - check license status in dashboard and coordinate with Meraki support before proceeding with org split.\n', fg='yellow', bold=True)
-
-            click.secho('.:CLIENT TRACKING STATUS:.\n', fg='green', bold=True)
-            tracksby_unique_client = [appliance_setting for appliance_setting in all_appliance_settings if appliance_setting['clientTrackingMethod'] == 'Unique client identifier']
-
-            if tracksby_unique_client:
-                click.secho('The following networks are tracking by unique client identifier.  They must be changed to track by MAC address before an org split\n', fg='yellow', bold=True)
-                click.secho('This setting can be changed in Security & SD-WAN --> Addressing and VLANs\n', fg='yellow', bold=True)
-
-                for appliance in tracksby_unique_client:
-                    click.secho(f'Network Name: {appliance["networkName"]} Network ID: {appliance["networkId"]}\n', fg='yellow', bold=True)
-            else:
-                click.secho('CLIENT TRACKING PRECHECK PASSED!\n', fg='green')
-
-                click.secho('No networks in this organization are tracking by Unique Client ID. No client tracking changes are needed prior to org split.\n', fg='green')
-            
-            # 3rd precheck - network templates
-            click.secho('.:NETWORK TEMPLATE STATUS:.\n', fg='green', bold=True)
-            template_bound = [network for network in all_networks if network['isBoundToConfigTemplate']]
-            if template_bound:
-                click.secho('The following networks are bound to configuration templates.\n', fg='yellow', bold=True)
-                click.secho('configuration templates must be unbound before an org split. Please work with support as removing configuration templates can change settings.\n', fg='yellow', bold=True)
-                click.secho('You may also want to use the TemplateBreaker tool written by Nico Darrow: https://github.com/wifiguru10/templateBreaker \n', fg='yellow', bold=True)
-                for network in template_bound:
-                    click.secho(f'Network Name: {network["name"]} Network ID: {network["id"]}\n', fg='yellow', bold=True)
-            else:
-                click.secho('NETWORK PRECHECK PASSED!\n', fg='green')
-
-                click.secho('No template bound networks found in this org. No changes to network templates are necessary prior to Org Split.\n', fg='green')
+        if reused:
+            click.secho(f'\n{reused} of {len(all_appliance_settings)} appliance networks are unchanged since the last precheck and were not queried again.\n', fg='green')
+
+    org_networks = {org['id']: [] for org in user_orgs}
+    for network in all_networks:
+        org_networks[network['organizationId']].append(network)
+
+    org_appliance_settings = {org['id']: [] for org in user_orgs}
+    for appliance_setting in all_appliance_settings:
+        org_appliance_settings[appliance_setting['organizationId']].append(appliance_setting)
+
+    if not from_snapshot:
+        for org in user_orgs:
+            if org_networks[org['id']]:
+                saved_state.save(org['id'], checked_at, org_appliance_settings[org['id']])
+
+    # one report file per org
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    reports = []
+    for org in user_orgs:
+        report = build_report(
+            org,
+            license_overviews.get(org['id']),
+            org_networks[org['id']],
+            org_appliance_settings[org['id']],
+        )
+        report['reportFile'] = f'{org["name"]}_precheck_{timestr}.json'
+        with tracing.phase('JSON output', organizationName=org['name']), open (report['reportFile'], 'w') as outfile:
+            outfile.write(json.dumps(report, indent=4))
+
+        reports.append(report)
+
+    if click.confirm('\nAll data gathered print Org Split Readiness Report?.\n'):
+        for report in reports:
+            print_report(report)
+
+    if len(reports) > 1:
+        print_fleet_summary(reports)
+    else:
+        click.secho(f'Readiness report written to "{ reports[0]["reportFile"] }."\n', fg='green', bold=True)
+
+    tracksby_unique_client = [appliance for report in reports for appliance in report['clientTracking']['networks']]
+    if fix and tracksby_unique_client:
+        fix_client_tracking(dashboard, orgname, tracksby_unique_client, action_batch, batch_size)
 
-        exit(0)
     exit(0)
 
+
 if __name__ == "__main__":
     precheck()
 
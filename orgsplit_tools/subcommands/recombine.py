@@ -1,4 +1,3 @@
-import itertools
 import json
 import time
 
@@ -6,69 +5,64 @@ import click
 import meraki
 from prettytable import PrettyTable
 
-from orgsplit_tools.merakilib import get_networks, recombine_networks
-
-
-class CallDashboard(object):
-    def __init__(self, apikey, debug, cert_path=None):
-        """
-        call to dashboard API and makes session available to other methods in this class
-        """
-        if debug:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=True,
-            print_console=True,
-            suppress_logging=False,
-            certificate_path=cert_path
-            )
-        else:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=False,
-            print_console=False,
-            suppress_logging=True,
-            certificate_path=cert_path
+from orgsplit_tools import journal, network_groups, orgs, plan, results, snapshot
+from orgsplit_tools.merakilib import get_networks, pages, recombine_networks, records, session, tracing
 
-            )
 
-    def get_allorgs(self):
-        return self.api_session.organizations.getOrganizations()
-    
-    def get_org_networks(self, org_id):
-        return self.api_session.organizations.getOrganizationNetworks(organizationId=org_id, total_pages='all')
+def execute_combines(dashboard, orgname, async_to_combine, run_journal, pretty_json=False):
+    '''
+    Combines the networks through the journal (a new one unless resuming), streaming each result to its org's NDJSON
+    file as it completes - shared with apply
+    '''
+    timestr = time.strftime("%Y%m%d-%H%M%S")
 
-def clean_orgs(all_orgs, org_name):
+    if run_journal is None:
+        journal_filename = f'{orgname}_recombine_{timestr}.journal'
+        run_journal = journal.Journal.create(journal_filename, 'recombine', orgname, async_to_combine)
+        click.secho(f'Journaling each combine to "{ journal_filename }" - if the run is interrupted, continue it with --resume "{ journal_filename }"\n', fg='green')
 
-    user_org = org_name.lower().strip()
-    
-    cleaned_orgs = []
-    for org in all_orgs:
-        if org['name'].lower().strip() == user_org:
-            cleaned_orgs.append(org)
+    click.secho(f'Combining networks for org "{ orgname }"\n', fg='green')
 
-    if cleaned_orgs:
-        return cleaned_orgs
+    org_name = lambda item: item['networks'][0]['organizationName']
 
-    else:
-        click.secho(f'[WARNING] Could not find given Organiztion Name: "{org_name}."\n',
-            fg='yellow')
-        click.secho(
-        'NOTE: Organization names that contain spaces must be wrapped in quotes (e.g. "Org Name")\n',
-        fg='yellow'
-        )
-
-        if click.confirm('Print all org names that this apikey has access to?'):
-            for org in all_orgs:
-                click.secho(f'{org["name"]}',
-                fg='green',
-                )
-            exit(0)
+    # one results file per organization, including combines from the runs this one resumes
+    with results.OrgResultWriters(lambda name: f'{name}_combined_{timestr}.ndjson') as org_writers:
+        for item, result in run_journal.done_results():
+            org_writers.write(org_name(item), result)
+        run_journal.on_done.append(lambda item, result: org_writers.write(org_name(item), result))
 
-        else:
-            exit(0)
+        try:
+            with tracing.phase('write execution', combines=len(async_to_combine)):
+                recombine_networks.async_recombine_networks(
+                                                            dashboard=dashboard,
+                                                            networks=async_to_combine,
+                                                            journal=run_journal
+                                                            )
+        finally:
+            run_journal.close()
+
+    journal_counts = run_journal.counts()
+    if journal_counts['failed'] or journal_counts['pending']:
+        click.secho(f'\n{journal_counts["failed"] + journal_counts["pending"]} combines did not complete - re-run with --resume "{ run_journal.path }" to retry them.\n', fg='yellow', bold=True)
+
+    org_counts = {}
+    for key, item in run_journal.items.items():
+        counts = org_counts.setdefault(org_name(item), {'done': 0, 'failed': 0, 'pending': 0})
+        counts[run_journal.status.get(key, 'pending')] += 1
+
+    summary_table = PrettyTable(['Organization', 'Combined', 'Failed', 'Not Started', 'Results File'])
+    for name, counts in sorted(org_counts.items()):
+        writer = org_writers.writers.get(name)
+        results_filename = writer.path if writer is not None else '-'
+        if writer is not None and pretty_json:
+            with tracing.phase('JSON output', organizationName=name):
+                results_filename = results.to_pretty_json(writer.path)
+
+        summary_table.add_row([name, counts['done'], counts['failed'], counts['pending'], results_filename])
+
+    print('\n')
+    print(summary_table)
+    click.secho(f'\nRecombine complete for {len(org_counts)} organizations, results are in the files listed above (one combine per line in each .ndjson file).\n', fg='green', bold=True)
 
 
 @click.group()
@@ -79,75 +73,137 @@ def recombine_group(ctx):
 @recombine_group.command(name='recombine')
 @click.option(
     '-k',
-    '--apikey', 
-    prompt=True, 
-    hide_input=True,
-    required=True,  
+    '--apikey',
     metavar='[APIKEY]',
-    help='API key with access to one or more organizations.'
+    help='API key with access to one or more organizations (asked for when not given, unless --from-snapshot is used).'
     )
 @click.option(
             '-o', 
             '--orgname',
-            metavar='[ORGNAME]', 
-            required=True,  
-            help='Perform the action on a single organization. Organization name must follow --orgname option'
+            metavar='[ORGNAME] or [All]', 
+            required=False,  
+            help='Perform the action on a single organization or use "all" for all orgnames. Organization name or ALL must follow --orgname option (required unless --resume is used)'
+            )
+@click.option(
+            '-f', 
+            '--filter',
+            metavar='[FILTER STRING]', 
+            required=False,  
+            help='A filter to perform on any organization names that begin with the given string (Case sensitive).'
+            )
+@click.option(
+            '-s',
+            '--suffix',
+            'suffixes',
+            metavar='[SUFFIX]',
+            multiple=True,
+            help='Network name suffix added by the split (repeat for each suffix, e.g. -s " - appliance" -s " - switch").  Replaces the default suffixes.'
+            )
+@click.option(
+            '--resume',
+            metavar='[JOURNAL]',
+            type=click.Path(exists=True, dir_okay=False),
+            required=False,
+            help='Continue an interrupted recombine from its journal file, skipping combines that already completed (no networks are re-fetched).'
+            )
+@click.option(
+            '--plan-out',
+            metavar='[PLAN FILE]',
+            required=False,
+            help='Write the combines and the state of the networks they target to a plan file for "orgsplit apply" instead of combining now.'
+            )
+@click.option(
+            '--pretty-json',
+            is_flag=True,
+            help='Also convert each org\'s results (written one JSON record per line as each combine completes) to an indented JSON file at the end.'
             )
+@snapshot.from_snapshot_option(help='Plan the combines from a snapshot file (see the snapshot command) instead of the Dashboard API - nothing is combined.')
 @click.pass_context
-def recombine(ctx, apikey, orgname):
+def recombine(ctx, apikey, orgname, filter, suffixes, resume, plan_out, pretty_json, from_snapshot):
     """
     Recombines networks that were previously split by product type (post org-split)
     """
 
-    if ctx.obj is not None:
-        debug = ctx.obj['debug']
-        cert_path = ctx.obj['cert_path']
+    if resume and (plan_out or from_snapshot):
+        raise click.UsageError('--resume cannot be used with --plan-out or --from-snapshot.')
+    if resume and suffixes:
+        raise click.UsageError('--resume replays the combines planned in the journal; do not pass --suffix.')
+    if not resume and not orgname:
+        raise click.UsageError("Missing option '-o' / '--orgname'.")
 
-    click.secho('Getting org info...\n', fg='green', bold=True)
+    if not from_snapshot:
+        apikey = snapshot.prompt_apikey(apikey)
 
-    try:
-        session = CallDashboard(apikey=apikey, debug=debug, cert_path=cert_path)
-        all_orgs = session.get_allorgs()
+    network_name_suffixes = list(suffixes) or network_groups.DEFAULT_SUFFIXES
+    run_journal = None
 
-    except meraki.exceptions.APIError as e:
-        print(f'Meraki API ERROR: {e}\n')
-        exit(0)
+    if resume:
+        try:
+            run_journal = journal.Journal.load(resume, 'recombine')
 
-    except Exception as e:
-        print(f'Non Meraki-SDK ERROR: {e}')
-        exit(0)
+        except (OSError, ValueError) as e:
+            click.secho(f'[ERROR] Could not read journal: {e}\n', fg='red', bold=True)
+            exit(0)
+
+        orgname = orgname or run_journal.orgname
+        async_to_combine = run_journal.remaining()
+        journal_counts = run_journal.counts()
+
+        click.secho(f'Resuming recombine from journal "{ resume }": {journal_counts["done"]} done, {journal_counts["failed"]} failed, {journal_counts["pending"]} not started\n', fg='green', bold=True)
+        if not async_to_combine:
+            click.secho('Every combine in this journal is already done.\n', fg='green', bold=True)
+            exit(0)
+
+        dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+
+    else:
+        if from_snapshot:
+            inventory = ctx.with_resource(snapshot.open_snapshot(from_snapshot))
+            all_orgs = inventory.organizations()
+
+        else:
+            click.secho('Getting org info...\n', fg='green', bold=True)
 
+            try:
+                with tracing.phase('org lookup'):
+                    dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+                    all_orgs = dashboard.get_organizations()
 
-    user_orgs = clean_orgs(all_orgs=all_orgs, org_name=orgname)
-    user_orgid = user_orgs[0]['id']
-    all_networks = session.get_org_networks(org_id=user_orgid)
+            except meraki.exceptions.AsyncAPIError as e:
+                print(f'Meraki API ERROR: {e}\n')
+                exit(0)
 
-    network_name_suffixes = [' - appliance', ' - switch', ' - wireless', ' - cellular gateway', ' - camera', ' - environmental', ' - phone']
+            except Exception as e:
+                print(f'Non Meraki-SDK ERROR: {e}')
+                exit(0)
 
-    split_networks = []
-    unique_names = set()
 
-    to_combine_networks = []
+        user_orgs = orgs.select_orgs(all_orgs=all_orgs, org_name=orgname, org_filter=filter)
 
-    for network in all_networks:
-        # filter out any potential combined networks
-        if 'combined' not in network['productTypes']:
-            split_networks.append(network)
+        click.secho(f'Getting networks for the following orgs {[org["name"] for org in user_orgs]} \n', fg='green', bold=True)
 
-    for network, suffix in itertools.product(split_networks, network_name_suffixes):
-        if suffix in network['name']:
-            new_name = network['name'].replace(suffix, '')
-            if new_name not in unique_names:
-                to_combine_networks.append({new_name: []})
-                unique_names.add(new_name)
+        # each network is bucketed under its (org, base name) as its page arrives - every org is fetched concurrently
+        split_groups = network_groups.SplitNetworkGroups(suffixes=network_name_suffixes)
+        with tracing.phase('network fetch', organizations=len(user_orgs)):
+            if from_snapshot:
+                for page in inventory.iter_network_pages(org_ids=[org['id'] for org in user_orgs]):
+                    split_groups.add_many(page)
+            else:
+                try:
+                    get_networks.asyncstream_networks(dashboard=dashboard, orgs=user_orgs, on_page=split_groups.add_many)
 
-    for network, network_name in itertools.product(split_networks, to_combine_networks):
-        for k in network_name.items():
-            potential_name = k[0]
-            if potential_name in network['name']:
-                network_name[potential_name].append(network)
+                except pages.IncompleteListing as e:
+                    click.secho(f'\n[ERROR] {e}\n\nNothing was combined - run recombine again.\n', fg='red', bold=True)
+                    exit(0)
 
-    to_rename_table = PrettyTable(['Combined Network', 'Previous Networks'])
+        for network in split_groups.singles():
+            click.secho(f'Skipping "{network["name"]}" - no other split networks share its name', fg='yellow')
+
+        async_to_combine = split_groups.to_combine()
+
+    to_combine_networks = [{network['network_name_combined']: network['networks']} for network in async_to_combine]
+
+    to_rename_table = PrettyTable(['Organization', 'Combined Network', 'Previous Networks'])
     if to_combine_networks:
         for each_network in to_combine_networks:
             for new_name, network_details in each_network.items():
@@ -156,7 +212,7 @@ def recombine(ctx, apikey, orgname):
                     previous_networks.append(network['name'])
 
                 combined_network_name = new_name
-                to_rename_table.add_row([combined_network_name, previous_networks])
+                to_rename_table.add_row([network_details[0]['organizationName'], combined_network_name, previous_networks])
 
         print('\n')
         print(to_rename_table)
@@ -167,48 +223,27 @@ def recombine(ctx, apikey, orgname):
         click.secho(f'Writing JSON for networks to combine to backup filename "{ to_combine_filename }."\n', fg='yellow', bold=True)
 
         with open (to_combine_filename, 'w') as outfile:
-            outfile.write(json.dumps(to_combine_networks, indent=4))
+            outfile.write(json.dumps(to_combine_networks, indent=4, default=records.json_default))
+
+        if plan_out:
+            recombine_plan = plan.Plan.build('recombine', orgname, user_orgs, async_to_combine, source=from_snapshot or dashboard.base_url)
+            recombine_plan.write(plan_out)
+            click.secho(f'Plan for {len(async_to_combine)} combines written to "{ plan_out }" - nothing was combined.  Run it with: orgsplit apply "{ plan_out }"\n', fg='green', bold=True)
+            exit(0)
+
+        if from_snapshot:
+            click.secho(f'Planned {len(to_combine_networks)} combines from snapshot "{ from_snapshot }" - nothing was combined.  Re-run without --from-snapshot to combine the live networks.\n', fg='green', bold=True)
+            exit(0)
         
         click.secho(f'Confirm new network names in the table above or review the file { to_combine_filename } before continuing.', fg='yellow', bold=True)
 
         click.secho(f'This step cannot be undone without another network split operation!\n',  fg='yellow', bold=True)
 
-        if click.confirm(f'Continue?'):
-            # updated_networks = recombine_networks.async_update_networks(api_key=apikey, networks=to_rename_networks, cert_path=cert_path)
-
-            updated_networks = recombine_networks.async_recombine_networks(api_key=apikey, networks=to_combine_networks, debug_app=debug, cert_path=cert_path)
-        else:
+        if not click.confirm(f'Continue?'):
             exit(0)
 
     else:
         click.secho(f'\nNo networks matched! (network names in the given orgs did not contain one of the following suffixes: "{network_name_suffixes}" \n', fg='yellow', bold=True)
         exit(0)
 
-    async_to_combine = []
-    if to_combine_networks:
-        # rebuild our data for our async merakilib (somewhat redundant step, will re-write later)
-        for network in to_combine_networks:
-            for k,v in network.items():
-                new_dict = {
-                            'network_name_combined': k, 
-                            'network_ids': [v['id'] for v in v],
-                            'networks': v,
-                            'enrollment_string': v[0]['enrollmentString'],
-                            'organization_id': v[0]['organizationId']
-                            }
-                async_to_combine.append(new_dict)
-
-        click.secho(f'Combining networks for org "{ orgname }"\n', fg='green')
-
-        recombined_networks = recombine_networks.async_recombine_networks(
-                                                                        api_key=apikey,
-                                                                        networks=async_to_combine,
-                                                                        debug_app=debug,
-                                                                        cert_path=cert_path
-                                                                        )
-
-        backup_filename = f'{orgname}_combined_{timestr}.json'
-        with open (backup_filename, 'w') as outfile:
-            outfile.write(json.dumps(recombined_networks, indent=4))
-
-        click.secho(f'\nRecombine complete, backup filename results are in file "{ backup_filename }."\n', fg='green', bold=True)
+    execute_combines(dashboard, orgname, async_to_combine, run_journal, pretty_json)
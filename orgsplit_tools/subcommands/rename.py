@@ -1,70 +1,59 @@
-import json
+import os
 import time
 
 import click
 import meraki
 from prettytable import PrettyTable
 
-from orgsplit_tools.merakilib import get_networks, update_networks
-
-
-class CallDashboard(object):
-    def __init__(self, apikey, debug, cert_path=None):
-        """
-        call to dashboard API and makes session available to other methods in this class
-        """
-        if debug:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=True,
-            print_console=True,
-            suppress_logging=False,
-            certificate_path=cert_path
-            )
-        else:
-            self.api_session = meraki.DashboardAPI(
-            api_key=apikey,
-            base_url="https://api.meraki.com/api/v1/",
-            output_log=False,
-            print_console=False,
-            suppress_logging=True,
-            certificate_path=cert_path
-
-            )
-
-    def get_allorgs(self):
-        return self.api_session.organizations.getOrganizations()
-
-def clean_orgs(all_orgs, org_name):
+from orgsplit_tools import journal, orgs, plan, rename_map, results, snapshot
+from orgsplit_tools.merakilib import get_networks, pages, records, session, tracing, update_networks
+
+
+def execute_renames(dashboard, orgname, to_rename_networks, run_journal, action_batch, batch_size, pretty_json=False):
+    '''
+    Renames the networks through the journal (a new one unless resuming), streaming each result to an NDJSON file as
+    it completes - shared with apply
+    '''
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+
+    if run_journal is None:
+        journal_filename = f'{orgname}_rename_{timestr}.journal'
+        run_journal = journal.Journal.create(journal_filename, 'rename', orgname, to_rename_networks)
+        click.secho(f'Journaling each rename to "{ journal_filename }" - if the run is interrupted, continue it with --resume "{ journal_filename }"\n', fg='green')
+
+    results_filename = f'{orgname}_rename_{timestr}.ndjson'
+    with results.ResultWriter(results_filename) as writer:
+        # renames completed by the runs this one resumes come first
+        for _, result in run_journal.done_results():
+            writer.write(result)
+        run_journal.on_done.append(lambda item, result: writer.write(result))
+
+        try:
+            with tracing.phase('write execution', networks=len(to_rename_networks)):
+                update_networks.async_update_networks(
+                    dashboard=dashboard,
+                    networks=to_rename_networks,
+                    action_batch=action_batch,
+                    batch_size=batch_size,
+                    journal=run_journal
+                )
+        finally:
+            run_journal.close()
 
-    user_org = org_name.lower().strip()
-    
-    cleaned_orgs = []
-    for org in all_orgs:
-        if org['name'].lower().strip() == user_org:
-            cleaned_orgs.append(org)
+    journal_counts = run_journal.counts()
+    if journal_counts['failed'] or journal_counts['pending']:
+        click.secho(f'\n{journal_counts["failed"] + journal_counts["pending"]} renames did not complete - re-run with --resume "{ run_journal.path }" to retry them.\n', fg='yellow', bold=True)
 
-    if cleaned_orgs:
-        return cleaned_orgs
+    if writer.count:
+        click.secho(f'\nNetwork rename process was successfull - output for the operation written one network per line to filename "{ results_filename }."\n', fg='green', bold=True)
 
+        if pretty_json:
+            with tracing.phase('JSON output'):
+                json_filename = results.to_pretty_json(results_filename)
+            click.secho(f'Indented JSON copy written to "{ json_filename }."\n', fg='green')
     else:
-        click.secho(f'[WARNING] Could not find given Organiztion Name: "{org_name}."\n',
-            fg='yellow')
-        click.secho(
-        'NOTE: Organization names that contain spaces must be wrapped in quotes (e.g. "Org Name")\n',
-        fg='yellow'
-        )
-
-        if click.confirm('Print all org names that this apikey has access to?'):
-            for org in all_orgs:
-                click.secho(f'{org["name"]}',
-                fg='green',
-                )
-            exit(0)
-
-        else:
-            exit(0)
+        os.remove(results_filename)
+        click.secho(f'\nSomething went wrong - check the screen for errors. You may need to re-run with the debug (-d) flag set \n', fg='yellow', bold=True)
 
 
 @click.group()
@@ -75,19 +64,16 @@ def rename_group(ctx):
 @rename_group.command(name='rename', context_settings={"ignore_unknown_options": True})
 @click.option(
     '-k',
-    '--apikey', 
-    prompt=True, 
-    hide_input=True,
-    required=True,  
+    '--apikey',
     metavar='[APIKEY]',
-    help='API key with access to one or more organizations.'
+    help='API key with access to one or more organizations (asked for when not given, unless --from-snapshot is used).'
     )
 @click.option(
             '-o', 
             '--orgname',
             metavar='[ORGNAME] or [All]', 
-            required=True,  
-            help='Perform the action on a single organization or use "all" for all orgnames. Organization name or ALL must follow --orgname option'
+            required=False,  
+            help='Perform the action on a single organization or use "all" for all orgnames. Organization name or ALL must follow --orgname option (required unless --resume is used)'
             )
 @click.option(
             '-f', 
@@ -96,85 +82,166 @@ def rename_group(ctx):
             required=False,  
             help='A filter to perform on any organization names that begin with the given string (Case sensitive).'
             )
-@click.argument('find_string', nargs=1)
-@click.argument('replace_string', nargs=1)
+@click.option(
+            '-m',
+            '--map',
+            'map_file',
+            metavar='[CSV FILE]',
+            type=click.Path(exists=True, dir_okay=False),
+            required=False,
+            help='CSV of find,replace[,regex] rules to apply in a single pass instead of FIND_STRING REPLACE_STRING.'
+            )
+@click.option(
+            '--action-batch',
+            is_flag=True,
+            help='Rename through Dashboard action batches (up to --batch-size renames per API call) instead of one call per network.'
+            )
+@click.option(
+            '--batch-size',
+            default=100,
+            show_default=True,
+            type=click.IntRange(1, 100),
+            help='Renames per action batch when --action-batch is used.'
+            )
+@click.option(
+            '--resume',
+            metavar='[JOURNAL]',
+            type=click.Path(exists=True, dir_okay=False),
+            required=False,
+            help='Continue an interrupted rename from its journal file, skipping renames that already completed (no networks are re-fetched).'
+            )
+@click.option(
+            '--dry-run',
+            is_flag=True,
+            help='Only show the renames that would be made.'
+            )
+@click.option(
+            '--plan-out',
+            metavar='[PLAN FILE]',
+            required=False,
+            help='Write the renames and the state of the networks they target to a plan file for "orgsplit apply" instead of renaming now.'
+            )
+@click.option(
+            '--pretty-json',
+            is_flag=True,
+            help='Also convert the results (written one JSON record per line as each rename completes) to an indented JSON file at the end.'
+            )
+@snapshot.from_snapshot_option(help='Match against the networks in a snapshot file (see the snapshot command) instead of the Dashboard API (requires --dry-run or --plan-out).')
+@click.argument('find_string', nargs=1, required=False)
+@click.argument('replace_string', nargs=1, required=False)
 @click.pass_context
-def rename(ctx, apikey, orgname, filter, find_string, replace_string):
+def rename(ctx, apikey, orgname, filter, map_file, action_batch, batch_size, resume, dry_run, plan_out, pretty_json, from_snapshot, find_string, replace_string):
     """
     Replaces part or all of a network name in one or more organizations
     """
 
-    if ctx.obj is not None:
-        debug = ctx.obj['debug']
-        cert_path = ctx.obj['cert_path']
+    if from_snapshot and not (dry_run or plan_out):
+        raise click.UsageError('--from-snapshot only plans renames; add --dry-run or --plan-out (renaming needs the live networks).')
+    if resume and (dry_run or plan_out or from_snapshot):
+        raise click.UsageError('--resume cannot be used with --dry-run, --plan-out or --from-snapshot.')
+    if resume and (map_file or find_string is not None):
+        raise click.UsageError('--resume replays the renames planned in the journal; do not pass --map or FIND_STRING REPLACE_STRING.')
+    if not resume and not orgname:
+        raise click.UsageError("Missing option '-o' / '--orgname'.")
+    if map_file and find_string is not None:
+        raise click.UsageError('Use either --map or FIND_STRING REPLACE_STRING, not both.')
+    if not resume and not map_file and (find_string is None or replace_string is None):
+        raise click.UsageError('FIND_STRING and REPLACE_STRING are required unless --map is given.')
+
+    if not from_snapshot:
+        apikey = snapshot.prompt_apikey(apikey)
+
+    run_journal = None
+
+    if resume:
+        try:
+            run_journal = journal.Journal.load(resume, 'rename')
+
+        except (OSError, ValueError) as e:
+            click.secho(f'[ERROR] Could not read journal: {e}\n', fg='red', bold=True)
+            exit(0)
 
-    click.secho('Getting org info...\n', fg='green', bold=True)
+        orgname = orgname or run_journal.orgname
+        to_rename_networks = run_journal.remaining()
+        journal_counts = run_journal.counts()
 
-    try:
-        session = CallDashboard(apikey=apikey, debug=debug, cert_path=cert_path)
-        all_orgs = session.get_allorgs()
+        click.secho(f'Resuming rename from journal "{ resume }": {journal_counts["done"]} done, {journal_counts["failed"]} failed, {journal_counts["pending"]} not started\n', fg='green', bold=True)
+        if not to_rename_networks:
+            click.secho('Every rename in this journal is already done.\n', fg='green', bold=True)
+            exit(0)
 
-    except meraki.exceptions.APIError as e:
-        print(f'Meraki API ERROR: {e}\n')
-        exit(0)
+        dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
 
-    except Exception as e:
-        print(f'Non Meraki-SDK ERROR: {e}')
-        exit(0)
+    else:
+        try:
+            if map_file:
+                renames = rename_map.RenameMap.from_csv(map_file)
+                rules_description = f'any rule in "{map_file}"'
+            else:
+                renames = rename_map.RenameMap([rename_map.Rule(find_string, replace_string)])
+                rules_description = f'the string "{find_string}"'
+
+        except ValueError as e:
+            click.secho(f'[ERROR] {e}\n', fg='red', bold=True)
+            exit(0)
 
-    if orgname != 'all':
-        if filter:
-            click.secho(f'[WARNING] --filter (-f) option is ignored when used with a single organization.\n',
-            fg='yellow',
-            bold=True)
+        if not len(renames):
+            click.secho(f'\nNo rename rules found in "{map_file}"\n', fg='yellow', bold=True)
+            exit(0)
 
+        if from_snapshot:
+            inventory = ctx.with_resource(snapshot.open_snapshot(from_snapshot))
+            all_orgs = inventory.organizations()
 
-        user_orgs = clean_orgs(all_orgs=all_orgs, org_name=orgname)
-    
-    else:
-        
-        if filter:
-            filtered_orgs = [org for org in all_orgs if org['name'].startswith(filter)]
-            user_orgs = filtered_orgs
-
-
-    # @ToDo : fix early reference error when all is used with no filter
-    org_names = []
-
-    for name in user_orgs:
-        org_names.append(name['name'])
-
-    click.secho(f'Getting networks for the following orgs {org_names} \n', fg='green', bold=True)
-    all_org_networks = get_networks.asyncget_networks(api_key=apikey, 
-                                                      orgs=user_orgs,
-                                                      debug_app=debug,
-                                                      cert_path=cert_path)
-
-    to_rename_networks = []
-
-    for network in all_org_networks:
-        if find_string in network['name']:
-           new_name = network['name'].replace(find_string, replace_string)
-           new_dict = {
-            'organizationName': network['organizationName'],
-            'organizationId': network['organizationId'],
-            'network_id': network['id'],
-            'name': network['name'],
-            'productTypes': network['productTypes'],
-            'timeZone': network['timeZone'],
-            'tags': network['tags'],
-            'enrollmentString': network['enrollmentString'],
-            'url': network['url'],
-            'notes': network['notes'],
-            'isBoundToConfigTemplate': network['isBoundToConfigTemplate'],
-            'new_name': new_name,
-            'old_name': network['name']
-            }
-           
-           to_rename_networks.append(new_dict)
         else:
-            click.secho(f'String {find_string} not found in network "{network["name"]}"', fg='green', bold=True)
-    
+            click.secho('Getting org info...\n', fg='green', bold=True)
+
+            try:
+                with tracing.phase('org lookup'):
+                    dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+                    all_orgs = dashboard.get_organizations()
+
+            except meraki.exceptions.AsyncAPIError as e:
+                print(f'Meraki API ERROR: {e}\n')
+                exit(0)
+
+            except Exception as e:
+                print(f'Non Meraki-SDK ERROR: {e}')
+                exit(0)
+
+        user_orgs = orgs.select_orgs(all_orgs=all_orgs, org_name=orgname, org_filter=filter)
+
+        org_names = []
+
+        for name in user_orgs:
+            org_names.append(name['name'])
+
+        click.secho(f'Getting networks for the following orgs {org_names} \n', fg='green', bold=True)
+
+        to_rename_networks = []
+
+        def match_networks(networks):
+            for network in networks:
+                new_name = renames.rename(network['name'])
+                if new_name is not None:
+                    # refers to the matched network instead of copying its fields
+                    to_rename_networks.append(records.Rename(network, new_name))
+                else:
+                    click.secho(f'No match for {rules_description} in network "{network["name"]}"', fg='green', bold=True)
+
+        with tracing.phase('network fetch', organizations=len(user_orgs)):
+            if from_snapshot:
+                for page in inventory.iter_network_pages(org_ids=[org['id'] for org in user_orgs]):
+                    match_networks(page)
+            else:
+                # match each page of networks as it arrives so only the networks to rename are kept
+                try:
+                    get_networks.asyncstream_networks(dashboard=dashboard, orgs=user_orgs, on_page=match_networks)
+
+                except pages.IncompleteListing as e:
+                    click.secho(f'\n[ERROR] {e}\n\nNothing was renamed - run rename again.\n', fg='red', bold=True)
+                    exit(0)
+
     to_rename_table = PrettyTable(['Old Name', 'New Name'])
     if to_rename_networks:
         for network in to_rename_networks:
@@ -186,24 +253,23 @@ def rename(ctx, apikey, orgname, filter, find_string, replace_string):
         print(to_rename_table)
         print('\n')
     else:
-        click.secho(f'\nNo networks matched! (network names in the given orgs did not contain the string "{find_string}") \n', fg='yellow', bold=True)
+        click.secho(f'\nNo networks matched! (network names in the given orgs did not match {rules_description}) \n', fg='yellow', bold=True)
         exit(0)
 
-    if click.confirm('Confirm new network names in the table above before continuing.  This step cannot be undone without another rename.  Continue?'):
-        updated_networks = update_networks.async_update_networks(api_key=apikey, networks=to_rename_networks, cert_path=cert_path)
-    else:
+    if plan_out:
+        rename_plan = plan.Plan.build('rename', orgname, user_orgs, to_rename_networks, source=from_snapshot or dashboard.base_url)
+        rename_plan.write(plan_out)
+        click.secho(f'Plan for {len(to_rename_networks)} renames written to "{ plan_out }" - nothing was renamed.  Run it with: orgsplit apply "{ plan_out }"\n', fg='green', bold=True)
         exit(0)
 
-    if update_networks:
-        timestr = time.strftime("%Y%m%d-%H%M%S")
-        json_filename = f'{orgname}_rename_{timestr}.json'
+    if dry_run:
+        click.secho(f'Dry run - {len(to_rename_networks)} networks would be renamed, no changes were made.\n', fg='green', bold=True)
+        exit(0)
 
-        click.secho(f'\nNetwork rename process was successfull - output JSON for the operation written to filename "{ json_filename }."\n', fg='green', bold=True)
+    if not click.confirm('Confirm new network names in the table above before continuing.  This step cannot be undone without another rename.  Continue?'):
+        exit(0)
 
-        with open (json_filename, 'w') as outfile:
-            outfile.write(json.dumps(updated_networks, indent=4))
-    else:
-        click.secho(f'\nSomething went wrong - check the screen for errors. You may need to re-run with the debug (-d) flag set \n', fg='yellow', bold=True)
+    execute_renames(dashboard, orgname, to_rename_networks, run_journal, action_batch, batch_size, pretty_json)
 
 if __name__ == "__main__":
     rename()
@@ -0,0 +1,125 @@
+import time
+
+import click
+import meraki
+from prettytable import PrettyTable
+
+from orgsplit_tools import orgs, snapshot as inventory_snapshot
+from orgsplit_tools.merakilib import get_devices, get_networks, pages, precheck_data, session, tracing
+
+
+@click.group()
+@click.pass_context
+def snapshot_group(ctx):
+     pass
+
+@snapshot_group.command(name='snapshot')
+@click.option(
+    '-k',
+    '--apikey',
+    prompt=True,
+    hide_input=True,
+    required=True,
+    metavar='[APIKEY]',
+    help='API key with access to one or more organizations.'
+    )
+@click.option(
+            '-o',
+            '--orgname',
+            metavar='[ORGNAME] or [All]',
+            required=True,
+            help='Perform the action on a single organization or use "all" for all orgnames. Organization name or ALL must follow --orgname option'
+            )
+@click.option(
+            '-f',
+            '--filter',
+            metavar='[FILTER STRING]',
+            required=False,
+            help='A filter to perform on any organization names that begin with the given string (Case sensitive).'
+            )
+@click.option(
+            '--appliance',
+            is_flag=True,
+            help='Also store the appliance settings of every appliance network (one call per network), needed by precheck --from-snapshot.'
+            )
+@click.argument('snapshot_file', metavar='[SNAPSHOT FILE]', required=False)
+
+@click.pass_context
+def snapshot(ctx, apikey, orgname, filter, appliance, snapshot_file):
+    """
+    Saves organizations, networks and devices to a local SQLite snapshot
+    """
+
+    click.secho('Getting org info...\n', fg='green')
+
+    try:
+        with tracing.phase('org lookup'):
+            dashboard = ctx.with_resource(session.DashboardSession.from_options(apikey, ctx.obj))
+            all_orgs = dashboard.get_organizations()
+
+    except meraki.exceptions.AsyncAPIError as e:
+        print(f'Meraki API ERROR: {e}\n')
+        exit(0)
+
+    except Exception as e:
+        print(f'Non Meraki-SDK ERROR: {e}')
+        exit(0)
+
+    user_orgs = orgs.select_orgs(all_orgs=all_orgs, org_name=orgname, org_filter=filter)
+
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    snapshot_file = snapshot_file or f'{orgname}_snapshot_{timestr}.sqlite'
+
+    click.secho(f'Saving the following orgs to snapshot "{ snapshot_file }": {[org["name"] for org in user_orgs]} \n', fg='green', bold=True)
+
+    with inventory_snapshot.Snapshot.create(snapshot_file, orgname=orgname, baseUrl=dashboard.base_url, appliance=appliance) as inventory:
+        try:
+            save_inventory(dashboard, inventory, user_orgs, appliance)
+
+        except pages.IncompleteListing as e:
+            inventory.discard()
+            click.secho(f'\n[ERROR] {e}\n\nSnapshot "{ snapshot_file }" was not written - run snapshot again.\n', fg='red', bold=True)
+            exit(0)
+
+        counts = inventory.counts()
+
+    counts_table = PrettyTable(['Records', 'Count'])
+    for table, count in counts.items():
+        counts_table.add_row([table, count])
+
+    print('\n')
+    print(counts_table)
+    click.secho(f'\nSnapshot written to "{ snapshot_file }" - pass it to device-count, precheck, rename --dry-run or recombine with --from-snapshot.\n', fg='green', bold=True)
+
+
+def save_inventory(dashboard, inventory, user_orgs, appliance):
+    '''
+    Fetches the orgs' licenses, networks (and appliance settings) and devices into the snapshot
+    '''
+    inventory.add_organizations(user_orgs)
+
+    if appliance:
+        click.secho('Getting licenses, networks and appliance settings...\n', fg='green')
+        with tracing.phase('network fetch and appliance fan-out', organizations=len(user_orgs)):
+            license_overviews, all_networks, all_appliance_settings, _ = precheck_data.gather(dashboard=dashboard, orgs=user_orgs)
+        inventory.add_networks(all_networks)
+        inventory.add_appliance_settings(all_appliance_settings)
+
+    else:
+        click.secho('Getting licenses and networks...\n', fg='green')
+        with tracing.phase('network fetch', organizations=len(user_orgs)):
+            license_overviews = {org['id']: overview for org, overview in dashboard.get_license_overviews(orgs=user_orgs)}
+            # each page goes straight into the snapshot as it arrives
+            get_networks.asyncstream_networks(dashboard=dashboard, orgs=user_orgs, on_page=inventory.add_networks)
+
+    for org_id, license_overview in license_overviews.items():
+        if license_overview is not None:
+            inventory.add_license_overview(org_id, license_overview)
+
+    click.secho('\nGetting devices...\n', fg='green')
+    with tracing.phase('device fetch', organizations=len(user_orgs)):
+        get_devices.asyncstream_devices(dashboard=dashboard, orgs=user_orgs, on_page=inventory.add_devices)
+
+
+if __name__ == "__main__":
+    snapshot()
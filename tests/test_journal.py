@@ -0,0 +1,42 @@
+from orgsplit_tools import journal
+
+
+def _item(name):
+    return {'organization_id': '1234', 'network_name_combined': name, 'networks': []}
+
+
+def _interrupted_journal(path, tail):
+    run_journal = journal.Journal.create(str(path), 'recombine', 'ACME', [_item('a'), _item('b')])
+    run_journal.close()
+    with open(path, 'ab') as outfile:
+        outfile.write(tail)
+
+
+def test_resume_after_truncated_tail(tmp_path):
+    path = tmp_path / 'ACME_recombine.journal'
+    # the crash cut the last record short, without its newline
+    _interrupted_journal(path, b'{"type": "done", "key": "1234/b", "res')
+
+    resumed = journal.Journal.load(str(path), 'recombine')
+    assert [item['network_name_combined'] for item in resumed.remaining()] == ['a', 'b']
+
+    resumed.record(_item('a'), {'id': 'N_1'})
+    resumed.close()
+
+    reloaded = journal.Journal.load(str(path), 'recombine')
+    assert [item['network_name_combined'] for item in reloaded.remaining()] == ['b']
+    assert list(reloaded.done_results()) == [(_item('a'), {'id': 'N_1'})]
+
+
+def test_resume_after_record_missing_its_newline(tmp_path):
+    path = tmp_path / 'ACME_recombine.journal'
+    _interrupted_journal(path, b'{"type": "done", "key": "1234/b", "result": {"id": "N_2"}}')
+
+    resumed = journal.Journal.load(str(path), 'recombine')
+    assert [item['network_name_combined'] for item in resumed.remaining()] == ['a']
+
+    resumed.record(_item('a'), {'id': 'N_1'})
+    resumed.close()
+
+    reloaded = journal.Journal.load(str(path), 'recombine')
+    assert reloaded.remaining() == []